@@ -1,13 +1,21 @@
 import os
+import uuid
+import time
 import asyncio
+import importlib
 import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
 from google.adk.agents import Agent
 # from google.adk.models.lite_llm import LiteLlm # For multi-model support
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types # For creating message Content/Parts
 
-from models.model import PresentationContent ,MermaidOutput  , SlideContent
+from models.model import PresentationContent ,MermaidOutput  , SlideContent , PresentationOutline
+from metrics import span, record
+from prompt_builder import estimate_tokens
 
 import warnings
 # Ignore all warnings
@@ -51,6 +59,41 @@ edit_agent = Agent(
 )
 
 
+outline_agent = Agent(
+    name="outline_agent",
+    model="gemini-2.5-flash-preview-05-20",
+    description="You are a helpful assistant designed to plan high quality power point presentations",
+    instruction="always follow user instruction "
+                """
+                 Plan the presentation only, do not write the slides:
+                    1.  A 'name' for the presentation.
+                    2.  'slide_titles' (list of strings): A concise and impactful title for each slide, in order.
+
+                provide an 'overall_theme' for the entire presentation,  and the value for in between this (e.g., 'professional', 'minimalist', 'playful', 'academic', 'dynamic').
+                """
+,output_schema=PresentationOutline,
+    output_key="result"
+
+)
+
+
+slide_agent = Agent(
+    name="slide_agent",
+    model="gemini-2.5-flash-preview-05-20",
+    description="You are a helpful assistant designed to providde high quality power point prsentation",
+    instruction="always follow user instruction "
+                """
+                 Write one slide of a planned presentation. Provide:
+                    1.  The 'title' you were given for the slide, unchanged.
+                    2.  'bullet_points' (list of strings): Key information or talking points. Keep them concise and informative.
+                    3.  'image_description' (optional string): A brief, descriptive phrase for a relevant image that would enhance the slide.
+
+                Only cover this slide's topic; the other slides are written separately.
+                """
+,output_schema=SlideContent,
+    output_key="result"
+
+)
 
 
 worflow = Agent(
@@ -77,43 +120,187 @@ worflow = Agent(
 )
 
 
-session_service = InMemorySessionService()
+# AGENT_SESSION_HISTORY_TOKENS: estimated tokens of conversation history kept per session;
+#                               older turns are dropped so requests don't grow over time.
+# AGENT_SESSION_IDLE_SECONDS: presentation sessions unused for longer than this are deleted.
+AGENT_SESSION_HISTORY_TOKENS = int(os.getenv("AGENT_SESSION_HISTORY_TOKENS", "4000"))
+AGENT_SESSION_IDLE_SECONDS = float(os.getenv("AGENT_SESSION_IDLE_SECONDS", "1800"))
 
 # Define constants for identifying the interaction context
 APP_NAME = "workspace"
 USER_ID = "user_1"
-SESSION_ID = "session_001" # Using a fixed ID for simplicity
 
-async def create_session():
-    session = await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-            session_id=SESSION_ID
+
+def _event_tokens(event) -> int:
+    if not event.content or not event.content.parts:
+        return 0
+    return sum(estimate_tokens(part.text or "") for part in event.content.parts)
+
+
+def _trim_history(events: list, budget_tokens: int):
+    """
+    Drops the oldest events until the history fits in `budget_tokens`, then any leftover events
+    of a partly dropped turn, so the remaining history starts with a user message.
+    """
+    total = sum(_event_tokens(event) for event in events)
+    drop = 0
+    while drop < len(events) and total > budget_tokens:
+        total -= _event_tokens(events[drop])
+        drop += 1
+    if drop:
+        while drop < len(events) and events[drop].author != "user":
+            drop += 1
+        del events[:drop]
+
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    In-memory session service that keeps each session's history within `history_tokens`
+    (estimated), dropping the oldest turns first. The whole history is sent with every LLM
+    request, so without a bound a long-lived session makes each call slower and more expensive.
+    """
+
+    def __init__(self, history_tokens: int = AGENT_SESSION_HISTORY_TOKENS):
+        super().__init__()
+        self.history_tokens = history_tokens
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        if not event.partial:
+            stored = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+            if stored is not None:
+                _trim_history(stored.events, self.history_tokens)
+        return event
+
+    def discard_turn(self, app_name: str, user_id: str, session_id: str, query: str):
+        """
+        Removes the latest turn sent as `query` from a session: the message and whatever the
+        agent added in reply (the events of its invocation). For calls that failed or were
+        abandoned (timed out, lost a hedge, stream closed early), so a shared session's history
+        has no half-finished turns for later calls to build on.
+        """
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return
+        for event in reversed(stored.events):
+            if event.author == "user" and event.content and event.content.parts and event.content.parts[0].text == query:
+                stored.events[:] = [kept for kept in stored.events if kept.invocation_id != event.invocation_id]
+                return
+
+
+session_service = BoundedSessionService()
+
+# Key: id() of the agent, Value: its Runner. Runners hold no per-request state, so one per
+# agent is shared by every request.
+_runners: Dict[int, Runner] = {}
+
+# Key: session id of a presentation session, Value: monotonic time it was last used
+_session_last_used: Dict[str, float] = {}
+# Key: session id, Value: number of calls currently running in it
+_sessions_in_use: Dict[str, int] = {}
+_session_create_lock = asyncio.Lock()
+# LLM calls (plain and streaming) currently waiting on the model
+_llm_calls_in_flight = 0
+
+
+def get_runner(agent: Agent) -> Runner:
+    """
+    Returns the pooled runner for the agent, creating it on first use.
+    """
+    runner = _runners.get(id(agent))
+    if runner is None:
+        # --- Runner ---
+        # Key Concept: Runner orchestrates the agent execution loop.
+        runner = Runner(
+            agent=agent, # The agent we want to run
+            app_name=APP_NAME,   # Associates runs with our app
+            session_service=session_service # Uses our session manager
         )
-    print(f"Session created: App='{APP_NAME}', User='{USER_ID}', Session='{SESSION_ID}'")
-    return session
+        _runners[id(agent)] = runner
+        print(f"Runner created for agent '{runner.agent.name}'.")
+    return runner
+
 
-session = asyncio.run(create_session())
+# Modules ADK imports on a runner's first run rather than when it is imported (about half a second)
+_ADK_RUN_MODULES = ("google.adk.workflow._workflow", "google.adk.flows.llm_flows.auto_flow")
 
-async def get_runner_session(agent):
+
+def create_runners():
+    """
+    Creates the runners of every agent, and imports what ADK imports on a first run, now (a
+    startup warm-up) rather than in the first calls.
     """
-    Returns the runner instance for the agent.
-    This allows other parts of the application to access the runner.
+    for agent in (ppt_agent, edit_agent, outline_agent, slide_agent, worflow):
+        get_runner(agent)
+    for module in _ADK_RUN_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            # Moved or gone in another ADK version: the first run imports whatever it needs
+            pass
 
+
+async def evict_idle_sessions(idle_seconds: float = AGENT_SESSION_IDLE_SECONDS) -> int:
+    """Deletes presentation sessions that haven't been used for `idle_seconds`. Returns how many."""
+    now = time.monotonic()
+    idle = [
+        session_id for session_id, last_used in _session_last_used.items()
+        if now - last_used > idle_seconds and session_id not in _sessions_in_use
+    ]
+    for session_id in idle:
+        del _session_last_used[session_id]
+        await session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    return len(idle)
+
+
+@asynccontextmanager
+async def agent_session(session_key: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yields the id of the session an LLM call should run in.
+    With a `session_key` (e.g. a presentation id) calls share a session, so the agent sees the
+    recent history of that presentation; it is created on first use and deleted once idle for
+    AGENT_SESSION_IDLE_SECONDS. Without one, the call runs in a throwaway session of its own.
     """
+    with span("agent_session"):
+        await evict_idle_sessions()
 
-    # Create the specific session where the conversation will happen
-    
+    if session_key is None:
+        with span("agent_session"):
+            session = await session_service.create_session(
+                app_name=APP_NAME,
+                user_id=USER_ID,
+                session_id=f"call_{uuid.uuid4().hex}"
+            )
+        try:
+            yield session.id
+        finally:
+            await session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session.id)
+        return
+
+    session_id = f"presentation_{session_key}"
+    async with _session_create_lock:
+        with span("agent_session"):
+            if session_id not in _session_last_used:
+                await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+                print(f"Session created: App='{APP_NAME}', User='{USER_ID}', Session='{session_id}'")
+            _session_last_used[session_id] = time.monotonic()
+            _sessions_in_use[session_id] = _sessions_in_use.get(session_id, 0) + 1
+    try:
+        yield session_id
+    finally:
+        _session_last_used[session_id] = time.monotonic()
+        _sessions_in_use[session_id] -= 1
+        if not _sessions_in_use[session_id]:
+            del _sessions_in_use[session_id]
 
-    # --- Runner ---
-    # Key Concept: Runner orchestrates the agent execution loop.
-    runner = Runner(
-        agent=agent, # The agent we want to run
-        app_name=APP_NAME,   # Associates runs with our app
-        session_service=session_service # Uses our session manager
-    )
-    print(f"Runner created for agent '{runner.agent.name}'.")
-    return runner, session
+
+def session_stats() -> Dict[str, int]:
+    return {
+        "runners": len(_runners),
+        "presentation_sessions": len(_session_last_used),
+        "sessions_in_use": len(_sessions_in_use),
+        "llm_calls_in_flight": _llm_calls_in_flight,
+    }
 
 
 async def call_llm(
@@ -122,30 +309,72 @@ async def call_llm(
     runner: Runner,
     session_id: str
 ):
-    """Sends a query to the specified agent/runner and prints results."""
-    
-
+    """
+    Sends a query to the specified agent/runner and returns its structured output.
+    The output is parsed from this call's own final response rather than read back from
+    session.state[output_key], which another call running in the same session could overwrite.
+    """
+    global _llm_calls_in_flight
     user_content = types.Content(role='user', parts=[types.Part(text=query)])
 
-    
-    async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_content):
-        # print(f"Event: {event.type}, Author: {event.author}") # Uncomment for detailed logging
-        if event.is_final_response() and event.content and event.content.parts:
-            # For output_schema, the content is the JSON string itself
-            final_response_content = event.content.parts[0].text
+    final_response_content = None
+    _llm_calls_in_flight += 1
+    try:
+        with span("llm_call"):
+            async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_content):
+                # print(f"Event: {event.type}, Author: {event.author}") # Uncomment for detailed logging
+                if event.is_final_response() and event.content and event.content.parts:
+                    # For output_schema, the content is the JSON string itself
+                    final_response_content = event.content.parts[0].text
+    except BaseException:
+        session_service.discard_turn(APP_NAME, USER_ID, session_id, query)
+        raise
+    finally:
+        _llm_calls_in_flight -= 1
+
+    if final_response_content is None:
+        return None
+    with span("llm_parse"):
+        try:
+            return json.loads(final_response_content)
+        except json.JSONDecodeError:
+            # Left to the caller's validation to report
+            return final_response_content
 
 
-    current_session = await session_service.get_session(app_name=APP_NAME,
-                                            user_id=USER_ID,
-                                            session_id=SESSION_ID)
+async def stream_llm(
+    agent: Agent,
+    query: str,
+    runner: Runner,
+    session_id: str
+):
+    """
+    Sends a query to the specified agent/runner with streaming enabled.
+    Yields (text, is_final) pairs: response text chunks as the model produces them
+    (is_final=False), then the complete response text once (is_final=True).
+    """
+    global _llm_calls_in_flight
+    user_content = types.Content(role='user', parts=[types.Part(text=query)])
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE)
 
+    # Timed up to the first chunk only: after that, the time depends on how fast the caller consumes the stream
+    started = time.perf_counter()
+    first_chunk = True
+    _llm_calls_in_flight += 1
     try:
-        # Attempt to parse and pretty print if it's JSON
-        # parsed_output = json.loads(stored_output)
-        # print(json.dumps(parsed_output, indent=2))
-        stored_output = current_session.state.get(agent.output_key)
-        return stored_output
-    except (json.JSONDecodeError, TypeError):
-          # Otherwise, print as string
-        print("heloo")
-    print("-" * 30)
\ No newline at end of file
+        async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=user_content, run_config=run_config):
+            if not (event.content and event.content.parts and event.content.parts[0].text):
+                continue
+            if first_chunk:
+                record("llm_first_chunk", time.perf_counter() - started)
+                first_chunk = False
+            if event.partial:
+                yield event.content.parts[0].text, False
+            elif event.is_final_response():
+                # For output_schema, the content is the JSON string itself
+                yield event.content.parts[0].text, True
+    except BaseException:
+        session_service.discard_turn(APP_NAME, USER_ID, session_id, query)
+        raise
+    finally:
+        _llm_calls_in_flight -= 1
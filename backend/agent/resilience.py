@@ -0,0 +1,191 @@
+# resilience.py
+
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from pydantic import ValidationError
+from google.genai import errors as genai_errors
+
+# LLM_CALL_TIMEOUT_SECONDS: deadline of a single attempt of an agent call.
+# LLM_MAX_ATTEMPTS: attempts per call. Timeouts, transient API errors (429 and 5xx) and responses
+#                   that fail schema validation are retried; the validation error is sent back
+#                   to the model with the retry so it can correct its answer.
+# LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS: the wait before retry n is random between 0 and
+#                   min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**n) ("full jitter"), so
+#                   requests retrying against an overloaded model spread out instead of bunching up.
+# LLM_HEDGE: "1" sends a second, identical request when the first hasn't answered after the
+#            agent's recent LLM_HEDGE_QUANTILE latency, and takes whichever valid response comes
+#            first. Costs up to 1 - LLM_HEDGE_QUANTILE extra calls to cut the slow tail.
+# LLM_HEDGE_MIN_SAMPLES: completed calls of an agent needed before its latency is used for hedging.
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "90"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# HTTP statuses of API errors worth retrying: timeouts, rate limits and server-side failures
+TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+# Recent response times kept per agent for the hedging delay
+LATENCY_WINDOW = 200
+
+T = TypeVar("T")
+
+# Key: agent key (see `call_with_retries`), Value: recent response times in seconds
+_latencies: Dict[str, Deque[float]] = {}
+# Counters, reported by /metrics
+_stats: Dict[str, int] = {
+    "calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "transient_errors": 0,
+    "validation_failures": 0, "failed": 0, "hedges": 0, "hedge_wins": 0,
+}
+
+
+class AgentCallTimeout(TimeoutError):
+    """
+    Raised when every attempt of an agent call ran past LLM_CALL_TIMEOUT_SECONDS.
+    The API layer turns this into a 504.
+    """
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors that a later attempt may not hit: timeouts, dropped connections, 429 and 5xx."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, genai_errors.APIError) and error.code in TRANSIENT_STATUS_CODES
+
+
+def backoff_seconds(retry: int, base: float = LLM_RETRY_BASE_SECONDS, cap: float = LLM_RETRY_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff before retry number `retry` (1 for the first retry)."""
+    return random.uniform(0, min(cap, base * 2 ** retry))
+
+
+def hedge_delay(key: str, quantile: float = LLM_HEDGE_QUANTILE, min_samples: int = LLM_HEDGE_MIN_SAMPLES) -> Optional[float]:
+    """The agent's recent `quantile` response time, or None until it has `min_samples` of them."""
+    latencies = _latencies.get(key)
+    if latencies is None or len(latencies) < min_samples:
+        return None
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def _observe(key: str, seconds: float):
+    latencies = _latencies.get(key)
+    if latencies is None:
+        latencies = _latencies[key] = deque(maxlen=LATENCY_WINDOW)
+    latencies.append(seconds)
+
+
+def _feedback(prompt: str, error: ValidationError) -> str:
+    problems = "; ".join(
+        f"{'.'.join(str(part) for part in problem['loc']) or 'response'}: {problem['msg']}"
+        for problem in error.errors()[:5]
+    )
+    return (
+        f"{prompt}\n\n    Your previous response was rejected because it did not match the required JSON schema "
+        f"({problems}). Respond again with only the JSON object, following the schema exactly.\n"
+    )
+
+
+async def _first_valid(key: str, run: Callable[[bool], Awaitable[T]], hedge: bool) -> T:
+    """
+    Runs one attempt, `run(False)`; with `hedge`, starts an identical one, `run(True)`, if the
+    first is slower than the agent's hedging delay, and returns the first of them to succeed.
+    """
+    delay = hedge_delay(key) if hedge else None
+    if delay is None:
+        return await run(False)
+
+    tasks = [asyncio.create_task(run(False))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+        _stats["hedges"] += 1
+        tasks.append(asyncio.create_task(run(True)))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        _stats["hedge_wins"] += 1
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        # The slower request (or both, if the caller is cancelled) is abandoned
+        for task in tasks:
+            task.cancel()
+
+
+async def call_with_retries(
+    key: str,
+    attempt: Callable[[str, bool], Awaitable[object]],
+    validate: Callable[[object], T],
+    prompt: str,
+    max_attempts: Optional[int] = None,
+    timeout: Optional[float] = None,
+    hedge: Optional[bool] = None,
+) -> T:
+    """
+    Calls `attempt(prompt, hedged)` (one LLM call, returning the raw output) and returns
+    `validate(output)`, retrying with jittered backoff on timeouts, transient errors and
+    ValidationError, up to `max_attempts` times. Each attempt has a deadline of `timeout` seconds,
+    and may be hedged (see LLM_HEDGE): `hedged` is True for the duplicate, which runs alongside
+    the attempt it hedges and so must not share its state (e.g. an agent session).
+    `key` identifies the agent whose response times set the hedging delay.
+    Other errors are raised at once. When attempts run out the last error is raised, as
+    AgentCallTimeout if it was a timeout. Unset options default to the LLM_* settings.
+    """
+    max_attempts = max(1, max_attempts or LLM_MAX_ATTEMPTS)
+    timeout = timeout or LLM_CALL_TIMEOUT_SECONDS
+    hedge = LLM_HEDGE if hedge is None else hedge
+    _stats["calls"] += 1
+    attempt_prompt = prompt
+    last_error: Optional[BaseException] = None
+    for retry in range(max_attempts):
+        if retry:
+            _stats["retries"] += 1
+            await asyncio.sleep(backoff_seconds(retry, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS))
+
+        async def run(hedged: bool, attempt_prompt=attempt_prompt):
+            _stats["attempts"] += 1
+            started = time.perf_counter()
+            output = await asyncio.wait_for(attempt(attempt_prompt, hedged), timeout)
+            _observe(key, time.perf_counter() - started)
+            return validate(output)
+
+        try:
+            return await _first_valid(key, run, hedge)
+        except ValidationError as e:
+            _stats["validation_failures"] += 1
+            attempt_prompt = _feedback(prompt, e)
+            last_error = e
+        except TimeoutError as e:
+            _stats["timeouts"] += 1
+            last_error = e
+        except Exception as e:
+            if not is_transient(e):
+                _stats["failed"] += 1
+                raise
+            _stats["transient_errors"] += 1
+            last_error = e
+        print(f"Agent call to {key} failed (attempt {retry + 1}/{max_attempts}): {type(last_error).__name__}: {last_error}")
+
+    _stats["failed"] += 1
+    if isinstance(last_error, TimeoutError):
+        raise AgentCallTimeout(f"The model did not answer within {timeout:g}s ({max_attempts} attempts).") from last_error
+    raise last_error
+
+
+def resilience_stats() -> Dict[str, object]:
+    """Attempt, retry, timeout and hedging counters, and each agent's current hedging delay."""
+    return {
+        **_stats,
+        "hedge_delay_seconds": {key: round(delay, 3) for key in list(_latencies) if (delay := hedge_delay(key)) is not None},
+    }
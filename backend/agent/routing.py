@@ -0,0 +1,289 @@
+# routing.py
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar, Union
+from google.adk.agents import Agent
+from google.adk.models.base_llm import BaseLlm
+
+# LLM_ROUTE_DECK, LLM_ROUTE_EDIT, LLM_ROUTE_SKETCH: fallback chain of models for deck generation
+#     (whole decks, outlines and slides), slide edits and sketches; comma-separated, preferred
+#     first, e.g. "gemini-2.5-flash,gemini-2.0-flash". Empty uses the agent's own model alone.
+# LLM_ROUTE_LIGHT: models tried first for light requests (prompt of at most LLM_LIGHT_PROMPT_TOKENS
+#     covering at most LLM_LIGHT_SLIDES slides, of a task in LLM_LIGHT_TASKS), e.g. a single-bullet
+#     edit, before the task's own chain. Empty routes light requests like the others.
+# LLM_SLO_DECK_SECONDS, LLM_SLO_EDIT_SECONDS, LLM_SLO_SKETCH_SECONDS: latency target of a task. A model
+#     whose recent p90 latency for an agent is over its task's target, or whose recent error rate is
+#     over LLM_ROUTE_MAX_ERROR_RATE, is skipped for the next model in the chain while another meets them.
+# LLM_ROUTE_WINDOW_SECONDS: how long a call's outcome counts towards its model's latency and error rate.
+# LLM_ROUTE_MIN_SAMPLES: recent calls needed before a model's latency and errors are judged.
+# LLM_ROUTE_PROBE_SECONDS: a model skipped for missing its targets is sent one call this often. If
+#     that call succeeds within the target, the model's history is cleared and it takes traffic again.
+LLM_ROUTES = {
+    "deck": os.getenv("LLM_ROUTE_DECK", ""),
+    "edit": os.getenv("LLM_ROUTE_EDIT", ""),
+    "sketch": os.getenv("LLM_ROUTE_SKETCH", ""),
+}
+LLM_ROUTE_LIGHT = os.getenv("LLM_ROUTE_LIGHT", "")
+LLM_LIGHT_TASKS = os.getenv("LLM_LIGHT_TASKS", "edit")
+LLM_LIGHT_PROMPT_TOKENS = int(os.getenv("LLM_LIGHT_PROMPT_TOKENS", "1500"))
+LLM_LIGHT_SLIDES = int(os.getenv("LLM_LIGHT_SLIDES", "1"))
+LLM_SLOS = {
+    "deck": float(os.getenv("LLM_SLO_DECK_SECONDS", "45")),
+    "edit": float(os.getenv("LLM_SLO_EDIT_SECONDS", "8")),
+    "sketch": float(os.getenv("LLM_SLO_SKETCH_SECONDS", "15")),
+}
+LLM_ROUTE_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTE_MAX_ERROR_RATE", "0.2"))
+LLM_ROUTE_WINDOW_SECONDS = float(os.getenv("LLM_ROUTE_WINDOW_SECONDS", "300"))
+LLM_ROUTE_MIN_SAMPLES = int(os.getenv("LLM_ROUTE_MIN_SAMPLES", "10"))
+LLM_ROUTE_PROBE_SECONDS = float(os.getenv("LLM_ROUTE_PROBE_SECONDS", "30"))
+
+# Outcomes kept per agent and model
+OUTCOME_WINDOW = 100
+# Latency quantile compared with the task's target
+SLO_QUANTILE = 0.9
+
+Model = Union[str, BaseLlm]
+T = TypeVar("T")
+
+
+def model_name(model: Model) -> str:
+    return getattr(model, "model", model)
+
+
+def _parse_chain(value: str) -> List[Model]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+# Key: (id() of the agent, model name), Value: a copy of the agent running on that model. A few
+# per agent, each with its own pooled runner (see `get_runner`).
+_model_agents: Dict[Tuple[int, str], Agent] = {}
+
+
+def model_agent(agent: Agent, model: Model) -> Agent:
+    """`agent` itself if it already runs on `model`, otherwise a copy of it that does."""
+    if model_name(model) == model_name(agent.model):
+        return agent
+    key = (id(agent), model_name(model))
+    variant = _model_agents.get(key)
+    if variant is None or (not isinstance(model, str) and variant.model is not model):
+        variant = _model_agents[key] = agent.model_copy(update={"model": model})
+    return variant
+
+
+class ModelHealth:
+    """
+    Recent outcomes of one agent's calls to one model (latencies, with None for errors), and
+    whether the model is being skipped for missing its targets: since when, and whether a probe
+    call is on its way. After a successful probe the model is on trial: it is sent one call at a
+    time until LLM_ROUTE_MIN_SAMPLES in a row are within the target, and skipped again otherwise.
+    """
+
+    def __init__(self):
+        self.outcomes: Deque[Tuple[float, Optional[float]]] = deque(maxlen=OUTCOME_WINDOW)
+        self.skipped_since: Optional[float] = None
+        self.probing = False
+        self.on_trial = False
+
+    def add(self, seconds: Optional[float]):
+        self.outcomes.append((time.monotonic(), seconds))
+
+    def recent(self, window_seconds: float) -> List[Optional[float]]:
+        since = time.monotonic() - window_seconds
+        return [seconds for at, seconds in self.outcomes if at >= since]
+
+    def summary(self, window_seconds: float) -> Tuple[int, float, Optional[float]]:
+        """Recent calls, their error rate and the p90 latency of those that succeeded."""
+        recent = self.recent(window_seconds)
+        if not recent:
+            return 0, 0.0, None
+        latencies = sorted(seconds for seconds in recent if seconds is not None)
+        error_rate = 1 - len(latencies) / len(recent)
+        p90 = latencies[min(len(latencies) - 1, int(SLO_QUANTILE * len(latencies)))] if latencies else None
+        return len(recent), error_rate, p90
+
+
+class Route:
+    """
+    The models one agent call tries, in order: the routed model first, then the rest of its
+    chain, starting over if there are more attempts than models. Each `call` is one attempt.
+    """
+
+    def __init__(self, router: "ModelRouter", agent: Agent, key: str, task: str, models: List[Model], probe: bool = False):
+        self.router = router
+        self.agent = agent
+        self.key = key
+        self.task = task
+        self.models = models
+        # Whether the first attempt is a skipped model's probe
+        self.probe = probe
+        self.attempts = 0
+
+    def next_model(self) -> Model:
+        model = self.models[self.attempts % len(self.models)]
+        if self.attempts and len(self.models) > 1:
+            self.router._stats["fallbacks"] += 1
+        self.attempts += 1
+        return model
+
+    async def call(self, run: Callable[[Agent], Awaitable[T]]) -> T:
+        """Runs `run` with the agent on the next model, as one `attempt`."""
+        async with self.attempt() as routed_agent:
+            return await run(routed_agent)
+
+    @asynccontextmanager
+    async def attempt(self) -> AsyncIterator[Agent]:
+        """
+        One attempt on the next model, for calls that aren't a single awaitable (e.g. a streamed
+        response): yields the agent on that model and records how long the block took or that it
+        failed. An attempt cancelled part way (timed out, lost a hedge, or its stream was closed
+        early) counts as taking that long.
+        """
+        probe = self.probe and not self.attempts
+        model = self.next_model()
+        health = self.router.health(self.key, model)
+        started = time.perf_counter()
+        try:
+            yield model_agent(self.agent, model)
+        except (asyncio.CancelledError, GeneratorExit):
+            self._observe(health, probe, time.perf_counter() - started)
+            raise
+        except Exception:
+            self._observe(health, probe, None)
+            raise
+        self._observe(health, probe, time.perf_counter() - started)
+
+    def _observe(self, health: ModelHealth, probe: bool, seconds: Optional[float]):
+        self.router.observe(health, seconds, self.task, probe)
+
+
+class ModelRouter:
+    """
+    Picks the model of each agent call from the request (its task, prompt size and the number of
+    slides it covers) and from how each model has recently done for that agent: the first model
+    of the chain that meets the task's latency target and error budget, or, if none does, the
+    one closest to them. A model that misses them is skipped until a probe call shows it has
+    recovered. See the LLM_ROUTE_* settings. Models may be names or ADK model objects.
+    """
+
+    def __init__(
+        self,
+        chains: Optional[Dict[str, List[Model]]] = None,
+        light_chain: Optional[List[Model]] = None,
+        slos: Optional[Dict[str, float]] = None,
+    ):
+        self.chains = chains if chains is not None else {task: _parse_chain(value) for task, value in LLM_ROUTES.items()}
+        self.light_chain = light_chain if light_chain is not None else _parse_chain(LLM_ROUTE_LIGHT)
+        self.light_tasks = set(_parse_chain(LLM_LIGHT_TASKS))
+        self.slos = dict(slos if slos is not None else LLM_SLOS)
+        # Key: (agent key, model name), Value: its recent outcomes
+        self._health: Dict[Tuple[str, str], ModelHealth] = {}
+        self._stats = {"routed": 0, "light": 0, "off_preferred": 0, "fallbacks": 0, "probes": 0}
+        # Key: model name, Value: calls routed to it first
+        self._routed_to: Dict[str, int] = {}
+
+    def health(self, key: str, model: Model) -> ModelHealth:
+        health = self._health.get((key, model_name(model)))
+        if health is None:
+            health = self._health[(key, model_name(model))] = ModelHealth()
+        return health
+
+    def is_light(self, task: str, prompt_tokens: int, slides: int) -> bool:
+        return (
+            bool(self.light_chain) and task in self.light_tasks
+            and prompt_tokens <= LLM_LIGHT_PROMPT_TOKENS and slides <= LLM_LIGHT_SLIDES
+        )
+
+    def _meets_slo(self, key: str, task: str, model: Model) -> Tuple[bool, Tuple]:
+        """Whether the model currently meets the task's target, and a rank for when none does."""
+        calls, error_rate, p90 = self.health(key, model).summary(LLM_ROUTE_WINDOW_SECONDS)
+        if calls < LLM_ROUTE_MIN_SAMPLES:
+            return True, (False, 0.0)
+        too_many_errors = error_rate > LLM_ROUTE_MAX_ERROR_RATE
+        latency = p90 if p90 is not None else float("inf")
+        slo = self.slos.get(task)
+        return not too_many_errors and (slo is None or latency <= slo), (too_many_errors, latency)
+
+    def route(self, agent: Agent, task: str, prompt_tokens: int, slides: int = 1) -> Route:
+        """The route of one call of `agent` for `task` ("deck", "edit" or "sketch")."""
+        chain = list(self.chains.get(task) or [agent.model])
+        light = self.is_light(task, prompt_tokens, slides)
+        if light:
+            light_names = {model_name(model) for model in self.light_chain}
+            chain = self.light_chain + [model for model in chain if model_name(model) not in light_names]
+        key = f"{agent.name}/{agent.output_schema.__name__}"
+
+        now = time.monotonic()
+        ranks = []
+        chosen = None
+        probe = False
+        for model in chain:
+            health = self.health(key, model)
+            meets, rank = self._meets_slo(key, task, model)
+            if health.skipped_since is not None or health.on_trial:
+                # One probe at a time, and for a skipped model one every LLM_ROUTE_PROBE_SECONDS
+                if not health.probing and (health.on_trial or now - health.skipped_since >= LLM_ROUTE_PROBE_SECONDS):
+                    health.probing = probe = True
+                    chosen = model
+                    break
+            elif meets or len(chain) == 1:
+                chosen = model
+                break
+            else:
+                health.skipped_since = now
+                print(f"Model '{model_name(model)}' is missing its targets for {key} ({task}), skipping it.")
+            ranks.append((rank, len(ranks), model))
+        if chosen is None:
+            chosen = min(ranks)[2]
+
+        self._stats["routed"] += 1
+        self._stats["probes"] += probe
+        self._stats["light"] += light
+        self._stats["off_preferred"] += model_name(chosen) != model_name(chain[0])
+        self._routed_to[model_name(chosen)] = self._routed_to.get(model_name(chosen), 0) + 1
+        models = [chosen] + [model for model in chain if model_name(model) != model_name(chosen)]
+        return Route(self, agent, key, task, models, probe)
+
+    def observe(self, health: ModelHealth, seconds: Optional[float], task: str, probe: bool = False):
+        """
+        Records the outcome of a call (its seconds, None if it failed). A probe of a skipped model
+        that answers within the task's target puts it on trial, with its history cleared; once
+        LLM_ROUTE_MIN_SAMPLES probes in a row have, it is back in use. A probe that doesn't skips it.
+        """
+        if probe:
+            slo = self.slos.get(task)
+            health.probing = False
+            if seconds is None or (slo is not None and seconds > slo):
+                health.skipped_since = time.monotonic()
+                health.on_trial = False
+            elif not health.on_trial:
+                health.outcomes.clear()
+                health.skipped_since = None
+                health.on_trial = True
+        health.add(seconds)
+        if probe and health.on_trial and len(health.outcomes) >= LLM_ROUTE_MIN_SAMPLES:
+            health.on_trial = False
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Routing counters, calls routed to each model, and each model's recent calls, error rate,
+        p90 latency and whether it is skipped, per agent (keyed "<agent>/<schema>/<model>").
+        """
+        calls, error_rates, p90s, skipped = {}, {}, {}, {}
+        for (key, name), health in list(self._health.items()):
+            label = f"{key}/{name}"
+            calls[label], error_rate, p90 = health.summary(LLM_ROUTE_WINDOW_SECONDS)
+            error_rates[label] = round(error_rate, 3)
+            if p90 is not None:
+                p90s[label] = round(p90, 3)
+            skipped[label] = int(health.skipped_since is not None)
+        return {
+            **self._stats, "routed_to": dict(self._routed_to), "model_calls": calls,
+            "model_error_rate": error_rates, "model_p90_seconds": p90s, "model_skipped": skipped,
+        }
+
+
+model_router = ModelRouter()
@@ -2,31 +2,123 @@
 
 import json
 import os
+import time
+import asyncio
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
-from models.model import PresentationContent, SlideContent , MermaidOutput
-from agent.agent import call_llm , get_runner_session,ppt_agent , worflow,edit_agent
+from models.model import PresentationContent, SlideContent , MermaidOutput , PresentationOutline
+from llm_cache import llm_cache, cache_key, LLM_CACHE_BYPASS
+from edit_rules import apply_literal_edit, record_edit
+from metrics import span
+from prompt_builder import prompt_json, deck_context, truncate_to_tokens, restore_server_fields, record_prompt, estimate_tokens
+from agent.resilience import call_with_retries, AgentCallTimeout
+from agent.routing import model_router
+from agent.agent import call_llm , stream_llm , get_runner , agent_session , ppt_agent , worflow , edit_agent , outline_agent , slide_agent
 
 # Load environment variables (e.g., for API keys if you integrate real LLMs)
 load_dotenv()
 
+# Two-phase ("parallel") deck generation
+# SLIDE_FAN_OUT: how many slides are generated concurrently once the outline is known.
+# SLIDE_MAX_ATTEMPTS: how many times a single slide is requested before the deck fails.
+SLIDE_FAN_OUT = int(os.getenv("SLIDE_FAN_OUT", "4"))
+SLIDE_MAX_ATTEMPTS = int(os.getenv("SLIDE_MAX_ATTEMPTS", "3"))
+# EDIT_CONCURRENCY: how many slides of a batch edit are sent to the agent at once.
+EDIT_CONCURRENCY = int(os.getenv("EDIT_CONCURRENCY", "4"))
+# EDIT_FAST_PATH: "0" sends every edit to the agent, even literal ones (see edit_rules.py).
+EDIT_FAST_PATH = os.getenv("EDIT_FAST_PATH", "1") != "0"
+
+
+
+def _deck_prompt(description: str, num_slides: int, audience: str, tone: str) -> str:
+    # This is a critical prompt engineering step. You need to guide the LLM precisely
+    # to produce the desired structured output.
+    return f"""
+    You are an expert presentation designer and content creator. Your task is to generate a structured outline for a multi-slide presentation.
+
+    **Presentation Description:** "{truncate_to_tokens(description)}"
+    **Target Audience:** {audience}
+    **Tone/Style:** {tone}
+    **Number of Slides:** Aim for approximately {num_slides} slides, but adjust if necessary for coherence and completeness.
+
+    Also, suggest an 'overall_theme' for the entire presentation, which can guide the visual design (e.g., 'professional', 'minimalist', 'playful', 'academic', 'dynamic').
+
+    """
+
+
+def _bypass_cache(endpoint: str, use_cache: bool) -> bool:
+    return not use_cache or endpoint in LLM_CACHE_BYPASS
+
+
+async def _cached_llm_call(
+    agent, prompt: str, endpoint: str, use_cache: bool = True, session_key: Optional[str] = None,
+    max_attempts: Optional[int] = None, slides: int = 1
+):
+    """
+    Runs `agent` on `prompt` through the response cache and returns its output validated against
+    the agent's output schema. Only outputs that validate are cached, so a malformed response is
+    never served again. `endpoint` ("deck", "edit" or "sketch") is checked against LLM_CACHE_BYPASS.
+    On a cache miss the call has a deadline and is retried (with the validation error, if that
+    was the problem) up to `max_attempts` times, LLM_MAX_ATTEMPTS by default; see agent/resilience.py.
+    Each attempt runs on the model the router picks for the endpoint, the prompt's size and the
+    `slides` the response covers, falling back along the endpoint's chain; see agent/routing.py.
+    """
+    def validate(agent_output):
+        with span("validate"):
+            return agent.output_schema.model_validate(agent_output).model_dump(mode="json")
+
+    async def call():
+        route = model_router.route(agent, endpoint, estimate_tokens(prompt), slides)
+        # A hedged duplicate runs in a throwaway session: two requests adding turns to the
+        # presentation's session at once would leave the abandoned one's in its history
+        return await call_with_retries(
+            route.key,
+            lambda attempt_prompt, hedged: route.call(
+                lambda routed_agent: _call_agent(routed_agent, attempt_prompt, None if hedged else session_key)
+            ),
+            validate,
+            prompt,
+            **({"max_attempts": max_attempts} if max_attempts else {})
+        )
+
+    agent_output = await llm_cache.get_or_call(agent, prompt, call, bypass=_bypass_cache(endpoint, use_cache))
+    with span("validate"):
+        return agent.output_schema.model_validate(agent_output)
 
 
 async def get_slide_content_from_description(
     description: str,
     num_slides: int,
     audience: str,
-    tone: str
+    tone: str,
+    use_cache: bool = True,
+    session_key: Optional[str] = None
 ) -> PresentationContent:
     """
     Generates a structured PresentationContent object using an LLM
     based on the user's overall presentation description.
+    Identical requests are answered from the LLM response cache unless `use_cache` is False.
+    `session_key` (the presentation id) selects the agent session the call runs in.
     """
-    # This is a critical prompt engineering step. You need to guide the LLM precisely
-    # to produce the desired structured output.
-    prompt = f"""
-    You are an expert presentation designer and content creator. Your task is to generate a structured outline for a multi-slide presentation.
+    prompt = _deck_prompt(description, num_slides, audience, tone)
 
-    **Presentation Description:** "{description}"
+    try:
+        agent_output = await _cached_llm_call(ppt_agent, prompt, "deck", use_cache, session_key, slides=num_slides)
+               # Validate and parse the LLM's JSON output into our Pydantic model
+        return agent_output
+    except AgentCallTimeout:
+        raise # Not a bad response: the API layer answers 504
+    except Exception as e:
+        # print(f"Error parsing LLM output for content generation: {e}")
+        # print(f"Raw LLM output: {agent_output}")
+        raise ValueError(f"Failed to parse LLM response for content generation: {e}")
+
+
+def _outline_prompt(description: str, num_slides: int, audience: str, tone: str) -> str:
+    return f"""
+    You are an expert presentation designer. Your task is to plan a multi-slide presentation: give it a name and write one title per slide. The slide contents will be written later, one slide at a time.
+
+    **Presentation Description:** "{truncate_to_tokens(description)}"
     **Target Audience:** {audience}
     **Tone/Style:** {tone}
     **Number of Slides:** Aim for approximately {num_slides} slides, but adjust if necessary for coherence and completeness.
@@ -36,75 +128,309 @@ async def get_slide_content_from_description(
     """
 
 
+def _slide_prompt(description: str, audience: str, tone: str, outline: PresentationOutline, slide_index: int) -> str:
+    # The whole outline is included so each slide stays on its own topic and doesn't repeat its neighbours.
+    titles = "\n".join(f"    {i + 1}. {title}" for i, title in enumerate(outline.slide_titles))
+    return f"""
+    You are an expert presentation designer and content creator. Your task is to write the content of one slide of the presentation "{outline.name}".
+
+    **Presentation Description:** "{truncate_to_tokens(description)}"
+    **Target Audience:** {audience}
+    **Tone/Style:** {tone}
+    **Overall Theme:** {outline.overall_theme}
+    **Slide Titles:**
+{titles}
+
+    Write slide {slide_index + 1}, titled "{outline.slide_titles[slide_index]}".
+
+    """
+
+
+async def _call_agent(agent, prompt: str, session_key: Optional[str] = None):
+    """
+    Runs one LLM call on the agent's pooled runner, in the session of `session_key`
+    (e.g. a presentation id), or in a throwaway session when there is none.
+    """
+    tokens = record_prompt(agent.name, prompt)
+    print(f"Prompt for agent '{agent.name}': ~{tokens} tokens.")
+    async with agent_session(session_key) as session_id:
+        return await call_llm(agent, prompt, get_runner(agent), session_id)
+
+
+async def _generate_slide(
+    description: str,
+    audience: str,
+    tone: str,
+    outline: PresentationOutline,
+    slide_index: int,
+    semaphore: asyncio.Semaphore,
+    max_attempts: int,
+    use_cache: bool
+) -> SlideContent:
+    """
+    Generates one slide of the outline, retrying only this slide (up to `max_attempts` times)
+    if the call fails or its output doesn't validate.
+    """
+    prompt = _slide_prompt(description, audience, tone, outline, slide_index)
+    async with semaphore:
+        try:
+            # Each slide runs in a throwaway session: they're independent, and 20 slide turns
+            # would crowd the presentation's own history out of its token budget.
+            slide = await _cached_llm_call(slide_agent, prompt, "deck", use_cache, max_attempts=max_attempts)
+        except AgentCallTimeout:
+            raise
+        except Exception as e:
+            raise ValueError(f"Slide {slide_index + 1} failed after {max_attempts} attempts: {e}")
+    # The outline's title is authoritative, and images are only ever set by the server
+    return slide.model_copy(update={"title": outline.slide_titles[slide_index], "image_hash": None})
+
+
+async def get_slide_content_parallel(
+    description: str,
+    num_slides: int,
+    audience: str,
+    tone: str,
+    fan_out: int = SLIDE_FAN_OUT,
+    max_attempts: int = SLIDE_MAX_ATTEMPTS,
+    use_cache: bool = True,
+    session_key: Optional[str] = None
+) -> PresentationContent:
+    """
+    Two-phase variant of `get_slide_content_from_description`: first asks for a short outline
+    (name, theme and slide titles), then generates every slide's bullets and image description
+    concurrently, at most `fan_out` at a time. Latency is roughly one outline call plus the slowest
+    slide, rather than growing with the number of slides, and a slide that fails is retried on
+    its own instead of regenerating the whole deck.
+    The outline and each slide are cached separately, so a repeated request is answered from the
+    LLM response cache unless `use_cache` is False.
+    """
     try:
-        runner , session = await get_runner_session(ppt_agent)
-        agent_output = await call_llm(ppt_agent,prompt,runner,session.id)
-        
-        agent_output = PresentationContent.model_validate(agent_output)
-               # Validate and parse the LLM's JSON output into our Pydantic model
-        return agent_output
+        outline = await _cached_llm_call(
+            outline_agent, _outline_prompt(description, num_slides, audience, tone), "deck", use_cache, session_key,
+            slides=num_slides
+        )
+    except AgentCallTimeout:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to parse LLM response for outline generation: {e}")
+    if not outline.slide_titles:
+        raise ValueError("Failed to parse LLM response for outline generation: the outline has no slides.")
+
+    semaphore = asyncio.Semaphore(max(1, fan_out))
+    tasks = [
+        asyncio.create_task(_generate_slide(description, audience, tone, outline, i, semaphore, max(1, max_attempts), use_cache))
+        for i in range(len(outline.slide_titles))
+    ]
+    try:
+        slides: List[SlideContent] = await asyncio.gather(*tasks)
+    finally:
+        # If one slide gives up (or the request is cancelled), don't leave the others running.
+        for task in tasks:
+            task.cancel()
+
+    return PresentationContent(name=outline.name, overall_theme=outline.overall_theme, slides=slides)
+
+
+class DeckStreamParser:
+    """
+    Incrementally parses the streamed JSON of a PresentationContent.
+    `feed` takes the next chunk of text and returns what became complete in it:
+      ("deck", {"name": ..., "overall_theme": ...})  once, when the slides array starts
+      ("slide", dict)                                 for each slide object, in order
+    Only the top-level object and the objects inside "slides" are tracked; everything else is
+    skipped over, so the parser doesn't need the rest of the schema.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expecting_key = False
+        self._key = None
+        self._value_start = None
+        self._slide_start = None
+        self.fields = {}
+        self.deck_sent = False
+
+    def _deck_event(self):
+        self.deck_sent = True
+        return ("deck", {"name": self.fields.get("name"), "overall_theme": self.fields.get("overall_theme")})
+
+    def feed(self, text: str):
+        events = []
+        self.buffer += text
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expecting_key:
+                        self._key = json.loads(buffer[self._string_start:i + 1])
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expecting_key = True
+                elif self._depth == 3 and c == "{" and self._key == "slides":
+                    self._slide_start = i
+            elif c in "}]":
+                if self._depth == 3 and c == "}" and self._key == "slides" and self._slide_start is not None:
+                    events.append(("slide", json.loads(buffer[self._slide_start:i + 1])))
+                    self._slide_start = None
+                elif self._depth == 1:
+                    self._end_top_level_value(i)
+                self._depth -= 1
+            elif self._depth == 1 and c == ":":
+                self._expecting_key = False
+                self._value_start = i + 1
+                if self._key == "slides" and not self.deck_sent:
+                    events.append(self._deck_event())
+            elif self._depth == 1 and c == ",":
+                self._end_top_level_value(i)
+                self._expecting_key = True
+        self._pos = len(buffer)
+        return events
+
+    def _end_top_level_value(self, end: int):
+        if self._value_start is not None and self._key != "slides":
+            raw = self.buffer[self._value_start:end].strip()
+            if raw:
+                self.fields[self._key] = json.loads(raw)
+        self._value_start = None
+
+
+async def stream_slide_content_from_description(
+    description: str,
+    num_slides: int,
+    audience: str,
+    tone: str,
+    use_cache: bool = True,
+    session_key: Optional[str] = None
+):
+    """
+    Streaming variant of `get_slide_content_from_description`.
+    Yields ("deck", {"name", "overall_theme"}) first, then ("slide", SlideContent) for each slide
+    as soon as the LLM has finished writing and it validates, and finally
+    ("done", PresentationContent) with the complete, validated presentation.
+    Shares the LLM response cache with `get_slide_content_from_description`: a cached deck is
+    sent all at once.
+    """
+    prompt = _deck_prompt(description, num_slides, audience, tone)
+    key = cache_key(ppt_agent, prompt)
+    bypass = _bypass_cache("deck", use_cache)
+    cached = None if bypass else llm_cache.lookup(key)
+    if cached is not None:
+        agent_output = PresentationContent.model_validate(cached)
+        yield "deck", {"name": agent_output.name, "overall_theme": agent_output.overall_theme}
+        for slide in agent_output.slides:
+            yield "slide", slide
+        yield "done", agent_output
+        return
+
+    parser = DeckStreamParser()
+    slide_count = 0
+    start = time.perf_counter()
+
+    try:
+        final_text = None
+        tokens = record_prompt(ppt_agent.name, prompt)
+        print(f"Prompt for agent '{ppt_agent.name}': ~{tokens} tokens.")
+        # Routed like a whole-deck call, but not retried or timed: the client already has part of it.
+        # The stream's total time, or its failure, is recorded against the model like any attempt.
+        route = model_router.route(ppt_agent, "deck", tokens, num_slides)
+        async with route.attempt() as streaming_agent, agent_session(session_key) as session_id:
+            async for text, is_final in stream_llm(streaming_agent, prompt, get_runner(streaming_agent), session_id):
+                if is_final:
+                    final_text = text
+                    # Without partial chunks (e.g. the model didn't stream), parse the whole response here
+                    if not parser.buffer:
+                        events = parser.feed(text)
+                    else:
+                        continue
+                else:
+                    events = parser.feed(text)
+                for kind, value in events:
+                    if kind == "slide":
+                        slide_count += 1
+                        yield kind, SlideContent.model_validate(value)
+                    else:
+                        yield kind, value
+
+        if final_text is None:
+            raise ValueError("The agent returned no final response.")
+        with span("validate"):
+            agent_output = PresentationContent.model_validate_json(final_text)
     except Exception as e:
-        # print(f"Error parsing LLM output for content generation: {e}")
-        # print(f"Raw LLM output: {agent_output}")
         raise ValueError(f"Failed to parse LLM response for content generation: {e}")
-    
+    if bypass:
+        llm_cache.bypassed += 1
+    llm_cache.store(key, agent_output.model_dump(mode="json"), time.perf_counter() - start)
+
+    if not parser.deck_sent:
+        yield "deck", {"name": agent_output.name, "overall_theme": agent_output.overall_theme}
+    # In case the streamed chunks and the final response disagree, the final response wins
+    for slide in agent_output.slides[slide_count:]:
+        yield "slide", slide
+    yield "done", agent_output
+
 
 
 async def get_mermaid_output_from_description(
-    description: dict
+    description: dict,
+    use_cache: bool = True
 ) -> MermaidOutput:
     """
     Generates a MermaidOutput object using an LLM based on the user's description.
     This is used for creating Excalidraw components and workflows.
+    Identical requests are answered from the LLM response cache unless `use_cache` is False.
     """
     
 
     try:
-        runner , session = await get_runner_session(worflow)
-        agent_output = await call_llm(worflow,description,runner,session.id)
-        agent_output = MermaidOutput.model_validate(agent_output)
+        agent_output = await _cached_llm_call(worflow, truncate_to_tokens(description), "sketch", use_cache)
         return agent_output
+    except AgentCallTimeout:
+        raise
     except Exception as e:
         # print(f"Error parsing LLM output for mermaid generation: {e}")
         # print(f"Raw LLM output: {agent_output}")
         raise ValueError(f"Failed to parse LLM response for mermaid generation: {e}")    
 
 
-async def get_edited_content_from_agent(
-    current_presentation_content: PresentationContent, # Provides context of entire presentation
-    slide_index: int,
-    element_id: str, # e.g., "title", "bullet_points", "image_description", "bullet_point_0"
-    edit_instruction: str,
-    current_element_content: str # The specific content of the element being edited
-) -> SlideContent:
-    """
-    Applies an agentic edit to a specific element on a slide using an LLM.
-    Returns the updated SlideContent object for that specific slide.
-    """
-    if slide_index < 0 or slide_index >= len(current_presentation_content.slides):
-        raise ValueError(f"Slide index {slide_index} is out of bounds for the current presentation.")
-
-    current_slide = current_presentation_content.slides[slide_index]
-    # Convert current_slide to a dictionary for easier LLM context inclusion in the prompt
-    current_slide_dict = current_slide.model_dump()
-
+def _edit_prompt(content: PresentationContent, slide_index: int, element_id: str, edit_instruction: str, current_element_content: str) -> str:
     # Craft a detailed prompt for editing. This prompt provides the LLM with:
-    # 1. The full current slide content.
-    # 2. The specific element to edit.
-    # 3. The user's natural language instruction for the edit.
+    # 1. The full current slide content (compact JSON, without image hashes; see prompt_builder.py).
+    # 2. The rest of the deck, as far as PROMPT_CONTEXT_TOKENS allows.
+    # 3. The specific element to edit.
+    # 4. The user's natural language instruction for the edit.
     # The LLM is then asked to return the *entire* updated SlideContent for that slide.
-    prompt = f"""
+    return f"""
     You are an intelligent editor assisting in refining a single presentation slide.
     A user wants to make an edit to a specific element on this slide.
 
-    **Current Slide Content (JSON):**
+    **Current Slide Content (JSON, slide {slide_index + 1}):**
     ```json
-    {json.dumps(current_slide_dict, indent=2)}
+    {prompt_json(content.slides[slide_index])}
     ```
 
+    **Rest of the Presentation (for context only, do not edit):**
+    {deck_context(content, slide_index)}
+
     **Element to Target for Edit:** "{element_id}" (This identifies the part of the JSON to focus on, e.g., "title", "bullet_points", or "image_description". If it's like "bullet_point_0", it refers to a specific item in the 'bullet_points' list.)
-    **Current Content of this Targeted Element:** "{current_element_content}"
-    **User's Edit Instruction:** "{edit_instruction}"
+    **Current Content of this Targeted Element:** "{truncate_to_tokens(current_element_content)}"
+    **User's Edit Instruction:** "{truncate_to_tokens(edit_instruction)}"
 
     Based on the 'User's Edit Instruction', carefully update ONLY the relevant part of the JSON structure for this specific slide.
     - If the instruction implies a change to the 'title', 'bullet_points', or 'image_description', modify that field.
@@ -114,6 +440,38 @@ async def get_edited_content_from_agent(
 
     """
 
+
+async def get_edited_content_from_agent(
+    current_presentation_content: PresentationContent, # Provides context of entire presentation
+    slide_index: int,
+    element_id: str, # e.g., "title", "bullet_points", "image_description", "bullet_point_0"
+    edit_instruction: str,
+    current_element_content: str, # The specific content of the element being edited
+    use_cache: bool = True,
+    session_key: Optional[str] = None
+) -> SlideContent:
+    """
+    Applies an agentic edit to a specific element on a slide using an LLM.
+    Returns the updated SlideContent object for that specific slide.
+    The same edit of the same slide is answered from the LLM response cache unless `use_cache` is False.
+    `session_key` (the presentation id) selects the agent session the call runs in.
+    """
+    if slide_index < 0 or slide_index >= len(current_presentation_content.slides):
+        raise ValueError(f"Slide index {slide_index} is out of bounds for the current presentation.")
+
+    current_slide = current_presentation_content.slides[slide_index]
+
+    # Literal instructions ("change this to '...'", "delete this bullet", "move bullet 2 to the top")
+    # are applied directly, without an LLM round trip.
+    with span("edit_fast_path"):
+        fast_path = apply_literal_edit(current_slide, element_id, edit_instruction) if EDIT_FAST_PATH else None
+    record_edit(fast_path[0] if fast_path else None)
+    if fast_path is not None:
+        print(f"Applied edit '{edit_instruction}' to {element_id} locally ({fast_path[0]}).")
+        return fast_path[1]
+
+    prompt = _edit_prompt(current_presentation_content, slide_index, element_id, edit_instruction, current_element_content)
+
     # llm_output_json = await call_llm(
     #     system_prompt="You are a helpful assistant designed to output JSON.",
     #     user_prompt=prompt,
@@ -122,14 +480,94 @@ async def get_edited_content_from_agent(
 
     try:
         # Validate and parse the LLM's JSON output for the updated slide
-        runner , session = await get_runner_session(edit_agent)
-        agent_output = await call_llm(edit_agent,prompt,runner,session.id)
-        print(f"Agent output for edit operation: {agent_output}")
-        # agent_output = PresentationContent.model_validate(agent_output)
-        updated_slide_content = SlideContent.model_validate(agent_output)
-        return updated_slide_content
+        updated_slide_content = await _cached_llm_call(edit_agent, prompt, "edit", use_cache, session_key)
+        print(f"Agent output for edit operation: {updated_slide_content}")
+        return restore_server_fields(updated_slide_content, current_slide)
+    except AgentCallTimeout:
+        raise
     except Exception as e:
         print(f"Error parsing LLM output for edit operation: {e}")
-        print(f"Raw LLM edit output: {updated_slide_content}")
         raise ValueError(f"Failed to parse LLM response for editing: {e}")
 
+
+def _batch_edit_prompt(content: PresentationContent, slide_index: int, edits: List[Tuple[str, str, str]]) -> str:
+    edit_lines = "\n".join(
+        f'    {i + 1}. **Element:** "{element_id}" | **Current Content:** "{truncate_to_tokens(current_element_content)}" | **Instruction:** "{truncate_to_tokens(edit_instruction)}"'
+        for i, (element_id, edit_instruction, current_element_content) in enumerate(edits)
+    )
+    return f"""
+    You are an intelligent editor assisting in refining a single presentation slide.
+    A user wants to make several edits to elements on this slide.
+
+    **Current Slide Content (JSON, slide {slide_index + 1}):**
+    ```json
+    {prompt_json(content.slides[slide_index])}
+    ```
+
+    **Rest of the Presentation (for context only, do not edit):**
+    {deck_context(content, slide_index)}
+
+    **Edits to Apply (in order):** (An element is "title", "bullet_points", "image_description", or like "bullet_point_0" for a specific item in the 'bullet_points' list. Indices refer to the slide as it is now, before any of these edits.)
+{edit_lines}
+
+    Apply every edit, carefully updating ONLY the relevant parts of the JSON structure for this specific slide.
+    - For 'bullet_points', if an instruction is to add, remove, or modify a specific bullet point, update the list precisely.
+    - Maintain the integrity of other fields that are not directly targeted by the instructions.
+    - Ensure the updated content aligns with the context of the slide and the overall presentation.
+
+    """
+
+
+async def get_batch_edited_content_from_agent(
+    current_presentation_content: PresentationContent,
+    slide_index: int,
+    edits: List[Tuple[str, str, str]], # (element_id, edit_instruction, current_element_content) per edit
+    use_cache: bool = True,
+    session_key: Optional[str] = None
+) -> SlideContent:
+    """
+    Applies several agentic edits to one slide in a single LLM call.
+    Returns the updated SlideContent object for that slide. A single edit is sent exactly like
+    `get_edited_content_from_agent` (and shares its cache entries).
+    """
+    if len(edits) == 1:
+        element_id, edit_instruction, current_element_content = edits[0]
+        return await get_edited_content_from_agent(
+            current_presentation_content, slide_index, element_id, edit_instruction, current_element_content,
+            use_cache=use_cache, session_key=session_key
+        )
+
+    if slide_index < 0 or slide_index >= len(current_presentation_content.slides):
+        raise ValueError(f"Slide index {slide_index} is out of bounds for the current presentation.")
+
+    # Several literal replacements are applied locally in order. Structural edits (delete,
+    # insert, reorder) are left to the agent here, since each one would shift the bullet
+    # numbers the other edits refer to.
+    if EDIT_FAST_PATH:
+        slide = current_presentation_content.slides[slide_index]
+        for element_id, edit_instruction, _ in edits:
+            with span("edit_fast_path"):
+                fast_path = apply_literal_edit(slide, element_id, edit_instruction)
+            if fast_path is None or fast_path[0] != "replace":
+                break
+            slide = fast_path[1]
+        else:
+            for _ in edits:
+                record_edit("replace")
+            print(f"Applied {len(edits)} edits to slide {slide_index} locally.")
+            return slide
+    for _ in edits:
+        record_edit(None)
+
+    current_slide = current_presentation_content.slides[slide_index]
+    prompt = _batch_edit_prompt(current_presentation_content, slide_index, edits)
+
+    try:
+        updated_slide_content = await _cached_llm_call(edit_agent, prompt, "edit", use_cache, session_key)
+        print(f"Agent output for batch edit of slide {slide_index}: {updated_slide_content}")
+        return restore_server_fields(updated_slide_content, current_slide)
+    except AgentCallTimeout:
+        raise
+    except Exception as e:
+        print(f"Error parsing LLM output for batch edit operation: {e}")
+        raise ValueError(f"Failed to parse LLM response for editing: {e}")
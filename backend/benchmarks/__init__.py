@@ -0,0 +1,4 @@
+import os
+
+# The benchmarks' job queues live in memory, never in the server's own JOB_QUEUE_DB file
+os.environ.setdefault("JOB_QUEUE_DB", ":memory:")
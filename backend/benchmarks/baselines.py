@@ -0,0 +1,56 @@
+# baselines.py
+#
+# Results stored in baselines.json for the benchmarks to compare against. bench_generator keeps
+# its cases at the top level; every other benchmark has a section of its own, named after it,
+# recorded with its --update-baselines flag. Baselines are machine-specific: record them on the
+# machine you compare on.
+
+import os
+import json
+import platform
+from typing import Dict, List, Optional
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def machine() -> str:
+    return f"{platform.machine()} {platform.processor() or ''} {os.cpu_count()} CPUs".replace("  ", " ")
+
+
+def load_baselines() -> Dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+def write_baselines(baselines: Dict):
+    with open(BASELINES_PATH, "w") as f:
+        json.dump(baselines, f, indent=2)
+        f.write("\n")
+    print(f"Baselines written to {BASELINES_PATH}")
+
+
+def load_section(name: str) -> Dict:
+    """The cases recorded by benchmark `name` (empty if it has none)."""
+    return load_baselines().get(name, {}).get("cases", {})
+
+
+def save_section(name: str, cases: Dict, **settings):
+    """Records `cases` as benchmark `name`'s baselines, with the settings they were measured with."""
+    baselines = load_baselines()
+    baselines[name] = {"machine": machine(), "python": platform.python_version(), **settings, "cases": cases}
+    write_baselines(baselines)
+
+
+def compare(label: str, value: float, baseline: Optional[float], tolerance: float, regressions: List[str]) -> str:
+    """
+    The change of `value` over `baseline` for a report ("" without a baseline), appending to
+    `regressions` if it is higher by more than `tolerance` (0.25 = 25%).
+    """
+    if not baseline:
+        return ""
+    ratio = value / baseline - 1
+    if ratio > tolerance:
+        regressions.append(f"{label}: {value:.1f} vs baseline {baseline:.1f} ({ratio:+.0%})")
+    return f"{ratio:+.0%}"
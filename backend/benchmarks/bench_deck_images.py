@@ -0,0 +1,111 @@
+# bench_deck_images.py
+#
+# /generate_deck_images against the fake image client (FakeImageClient from fakes.py), on a deck
+# whose slides all have an image already, regenerating every one (overwrite) with one slide's
+# request failing:
+#   - requests in flight never exceed the concurrency limit, and reach it
+#   - wall time against the ideal, ceil(slides / concurrency) x the image latency
+#   - the failure is reported for its slide only: every other slide gets its new image, and the
+#     failed slide keeps the image it had
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_deck_images
+#   python -m benchmarks.bench_deck_images --slides 40 --concurrency 1 4 16 --latency 0.5
+#
+# Exits with status 1 if the concurrency limit is exceeded, or the failure affects other slides.
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from image_processing import store_image
+from presentation_store import new_presentation_entry
+from benchmarks.fakes import FakeImageClient
+from benchmarks.bench_generator import build_case
+
+
+def seed_presentation(num_slides: int, image_size, label: str) -> str:
+    content, images = build_case(num_slides, True, image_size)
+    slides = [slide.model_copy(update={"image_hash": store_image(images[slide.image_hash])}) for slide in content.slides]
+    presentation_id = f"deck-images-{label}"
+    app_main.presentations_store[presentation_id] = new_presentation_entry("benchmark", content.model_copy(update={"slides": slides}))
+    return presentation_id
+
+
+async def run_case(client: httpx.AsyncClient, args, concurrency: int) -> dict:
+    presentation_id = seed_presentation(args.slides, tuple(args.image_size), f"c{concurrency}")
+    before = [slide.image_hash for slide in app_main.presentations_store[presentation_id]["content"].slides]
+    failing = args.slides // 2
+    failing_prompt = app_main.presentations_store[presentation_id]["content"].slides[failing].image_description
+    image_client = FakeImageClient(args.latency, tuple(args.image_size), fail_prompts=[failing_prompt])
+    app_main.client = image_client
+
+    start = time.perf_counter()
+    response = await client.post("/generate_deck_images", json={
+        "presentation_id": presentation_id, "overwrite": True, "concurrency": concurrency,
+    })
+    elapsed = time.perf_counter() - start
+    events = [json.loads(line) for line in response.text.splitlines()]
+    after = [slide.image_hash for slide in app_main.presentations_store[presentation_id]["content"].slides]
+
+    failed = sorted(event["slide_index"] for event in events if event.get("status") == "failed")
+    done = sorted(event["slide_index"] for event in events if event.get("status") == "done")
+    others = [i for i in range(args.slides) if i != failing]
+    return {
+        "elapsed": elapsed, "ideal": math.ceil(args.slides / concurrency) * args.latency,
+        "max_in_flight": image_client.max_in_flight,
+        "failed": failed, "done": done, "complete": events[-1],
+        "failed_slide_kept": after[failing] == before[failing],
+        "others_replaced": all(after[i] and after[i] != before[i] for i in others) and done == others,
+    }
+
+
+async def run(args) -> int:
+    failures = []
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        print(f"{args.slides} slides, fake image latency {args.latency}s, request for slide {args.slides // 2} fails")
+        print(f"{'concurrency':<13}{'max in flight':>14}{'seconds':>9}{'ideal s':>9}{'done':>6}{'failed':>8}{'failed slide kept':>19}")
+        for concurrency in args.concurrency:
+            result = await run_case(client, args, concurrency)
+            print(f"{concurrency:<13}{result['max_in_flight']:>14}{result['elapsed']:>9.2f}{result['ideal']:>9.2f}"
+                  f"{len(result['done']):>6}{len(result['failed']):>8}{'yes' if result['failed_slide_kept'] else 'NO':>19}")
+            if result["max_in_flight"] > concurrency:
+                failures.append(f"{result['max_in_flight']} image requests in flight with a limit of {concurrency}")
+            elif result["max_in_flight"] < min(concurrency, args.slides):
+                failures.append(f"only {result['max_in_flight']} image requests in flight with a limit of {concurrency}")
+            if result["failed"] != [args.slides // 2] or result["complete"].get("failed") != 1:
+                failures.append(f"concurrency {concurrency}: failed slides {result['failed']}, expected [{args.slides // 2}]")
+            if not result["failed_slide_kept"]:
+                failures.append(f"concurrency {concurrency}: the failed slide lost its image")
+            if not result["others_replaced"]:
+                failures.append(f"concurrency {concurrency}: other slides didn't all get their new image")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent deck image generation with a failing request.")
+    parser.add_argument("--slides", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=(1, 4, 8), help="Concurrency limits to run.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake image model seconds per image.")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(512, 384), metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
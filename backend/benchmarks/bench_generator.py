@@ -0,0 +1,112 @@
+# bench_generator.py
+#
+# Microbenchmarks of generate_presentation_pptx at 5, 50 and 500 slides, with and without
+# images, compared against stored baselines.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_generator                      # compare with baselines.json
+#   python -m benchmarks.bench_generator --update-baselines   # record this machine's numbers
+#
+# Exits with status 1 if any case is slower than its baseline by more than --tolerance.
+# Baselines are machine-specific: record them on the machine you compare on.
+
+import io
+import sys
+import time
+import argparse
+import platform
+import statistics
+from models.model import PresentationContent
+from ppt_generator import generate_presentation_pptx
+from image_store import image_hash
+from benchmarks.fakes import fake_output, fake_image
+from benchmarks.baselines import load_baselines, write_baselines, machine
+
+SLIDE_COUNTS = (5, 50, 500)
+
+
+def build_case(num_slides: int, with_images: bool, image_size):
+    """A deterministic deck of `num_slides` slides and the images it references (one per slide)."""
+    content = PresentationContent.model_validate(
+        fake_output(PresentationContent, f"benchmark deck of approximately {num_slides} slides")
+    )
+    images = {}
+    if with_images:
+        slides = []
+        for i, slide in enumerate(content.slides):
+            image_bytes = fake_image(f"benchmark image {i}", image_size)
+            key = image_hash(image_bytes)
+            images[key] = image_bytes
+            slides.append(slide.model_copy(update={"image_hash": key}))
+        content = content.model_copy(update={"slides": slides})
+    return content, images
+
+
+def run_case(content: PresentationContent, images, repeat: int):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        generate_presentation_pptx(content, buffer, images)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = buffer.tell()
+    return statistics.median(timings), size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of generate_presentation_pptx.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the median is reported.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline (0.25 = 25%%).")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(512, 384), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--update-baselines", action="store_true", help="Write the results to baselines.json.")
+    parser.add_argument("--slides", type=int, nargs="+", default=SLIDE_COUNTS, help="Slide counts to run.")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    cases = baselines.get("cases", {})
+
+    results = {}
+    regressions = []
+    print(f"{'case':<22}{'median ms':>12}{'ms/slide':>10}{'size MB':>10}{'baseline':>12}{'change':>9}")
+    for num_slides in args.slides:
+        for with_images in (False, True):
+            name = f"{num_slides}_slides_{'images' if with_images else 'text'}"
+            content, images = build_case(num_slides, with_images, tuple(args.image_size))
+            median_ms, size = run_case(content, images, args.repeat)
+            results[name] = {"median_ms": round(median_ms, 2), "size_bytes": size}
+
+            baseline = cases.get(name, {}).get("median_ms")
+            change = ""
+            if baseline:
+                ratio = median_ms / baseline - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.tolerance:
+                    regressions.append(f"{name}: {median_ms:.1f} ms vs baseline {baseline:.1f} ms ({change})")
+            print(
+                f"{name:<22}{median_ms:>12.1f}{median_ms / num_slides:>10.2f}{size / 1e6:>10.2f}"
+                f"{(f'{baseline:.1f}' if baseline else '-'):>12}{change:>9}"
+            )
+
+    if args.update_baselines:
+        cases.update(results)
+        # Other benchmarks' sections (see baselines.py) are kept
+        baselines.update({
+            "machine": machine(),
+            "python": platform.python_version(),
+            "image_size": list(args.image_size),
+            "cases": cases,
+        })
+        write_baselines(baselines)
+        return 0
+
+    if regressions:
+        print("\nRegressions over the baseline (tolerance {:.0%}):".format(args.tolerance))
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# bench_images.py
+#
+# Deck size and render time with images embedded as generated against normalized
+# (normalize_image) at several DPI, format and quality settings, plus the one-off cost of
+# normalizing each image. The fake images are noisier than real generated ones, so real JPEG
+# savings are larger than reported here.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_images
+#   python -m benchmarks.bench_images --slides 50 --image-size 1024 1024
+
+import io
+import sys
+import time
+import argparse
+import statistics
+from ppt_generator import generate_presentation_pptx
+from image_processing import normalize_image
+from benchmarks.bench_generator import build_case
+
+# (label, dpi, format, JPEG quality); None is the images as generated
+SETTINGS = (
+    ("original", None, None, None),
+    ("png 150dpi", 150, "png", None),
+    ("jpeg 96dpi q85", 96, "jpeg", 85),
+    ("jpeg 150dpi q70", 150, "jpeg", 70),
+    ("jpeg 150dpi q85", 150, "jpeg", 85),
+    ("jpeg 150dpi q95", 150, "jpeg", 95),
+    ("jpeg 220dpi q85", 220, "jpeg", 85),
+)
+
+
+def render_ms(content, images, repeat: int):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        generate_presentation_pptx(content, buffer, images)
+        timings.append((time.perf_counter() - start) * 1000)
+        size = buffer.tell()
+    return statistics.median(timings), size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Deck size and render time with normalized images.")
+    parser.add_argument("--slides", type=int, default=20)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the generated images (one per slide).")
+    parser.add_argument("--repeat", type=int, default=3, help="Renders per setting; the median is reported.")
+    args = parser.parse_args()
+
+    content, originals = build_case(args.slides, True, tuple(args.image_size))
+    print(f"{args.slides} slides, {len(originals)} images of {args.image_size[0]}x{args.image_size[1]}")
+    print(f"{'setting':<18}{'normalize ms/img':>17}{'image KB':>10}{'deck MB':>9}{'render ms':>11}")
+    for label, dpi, image_format, quality in SETTINGS:
+        normalize_ms = 0.0
+        if dpi is None:
+            images = originals
+        else:
+            # Normalized variants keyed by the original's hash, as NormalizedImages serves them
+            start = time.perf_counter()
+            images = {key: normalize_image(data, dpi, image_format, quality or 85) for key, data in originals.items()}
+            normalize_ms = (time.perf_counter() - start) * 1000 / len(originals)
+        image_kb = sum(map(len, images.values())) / len(images) / 1024
+        median_ms, size = render_ms(content, images, args.repeat)
+        print(f"{label:<18}{normalize_ms:>17.1f}{image_kb:>10.0f}{size / 1e6:>9.2f}{median_ms:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
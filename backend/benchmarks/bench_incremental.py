@@ -0,0 +1,107 @@
+# bench_incremental.py
+#
+# Cost of a single-slide edit (RenderedPresentation.update_slide, then save) against rebuilding
+# the whole deck (generate_presentation_pptx), as the deck grows. Each edit retitles a slide and
+# swaps its image, so the image parts are renumbered too. After the edits the incremental
+# package must be byte-identical to a full rebuild of the same content.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_incremental                      # compare with baselines.json
+#   python -m benchmarks.bench_incremental --update-baselines   # record this machine's numbers
+#
+# Exits with status 1 if an incremental save differs from the full rebuild, an edit costs more
+# than --max-edit-share of a rebuild at the largest deck, or an edit is slower than its baseline
+# by more than --tolerance.
+
+import io
+import sys
+import time
+import argparse
+import statistics
+from ppt_generator import RenderedPresentation, generate_presentation_pptx
+from image_store import image_hash
+from benchmarks.fakes import fake_image
+from benchmarks.bench_generator import build_case
+from benchmarks.baselines import load_section, save_section, compare
+
+SLIDE_COUNTS = (10, 80, 160)
+
+
+def full_rebuild(content, images) -> tuple:
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    generate_presentation_pptx(content, buffer, images)
+    return (time.perf_counter() - start) * 1000, buffer.getvalue()
+
+
+def run_case(num_slides: int, edits: int, image_size) -> dict:
+    content, images = build_case(num_slides, True, image_size)
+    rendered = RenderedPresentation(content, images)
+    rendered.save(io.BytesIO()) # The first save compresses every part; edits reuse them
+
+    slides = list(content.slides)
+    edit_ms = []
+    for edit in range(edits):
+        index = edit * 7 % num_slides
+        replacement = fake_image(f"edited image {edit}", image_size)
+        images[image_hash(replacement)] = replacement
+        slides[index] = slides[index].model_copy(update={
+            "title": f"{slides[index].title} (edit {edit})", "image_hash": image_hash(replacement),
+        })
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        rendered.update_slide(index, slides[index])
+        rendered.save(buffer)
+        edit_ms.append((time.perf_counter() - start) * 1000)
+
+    content = content.model_copy(update={"slides": slides})
+    full_ms, full_bytes = full_rebuild(content, images)
+    return {
+        "edit_ms": round(statistics.median(edit_ms), 2), "full_ms": round(full_ms, 2),
+        "identical": buffer.getvalue() == full_bytes,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Single-slide edits against full rebuilds as the deck grows.")
+    parser.add_argument("--slides", type=int, nargs="+", default=SLIDE_COUNTS, help="Deck sizes to run.")
+    parser.add_argument("--edits", type=int, default=10, help="Edits per deck; the median is reported.")
+    parser.add_argument("--image-size", type=int, nargs=2, default=(256, 192), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--max-edit-share", type=float, default=0.1, help="Highest cost of an edit as a share of a rebuild, at the largest deck.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown of an edit over the baseline (0.5 = 50%%).")
+    parser.add_argument("--update-baselines", action="store_true", help="Write the results to baselines.json.")
+    args = parser.parse_args()
+
+    baselines = load_section("incremental")
+    results = {}
+    failures = []
+    regressions = []
+    print(f"{'slides':<8}{'edit ms':>9}{'rebuild ms':>12}{'edit/rebuild':>14}{'identical':>11}{'baseline':>10}{'change':>8}")
+    for num_slides in args.slides:
+        name = f"{num_slides}_slides"
+        result = run_case(num_slides, args.edits, tuple(args.image_size))
+        results[name] = {"edit_ms": result["edit_ms"], "full_ms": result["full_ms"]}
+        baseline = baselines.get(name, {}).get("edit_ms")
+        change = compare(f"{name} edit ms", result["edit_ms"], baseline, args.tolerance, regressions)
+        print(f"{num_slides:<8}{result['edit_ms']:>9.1f}{result['full_ms']:>12.1f}{result['edit_ms'] / result['full_ms']:>14.1%}"
+              f"{'yes' if result['identical'] else 'NO':>11}{(f'{baseline:.1f}' if baseline else '-'):>10}{change:>8}")
+        if not result["identical"]:
+            failures.append(f"{num_slides} slides: the incremental save differs from a full rebuild")
+
+    largest = results[f"{max(args.slides)}_slides"]
+    if largest["edit_ms"] > args.max_edit_share * largest["full_ms"]:
+        failures.append(f"an edit of a {max(args.slides)}-slide deck costs {largest['edit_ms'] / largest['full_ms']:.0%} "
+                        f"of a rebuild, above {args.max_edit_share:.0%}")
+
+    if args.update_baselines:
+        save_section("incremental", results, image_size=list(args.image_size), edits=args.edits)
+    elif regressions:
+        failures.append(f"edits slower than the baseline (tolerance {args.tolerance:.0%}):\n  " + "\n  ".join(regressions))
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
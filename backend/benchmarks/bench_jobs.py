@@ -0,0 +1,184 @@
+# bench_jobs.py
+#
+# Background jobs through the API (POST /jobs, GET /jobs/...) with fake agents (FakeLlm from
+# fakes.py, no API calls) and the real render pool:
+#   - throughput of a bulk batch at several LLM concurrency limits (JOB_LLM_CONCURRENCY)
+#   - time to finish of interactive jobs submitted behind a bulk backlog, in the interactive lane
+#     against the bulk lane, and against the same job on an idle queue
+#   - a restart halfway through a batch on a SQLite queue: every job finishes, once, and its
+#     presentation can still be fetched
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_jobs
+#   python -m benchmarks.bench_jobs --jobs 100 --concurrency 2 4 8 16
+#
+# Exits with status 1 if a job fails or is lost in the restart, or interactive jobs behind the
+# backlog take more than twice as long as on an idle queue.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from jobs import JobQueue
+from benchmarks.fakes import install_fake_agents
+from benchmarks.bench_pipeline import percentile
+
+
+def create_requests(count: int, label: str, slides: int) -> list:
+    # Distinct descriptions, so no job is answered from the LLM response cache
+    return [{"description": f"{label} deck {i} about quarterly operations", "num_slides": slides} for i in range(count)]
+
+
+def use_queue(queue: JobQueue) -> JobQueue:
+    app_main.job_queue = queue
+    queue.start()
+    return queue
+
+
+async def wait_for_batch(client: httpx.AsyncClient, batch_id: str) -> dict:
+    while True:
+        batch = (await client.get(f"/jobs/batches/{batch_id}")).json()
+        if not batch["queued"] and not batch["running"]:
+            return batch
+        await asyncio.sleep(0.05)
+
+
+async def time_to_finish(client: httpx.AsyncClient, request: dict, priority: str) -> float:
+    start = time.perf_counter()
+    job_id = (await client.post("/jobs", json={"requests": [request], "priority": priority})).json()["job_ids"][0]
+    while (await client.get(f"/jobs/{job_id}")).json()["status"] not in ("done", "failed", "cancelled"):
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - start
+
+
+async def throughput(client: httpx.AsyncClient, args, concurrency: int) -> dict:
+    queue = use_queue(JobQueue(app_main.run_create_ppt_job, db_path=":memory:", stage_limits={"llm": concurrency, "render": args.render_concurrency}))
+    start = time.perf_counter()
+    submitted = (await client.post("/jobs", json={"requests": create_requests(args.jobs, f"c{concurrency}", args.slides)})).json()
+    batch = await wait_for_batch(client, submitted["batch_id"])
+    elapsed = time.perf_counter() - start
+    # The stream of a finished batch replays each job's final status, then "complete"
+    events = (await client.get(f"/jobs/batches/{submitted['batch_id']}/events")).text.splitlines()
+    stats = queue.stats()
+    await queue.stop()
+    return {
+        "done": batch["done"], "failed": batch["failed"], "elapsed": elapsed,
+        "per_minute": batch["done"] / elapsed * 60,
+        "run_p50": stats["run_p50_seconds"].get("bulk"), "wait_p90": stats["queue_wait_p90_seconds"].get("bulk"),
+        "events": len(events), "complete_event": '"event": "complete"' in events[-1],
+    }
+
+
+async def priority(client: httpx.AsyncClient, args) -> dict:
+    results = {}
+    queue = use_queue(JobQueue(app_main.run_create_ppt_job, db_path=":memory:", stage_limits={"llm": args.lane_concurrency, "render": args.render_concurrency}))
+    results["idle queue"] = [await time_to_finish(client, request, "interactive") for request in create_requests(args.interactive, "idle", args.slides)]
+    for lane in ("bulk", "interactive"):
+        backlog = (await client.post("/jobs", json={"requests": create_requests(args.jobs, f"backlog-{lane}", args.slides)})).json()
+        await asyncio.sleep(0.5) # Let the backlog fill the workers
+        results[f"behind backlog, {lane} lane"] = await asyncio.gather(*[
+            time_to_finish(client, request, lane) for request in create_requests(args.interactive, f"user-{lane}", args.slides)
+        ])
+        queue.cancel(status["job_id"] for status in queue.statuses(batch_id=backlog["batch_id"]))
+    await queue.stop()
+    return {name: sorted(latencies) for name, latencies in results.items()}
+
+
+async def restart(client: httpx.AsyncClient, args, db_path: str) -> dict:
+    runs = {}
+    handler = app_main.run_create_ppt_job
+
+    async def counting_handler(job_id, payload, lane):
+        runs[job_id] = runs.get(job_id, 0) + 1
+        return await handler(job_id, payload, lane)
+
+    queue = use_queue(JobQueue(counting_handler, db_path=db_path, stage_limits={"llm": args.lane_concurrency, "render": args.render_concurrency}))
+    submitted = (await client.post("/jobs", json={"requests": create_requests(args.jobs, "restart", args.slides)})).json()
+    while queue.batch(submitted["batch_id"])["done"] < args.jobs // 2:
+        await asyncio.sleep(0.05)
+    await queue.stop()
+    interrupted = queue.batch(submitted["batch_id"])["running"]
+    # A new process: a new queue on the same file, and an empty presentation store
+    for presentation_id in list(app_main.presentations_store._hot):
+        del app_main.presentations_store[presentation_id]
+    use_queue(JobQueue(counting_handler, db_path=db_path, stage_limits={"llm": args.lane_concurrency, "render": args.render_concurrency}))
+    batch = await wait_for_batch(client, submitted["batch_id"])
+    fetched = 0
+    for job_id in submitted["job_ids"]:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] == "done" and len(job["result"]["slides"]) == args.slides:
+            fetched += 1
+    await app_main.job_queue.stop()
+    return {
+        "jobs": args.jobs, "done": batch["done"], "interrupted": interrupted, "fetched": fetched,
+        "runs": sum(runs.values()), "started_twice": sum(count > 1 for count in runs.values()),
+    }
+
+
+async def run(args) -> int:
+    install_fake_agents(args.llm_first_token, args.llm_per_kchar)
+    failures = []
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        pool = app_main.render_executor
+        print(f"{args.jobs} jobs of {args.slides} slides, fake LLM {args.llm_first_token}s + {args.llm_per_kchar}s/kchar, "
+              f"render pool: {pool.kind} x{pool.max_workers}")
+        print(f"{'LLM concurrency':<18}{'done':>6}{'seconds':>9}{'jobs/min':>10}{'run p50 s':>11}{'wait p90 s':>12}")
+        for concurrency in args.concurrency:
+            result = await throughput(client, args, concurrency)
+            print(f"{concurrency:<18}{result['done']:>6}{result['elapsed']:>9.1f}{result['per_minute']:>10.1f}"
+                  f"{result['run_p50'] or 0:>11.2f}{result['wait_p90'] or 0:>12.2f}")
+            if result["failed"] or result["done"] != args.jobs:
+                failures.append(f"{args.jobs - result['done']} jobs didn't finish at LLM concurrency {concurrency}")
+            if not result["complete_event"] or result["events"] != args.jobs + 1:
+                failures.append("the event stream of a finished batch isn't each job's status followed by 'complete'")
+
+        print(f"\n{args.interactive} jobs submitted behind a backlog of {args.jobs} (LLM concurrency {args.lane_concurrency})")
+        print(f"{'':<34}{'p50 s':>8}{'max s':>8}")
+        latencies = await priority(client, args)
+        for name, values in latencies.items():
+            print(f"{name:<34}{percentile(values, 0.5):>8.2f}{values[-1]:>8.2f}")
+        if latencies["behind backlog, interactive lane"][-1] > 2 * latencies["idle queue"][-1]:
+            failures.append("interactive jobs behind the backlog took over twice as long as on an idle queue")
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = await restart(client, args, os.path.join(directory, "jobs.db"))
+        print(f"\nRestart halfway through {result['jobs']} jobs on a SQLite queue: {result['interrupted']} interrupted, "
+              f"{result['done']} done, {result['fetched']} fetched after the restart, "
+              f"{result['runs']} runs ({result['started_twice']} started twice)")
+        if result["done"] != result["jobs"] or result["fetched"] != result["jobs"]:
+            failures.append(f"{result['jobs'] - result['fetched']} jobs were lost in the restart")
+        if result["started_twice"] > result["interrupted"]:
+            failures.append("jobs that had finished before the restart were run again")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Background job throughput, priority lanes and restarts.")
+    parser.add_argument("--jobs", type=int, default=40, help="Jobs per batch.")
+    parser.add_argument("--slides", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=(1, 4, 8), help="LLM concurrency limits to compare.")
+    parser.add_argument("--lane-concurrency", type=int, default=4, help="LLM concurrency for the priority and restart runs.")
+    parser.add_argument("--render-concurrency", type=int, default=1)
+    parser.add_argument("--interactive", type=int, default=4, help="Interactive jobs submitted behind the backlog.")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Fake LLM seconds to first token.")
+    parser.add_argument("--llm-per-kchar", type=float, default=0.2, help="Fake LLM seconds per 1000 output characters.")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# bench_large_deck.py
+#
+# Peak memory of rendering a deck in memory (generate_presentation_pptx into a BytesIO, then
+# getvalue(), as the server does for normal decks) against streaming it to a file
+# (stream_presentation_pptx, as it does for large ones), as the slide count grows.
+# Each case runs in a fresh subprocess so its peak RSS isn't hidden by an earlier, larger one.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_large_deck
+#   python -m benchmarks.bench_large_deck --slides 300 1000 3000 --image-size 256 192
+#
+# Exits with status 1 if the streaming writer's peak grows by more than --max-growth between the
+# smallest and the largest deck. Its memory should stay nearly flat: only the presentation part's
+# slide list and relationships (a few KB per slide) grow with the deck.
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+
+SLIDE_COUNTS = (100, 300, 1000)
+
+
+def current_rss_mb() -> float:
+    """Resident set size now (Linux); falls back to the peak so far elsewhere."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(mode: str, num_slides: int, image_size) -> dict:
+    """Renders one deck in this process and reports its memory use. Called in the subprocess."""
+    import io
+    from benchmarks.bench_generator import build_case
+    from ppt_generator import generate_presentation_pptx, stream_presentation_pptx
+    from themes import theme_registry
+
+    content, images = build_case(num_slides, image_size is not None, image_size)
+    theme_registry.resolve(content.overall_theme).compiled()
+    before = current_rss_mb()
+    start = time.perf_counter()
+    if mode == "memory":
+        buffer = io.BytesIO()
+        generate_presentation_pptx(content, buffer, images)
+        pptx_bytes = buffer.getvalue() # The copy that gets stored for downloads
+        size = len(pptx_bytes)
+    else:
+        with tempfile.TemporaryFile() as f:
+            stream_presentation_pptx(content, f, images)
+            size = f.tell()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "mode": mode, "slides": num_slides, "seconds": round(elapsed, 2), "size_mb": round(size / 1e6, 1),
+        "inputs_mb": round(before, 1), "peak_mb": round(peak, 1), "growth_mb": round(peak - before, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Peak RSS of in-memory vs streaming rendering of large decks.")
+    parser.add_argument("--slides", type=int, nargs="+", default=SLIDE_COUNTS)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(256, 192), metavar=("WIDTH", "HEIGHT"),
+                        help="One distinct image of this size per slide.")
+    parser.add_argument("--text-only", action="store_true", help="Decks without images.")
+    parser.add_argument("--max-growth", type=float, default=4.0,
+                        help="Allowed ratio between the streaming peak growth of the largest and the smallest deck.")
+    parser.add_argument("--case", nargs=2, metavar=("MODE", "SLIDES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    image_size = None if args.text_only else tuple(args.image_size)
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]), image_size)))
+        return 0
+
+    print(f"{'mode':<11}{'slides':>7}{'seconds':>9}{'size MB':>9}{'inputs MB':>11}{'peak MB':>9}{'growth MB':>11}")
+    streaming = []
+    for num_slides in sorted(args.slides):
+        for mode in ("memory", "streaming"):
+            command = [sys.executable, "-m", "benchmarks.bench_large_deck", "--case", mode, str(num_slides)]
+            command += ["--text-only"] if args.text_only else ["--image-size", *map(str, image_size)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=os.getcwd()).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<11}{num_slides:>7}{result['seconds']:>9}{result['size_mb']:>9}{result['inputs_mb']:>11}"
+                  f"{result['peak_mb']:>9}{result['growth_mb']:>11}")
+            if mode == "streaming":
+                streaming.append(result)
+
+    # "growth" is the peak over what the process held before rendering (the deck's content and
+    # images); the streaming writer should add about the same whatever the slide count.
+    smallest, largest = streaming[0]["growth_mb"], streaming[-1]["growth_mb"]
+    if len(streaming) > 1 and largest > max(smallest, 5.0) * args.max_growth:
+        print(f"\nStreaming peak grew from {smallest} MB to {largest} MB over the deck sizes.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
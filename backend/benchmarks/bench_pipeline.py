@@ -0,0 +1,188 @@
+# bench_pipeline.py
+#
+# End-to-end benchmark of the API with the agents and the image client replaced by
+# deterministic fakes (see fakes.py), so it runs offline and costs nothing.
+# Each simulated user creates a presentation, edits it, generates images, downloads it
+# and asks for a sketch; users run concurrently. Requests go through the FastAPI app
+# in-process (httpx ASGI transport), so routing, validation, the stores, the agent runners
+# and PPTX rendering are all measured, but not an HTTP server.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_pipeline --users 16 --concurrency 8
+#   python -m benchmarks.bench_pipeline --llm-first-token 0 --llm-per-kchar 0 --image-latency 0   # CPU cost only
+#
+# Reports throughput, latency percentiles per endpoint and peak RSS.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from benchmarks.fakes import install_fake_agents, FakeImageClient
+
+# Agentic (non-literal) instructions, so edits go to the (fake) agent rather than the local fast path
+EDIT_INSTRUCTIONS = ["make this more concise", "make it sound more confident", "expand on this with a concrete example"]
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    scale = 1 / 1024 if sys.platform != "darwin" else 1 / (1024 * 1024)
+    return {
+        "server": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        "render_workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+class Recorder:
+    """
+    Sends requests and records their latency per endpoint. A 503 (render workers saturated)
+    is retried after its Retry-After, like a well-behaved client would, and counted as
+    "rejected"; the recorded latency includes the retries.
+    """
+
+    def __init__(self, max_retries: int = 10):
+        self.max_retries = max_retries
+        self.latencies = {} # Key: endpoint, Value: list of seconds
+        self.errors = {} # Key: endpoint, Value: count
+        self.rejected = {} # Key: endpoint, Value: count of 503 responses
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            response = await client.request(method, url, **kwargs)
+            if response.status_code != 503 or attempt == self.max_retries:
+                break
+            self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            print(f"{endpoint}: {response.status_code} {response.text[:200]}")
+        return response
+
+
+async def simulate_user(client: httpx.AsyncClient, recorder: Recorder, user: int, args):
+    response = await recorder.request(client, "create_ppt", "POST", "/create_ppt", json={
+        "description": f"Benchmark presentation {user} about renewable energy adoption",
+        "num_slides": args.slides,
+        "generation_mode": args.generation_mode,
+    })
+    if response.status_code != 200:
+        return
+    presentation_id = response.json()["presentation_id"]
+
+    for i in range(args.edits):
+        await recorder.request(client, "edit_ppt", "POST", "/edit_ppt", json={
+            "presentation_id": presentation_id,
+            "slide_index": i % args.slides,
+            "element_id": "bullet_point_0",
+            "edit_instruction": EDIT_INSTRUCTIONS[i % len(EDIT_INSTRUCTIONS)],
+            "current_content": "",
+        })
+
+    for i in range(args.images):
+        await recorder.request(client, "generate", "POST", "/generate", json={
+            "description": f"Illustration {i} for benchmark presentation {user}",
+            "slide_index": i % args.slides,
+            "presentation_id": presentation_id,
+        })
+
+    for _ in range(args.downloads):
+        await recorder.request(client, "download_ppt", "GET", f"/download_ppt/{presentation_id}")
+
+    await recorder.request(client, "sketch", "POST", "/sketch", json={"message": f"Approval workflow for request {user}"})
+
+
+async def run(args) -> dict:
+    install_fake_agents(args.llm_first_token, args.llm_per_kchar)
+    app_main.client = FakeImageClient(args.image_latency)
+
+    recorder = Recorder()
+    users = asyncio.Queue()
+    for user in range(args.users):
+        users.put_nowait(user)
+
+    async def worker(client):
+        while not users.empty():
+            await simulate_user(client, recorder, users.get_nowait(), args)
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    total = 0
+    for endpoint, latencies in recorder.latencies.items():
+        latencies.sort()
+        total += len(latencies)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(endpoint, 0),
+            "rejected_503": recorder.rejected.get(endpoint, 0),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1),
+        }
+    return {
+        "config": vars(args),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "users_per_second": round(args.users / elapsed, 3),
+        "endpoints": endpoints,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the API with fake agents and images.")
+    parser.add_argument("--users", type=int, default=16, help="Simulated users (one presentation each).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Users running at the same time.")
+    parser.add_argument("--slides", type=int, default=8)
+    parser.add_argument("--edits", type=int, default=3, help="Agentic edits per user.")
+    parser.add_argument("--images", type=int, default=2, help="/generate calls per user.")
+    parser.add_argument("--downloads", type=int, default=2, help="Downloads per user (the second one is a cache hit).")
+    parser.add_argument("--generation-mode", choices=("single", "parallel"), default="single")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Fake LLM seconds to first token.")
+    parser.add_argument("--llm-per-kchar", type=float, default=0.2, help="Fake LLM seconds per 1000 output characters.")
+    parser.add_argument("--image-latency", type=float, default=2.0, help="Fake image model seconds per image.")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    app_main.render_executor.shutdown()
+
+    print(f"{args.users} users, concurrency {args.concurrency}: {report['requests']} requests in "
+          f"{report['elapsed_seconds']}s ({report['throughput_rps']} req/s)")
+    print(f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'503s':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<14}{stats['requests']:>9}{stats['errors']:>8}{stats['rejected_503']:>6}{stats['p50_ms']:>10}"
+              f"{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    print(f"Peak RSS: {report['peak_rss_mb']['server']} MB server, {report['peak_rss_mb']['render_workers']} MB largest render worker")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(stats["errors"] for stats in report["endpoints"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# bench_presentation_store.py
+#
+# Downloads (/download_ppt) of decks with an image on every slide, before and after they go
+# through the presentation store's cold tier, in memory and in a SQLite file:
+#   - every deck is built and downloaded, then moved to the cold tier
+#   - the image store is filled with other images past its limits, so every image it may drop
+#     is dropped
+#   - every deck is downloaded again (rehydrated and rebuilt): the bytes and the ETag must be
+#     the same as before
+#   - with the SQLite file, a fresh server process opens it and downloads every deck again,
+#     with an empty image store: the bytes must still be the same
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_presentation_store
+#   python -m benchmarks.bench_presentation_store --decks 8 --slides 20
+#
+# Exits with status 1 if a download after a trip through the cold tier differs from the one before.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+
+TIERS = ("memory", "sqlite")
+
+
+async def download_all(client: httpx.AsyncClient, presentation_ids) -> dict:
+    """Key: presentation_id, Value: (SHA-256 of the downloaded PPTX, ETag)."""
+    downloads = {}
+    for presentation_id in presentation_ids:
+        response = await client.get(f"/download_ppt/{presentation_id}")
+        response.raise_for_status()
+        downloads[presentation_id] = (hashlib.sha256(response.content).hexdigest(), response.headers.get("etag"))
+    return downloads
+
+
+async def restarted_downloads(presentation_ids) -> dict:
+    """Downloads in this process, a fresh server whose store opens PRESENTATION_STORE_DB. Run in the subprocess."""
+    import main as app_main
+    transport = httpx.ASGITransport(app=app_main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+            return await download_all(client, presentation_ids)
+    finally:
+        app_main.render_executor.shutdown()
+
+
+def seed_presentations(app_main, args, tier: str) -> list:
+    from image_processing import store_image
+    from presentation_store import new_presentation_entry
+    from benchmarks.fakes import fake_image
+    from benchmarks.bench_generator import build_case
+
+    presentation_ids = []
+    for deck in range(args.decks):
+        content, _ = build_case(args.slides, False, None)
+        # Distinct images for every slide of every deck
+        slides = [
+            slide.model_copy(update={"image_hash": store_image(fake_image(f"{tier} deck {deck} slide {i}", tuple(args.image_size)))})
+            for i, slide in enumerate(content.slides)
+        ]
+        presentation_id = f"store-{tier}-{deck}"
+        app_main.presentations_store[presentation_id] = new_presentation_entry("benchmark", content.model_copy(update={"slides": slides}))
+        presentation_ids.append(presentation_id)
+    return presentation_ids
+
+
+def evict_all(store):
+    """Moves every presentation to the cold tier, as if they had all been idle past the TTL."""
+    ttl = store.ttl_seconds
+    store.ttl_seconds = 0
+    time.sleep(0.01)
+    store._enforce_budget()
+    store.ttl_seconds = ttl
+
+
+def fill_image_store(image_store, args):
+    """Stores other images under small limits, so they push out everything the image store may drop."""
+    from image_processing import store_image
+    from benchmarks.fakes import fake_image
+    limits = image_store.memory_limit_bytes, image_store.max_bytes
+    image_store.memory_limit_bytes = image_store.max_bytes = args.image_memory_kb * 1024
+    for i in range(args.filler_images):
+        store_image(fake_image(f"filler image {i} {time.perf_counter()}", tuple(args.image_size)))
+    image_store.memory_limit_bytes, image_store.max_bytes = limits
+
+
+async def run_tier(client: httpx.AsyncClient, app_main, args, tier: str, db_path) -> list:
+    from presentation_store import PresentationStore
+
+    failures = []
+    store = app_main.presentations_store = PresentationStore(db_path=db_path)
+    presentation_ids = seed_presentations(app_main, args, tier)
+    before = await download_all(client, presentation_ids)
+
+    evict_all(store)
+    cold = store.stats()
+    fill_image_store(app_main.image_store, args)
+    images = app_main.image_store.stats()
+    after = await download_all(client, presentation_ids)
+
+    changed = [presentation_id for presentation_id in presentation_ids if after[presentation_id] != before[presentation_id]]
+    print(f"{tier:<9}{args.decks:>7}{cold['cold_presentations']:>7}{images['dropped_images']:>9}{images['spilled_images']:>9}"
+          f"{cold['cold_image_bytes'] / 1e6:>16.1f}{len(changed):>9}")
+    if cold["hot_presentations"]:
+        failures.append(f"{tier}: {cold['hot_presentations']} presentations didn't go cold")
+    if changed:
+        failures.append(f"{tier}: downloads after rehydrating differ from before for {', '.join(changed)}")
+
+    if db_path is not None:
+        # A fresh process with its own, empty image store: the images come from the SQLite file
+        evict_all(store)
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_presentation_store", "--restart-case", *presentation_ids],
+            env={**os.environ, "PRESENTATION_STORE_DB": db_path}, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            failures.append(f"{tier}: the restarted server failed:\n{result.stderr[-2000:]}")
+        else:
+            restarted = {presentation_id: tuple(download) for presentation_id, download in json.loads(result.stdout.splitlines()[-1]).items()}
+            changed = [presentation_id for presentation_id in presentation_ids if restarted[presentation_id] != before[presentation_id]]
+            print(f"{'restart':<9}{args.decks:>7}{'':>7}{'':>9}{'':>9}{'':>16}{len(changed):>9}")
+            if changed:
+                failures.append(f"{tier}: downloads after a restart differ from before for {', '.join(changed)}")
+    return failures
+
+
+async def run(args) -> int:
+    import main as app_main
+
+    failures = []
+    transport = httpx.ASGITransport(app=app_main.app)
+    with tempfile.TemporaryDirectory() as tmp:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+            print(f"{args.decks} decks of {args.slides} slides, {args.filler_images} filler images, image store limit {args.image_memory_kb} KB")
+            print(f"{'tier':<9}{'decks':>7}{'cold':>7}{'dropped':>9}{'spilled':>9}{'cold images MB':>16}{'changed':>9}")
+            for tier in args.tiers:
+                db_path = os.path.join(tmp, "presentations.sqlite3") if tier == "sqlite" else None
+                failures += await run_tier(client, app_main, args, tier, db_path)
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Downloads before and after a trip through the presentation store's cold tier.")
+    parser.add_argument("--tiers", nargs="+", choices=TIERS, default=TIERS, help="Cold tiers to run.")
+    parser.add_argument("--decks", type=int, default=4)
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(256, 192), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--filler-images", type=int, default=20, help="Other images stored while the decks are cold.")
+    parser.add_argument("--image-memory-kb", type=int, default=256, help="Image store memory and total limit while the filler images are stored.")
+    parser.add_argument("--restart-case", nargs="+", metavar="PRESENTATION_ID", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.restart_case:
+        print(json.dumps(asyncio.run(restarted_downloads(args.restart_case))))
+        return 0
+    import main as app_main
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
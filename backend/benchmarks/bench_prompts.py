@@ -0,0 +1,81 @@
+# bench_prompts.py
+#
+# Sizes of the prompts sent to the agents, against the bounds prompt_builder.py promises:
+# no image hashes in any prompt, the deck context of an edit within PROMPT_CONTEXT_TOKENS, and
+# free text (descriptions, element contents, instructions) within PROMPT_TEXT_TOKENS however
+# large the input. Also compares the slide JSON with how it used to be sent (indented, with the
+# image hash). Builds prompts only; no agent is called.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_prompts
+#   python -m benchmarks.bench_prompts --slides 500
+#
+# Exits with status 1 if any bound is exceeded.
+
+import sys
+import json
+import argparse
+import statistics
+from agent_logic import _deck_prompt, _edit_prompt, _batch_edit_prompt
+from prompt_builder import estimate_tokens, prompt_json, deck_context, CHARS_PER_TOKEN, PROMPT_CONTEXT_TOKENS, PROMPT_TEXT_TOKENS
+from benchmarks.bench_generator import build_case
+
+# Tokens of an edit prompt's fixed wording, with room to spare
+EDIT_TEMPLATE_TOKENS = 400
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prompt sizes against the prompt builder's token bounds.")
+    parser.add_argument("--slides", type=int, default=50)
+    parser.add_argument("--huge-text-chars", type=int, default=1_000_000,
+                        help="Size of the oversized description, element content and instruction.")
+    args = parser.parse_args()
+
+    content, _ = build_case(args.slides, True, (64, 48)) # Every slide has an image hash
+    huge = "lorem ipsum " * (args.huge_text_chars // 12)
+    failures = []
+
+    legacy_slide, compact_slide, edit_tokens, context_tokens = [], [], [], []
+    for i, slide in enumerate(content.slides):
+        legacy_slide.append(estimate_tokens(json.dumps(slide.model_dump(), indent=2)))
+        compact_slide.append(estimate_tokens(prompt_json(slide)))
+        context = deck_context(content, i)
+        context_tokens.append(estimate_tokens(context))
+        prompt = _edit_prompt(content, i, "bullet_point_0", "make this more concise", slide.bullet_points[0] if slide.bullet_points else "")
+        edit_tokens.append(estimate_tokens(prompt))
+        if slide.image_hash in prompt:
+            failures.append(f"slide {i}: the image hash is in the edit prompt")
+        if context_tokens[-1] > PROMPT_CONTEXT_TOKENS:
+            failures.append(f"slide {i}: deck context is {context_tokens[-1]} tokens, over {PROMPT_CONTEXT_TOKENS}")
+        if edit_tokens[-1] > EDIT_TEMPLATE_TOKENS + compact_slide[-1] + PROMPT_CONTEXT_TOKENS + 2 * PROMPT_TEXT_TOKENS:
+            failures.append(f"slide {i}: edit prompt is {edit_tokens[-1]} tokens")
+
+    # Oversized client input is cut to its budget
+    huge_edit = estimate_tokens(_edit_prompt(content, 0, "title", huge, huge))
+    huge_batch = estimate_tokens(_batch_edit_prompt(content, 0, [("title", huge, huge), ("bullet_point_0", huge, huge)]))
+    huge_deck = estimate_tokens(_deck_prompt(huge, 10, "general", "informative"))
+    if huge_edit > EDIT_TEMPLATE_TOKENS + compact_slide[0] + PROMPT_CONTEXT_TOKENS + 2 * PROMPT_TEXT_TOKENS:
+        failures.append(f"edit prompt with huge input is {huge_edit} tokens")
+    if huge_batch > EDIT_TEMPLATE_TOKENS + compact_slide[0] + PROMPT_CONTEXT_TOKENS + 4 * PROMPT_TEXT_TOKENS:
+        failures.append(f"batch edit prompt with huge input is {huge_batch} tokens")
+    if huge_deck > EDIT_TEMPLATE_TOKENS + PROMPT_TEXT_TOKENS:
+        failures.append(f"deck prompt with a huge description is {huge_deck} tokens")
+
+    print(f"{args.slides} slides, each with an image; token estimates (~{CHARS_PER_TOKEN} chars per token)")
+    print(f"{'':<34}{'mean':>8}{'max':>8}")
+    for label, values in (
+        ("slide JSON, indented with hash", legacy_slide),
+        ("slide JSON, compact without hash", compact_slide),
+        ("deck context", context_tokens),
+        ("edit prompt", edit_tokens),
+    ):
+        print(f"{label:<34}{statistics.mean(values):>8.0f}{max(values):>8}")
+    print(f"Huge input ({args.huge_text_chars} chars per field): edit {huge_edit}, batch of 2 {huge_batch}, deck {huge_deck} tokens")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
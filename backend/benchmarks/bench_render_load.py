@@ -0,0 +1,141 @@
+# bench_render_load.py
+#
+# Latency of downloads of an already built deck while large decks are being rendered: one client
+# downloads a small deck over and over while others create large decks (fake agents from
+# fakes.py, no LLM latency) and download them, so each of those downloads is a full render on
+# the render executor. Run with a process pool and with a thread pool. Rendering on the event
+# loop, as before the render executor, made the small downloads wait for whole renders.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_render_load                      # compare with baselines.json
+#   python -m benchmarks.bench_render_load --update-baselines   # record this machine's numbers
+#   python -m benchmarks.bench_render_load --renderers 8 --slides 160
+#
+# Exits with status 1 if a request fails, a download's p99 exceeds --max-p99-ms, or it is slower
+# than its baseline by more than --tolerance.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from render_executor import RenderExecutor, RENDER_WORKERS
+from benchmarks.fakes import install_fake_agents
+from benchmarks.bench_pipeline import Recorder, percentile
+from benchmarks.baselines import load_section, save_section, compare
+
+EXECUTOR_KINDS = ("process", "thread")
+
+
+async def create(client: httpx.AsyncClient, recorder: Recorder, label: str, slides: int) -> str:
+    response = await recorder.request(client, "create_ppt", "POST", "/create_ppt", json={
+        "description": f"{label} deck about renewable energy adoption", "num_slides": slides,
+    })
+    return response.json()["presentation_id"]
+
+
+async def run_kind(client: httpx.AsyncClient, kind: str, args) -> dict:
+    executor = RenderExecutor(kind, args.workers)
+    app_main.render_executor = executor
+    await executor.warm_up() # As the app's lifespan does; starting a worker isn't what is measured
+    recorder = Recorder()
+    small = await create(client, recorder, f"{kind} small", args.small_slides)
+    await client.get(f"/download_ppt/{small}") # Built once; the polled downloads reuse it
+
+    renders_left = args.renders
+    done = asyncio.Event()
+
+    async def renderer(index: int):
+        nonlocal renders_left
+        while renders_left > 0:
+            renders_left -= 1
+            presentation_id = await create(client, recorder, f"{kind} large {index} {renders_left}", args.slides)
+            await recorder.request(client, "render", "GET", f"/download_ppt/{presentation_id}")
+
+    async def poller():
+        while not done.is_set():
+            await recorder.request(client, "download", "GET", f"/download_ppt/{small}")
+            await asyncio.sleep(args.poll_interval)
+
+    start = time.perf_counter()
+    polling = asyncio.create_task(poller())
+    await asyncio.gather(*[renderer(i) for i in range(args.renderers)])
+    done.set()
+    await polling
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+
+    downloads = sorted(recorder.latencies["download"])
+    renders = sorted(recorder.latencies["render"])
+    return {
+        "kind": executor.kind, "elapsed": elapsed, "downloads": len(downloads),
+        "p50_ms": round(percentile(downloads, 0.5) * 1000, 1), "p99_ms": round(percentile(downloads, 0.99) * 1000, 1),
+        "max_ms": round(downloads[-1] * 1000, 1), "render_p50_ms": round(percentile(renders, 0.5) * 1000, 1),
+        "rejected": sum(recorder.rejected.values()), "errors": sum(recorder.errors.values()),
+    }
+
+
+async def run(args) -> int:
+    install_fake_agents(0, 0)
+    pool = app_main.render_executor
+    baselines = load_section("render_load")
+    results = {}
+    failures = []
+    regressions = []
+    transport = httpx.ASGITransport(app=app_main.app)
+    # Started like the server, through the app's lifespan (warm-up, then freezing the startup heap)
+    async with app_main.app.router.lifespan_context(app_main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        print(f"{args.renderers} clients rendering {args.renders} decks of {args.slides} slides on {args.workers} workers, "
+              f"1 client downloading a {args.small_slides}-slide deck every {args.poll_interval * 1000:.0f} ms")
+        print(f"{'executor':<10}{'downloads':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'render p50 ms':>15}{'503s':>6}{'baseline':>10}{'change':>8}")
+        for kind in args.kinds:
+            result = await run_kind(client, kind, args)
+            name = f"{kind}_pool"
+            results[name] = {"p99_ms": result["p99_ms"]}
+            baseline = baselines.get(name, {}).get("p99_ms")
+            change = compare(f"{name} download p99 ms", result["p99_ms"], baseline, args.tolerance, regressions)
+            print(f"{result['kind']:<10}{result['downloads']:>10}{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+                  f"{result['render_p50_ms']:>15.0f}{result['rejected']:>6}{(f'{baseline:.1f}' if baseline else '-'):>10}{change:>8}")
+            if result["errors"]:
+                failures.append(f"{result['errors']} requests failed with the {kind} pool")
+            if result["p99_ms"] > args.max_p99_ms:
+                failures.append(f"download p99 {result['p99_ms']:.0f} ms with the {kind} pool, above {args.max_p99_ms:.0f} ms")
+        app_main.render_executor = pool
+
+    if args.update_baselines:
+        save_section("render_load", results, renderers=args.renderers, renders=args.renders, slides=args.slides, workers=args.workers)
+    elif regressions:
+        failures.append(f"downloads slower than the baseline (tolerance {args.tolerance:.0%}):\n  " + "\n  ".join(regressions))
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Download latency while large decks render.")
+    parser.add_argument("--kinds", nargs="+", choices=EXECUTOR_KINDS, default=EXECUTOR_KINDS, help="Render executors to compare.")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS, help="Render workers.")
+    parser.add_argument("--renderers", type=int, default=4, help="Clients creating and downloading large decks.")
+    parser.add_argument("--renders", type=int, default=24, help="Large decks rendered in total.")
+    parser.add_argument("--slides", type=int, default=80, help="Slides of the large decks.")
+    parser.add_argument("--small-slides", type=int, default=5, help="Slides of the polled deck.")
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="Seconds between the polled downloads.")
+    parser.add_argument("--max-p99-ms", type=float, default=150, help="Highest acceptable p99 of the polled downloads.")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="Allowed slowdown over the baseline (1.0 = 100%%; p99s of tens of ms are noisy).")
+    parser.add_argument("--update-baselines", action="store_true", help="Write the results to baselines.json.")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
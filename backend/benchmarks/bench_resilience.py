@@ -0,0 +1,104 @@
+# bench_resilience.py
+#
+# Agent calls against fake models with injected faults (see FakeLlm in fakes.py), through the
+# same path as the endpoints (_cached_llm_call: deadline, retries with validation feedback,
+# hedging), reporting how many calls succeed and their latency percentiles:
+#   - a slow tail (a few calls 10x slower), without and with hedging
+#   - transient 503s and malformed responses, without and with retries
+#   - calls that hang past the deadline
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_resilience
+#   python -m benchmarks.bench_resilience --calls 400 --concurrency 16
+#
+# Exits with status 1 if a scenario with retries (or hedging) completes fewer than
+# --min-success of its calls.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+from agent import resilience
+from agent.agent import slide_agent
+from agent_logic import _cached_llm_call
+from benchmarks.fakes import install_fake_agents
+from benchmarks.bench_pipeline import percentile
+
+# (name, fault rates for FakeLlm, resilience settings, whether the scenario's success rate is checked)
+SCENARIOS = (
+    ("no faults", {}, {}, True),
+    ("2% slow, no hedging", {"slow_fraction": 0.02}, {"LLM_HEDGE": False}, True),
+    ("2% slow, hedging", {"slow_fraction": 0.02}, {"LLM_HEDGE": True}, True),
+    ("5% 503 + 5% bad JSON, 1 attempt", {"error_fraction": 0.05, "invalid_fraction": 0.05}, {"LLM_MAX_ATTEMPTS": 1}, False),
+    ("5% 503 + 5% bad JSON, 3 attempts", {"error_fraction": 0.05, "invalid_fraction": 0.05}, {"LLM_MAX_ATTEMPTS": 3}, True),
+    ("5% hang, 3 attempts", {"slow_fraction": 0.05, "slow_factor": 100.0}, {"LLM_CALL_TIMEOUT_SECONDS": 1.0, "LLM_MAX_ATTEMPTS": 3}, True),
+)
+DEFAULTS = {name: getattr(resilience, name) for name in ("LLM_HEDGE", "LLM_MAX_ATTEMPTS", "LLM_CALL_TIMEOUT_SECONDS")}
+
+
+async def run_scenario(faults: dict, settings: dict, args) -> dict:
+    install_fake_agents(args.first_token, 0.0, **faults)
+    for name, value in {**DEFAULTS, **settings, "LLM_RETRY_BASE_SECONDS": 0.05}.items():
+        setattr(resilience, name, value)
+    resilience._latencies.clear()
+    stats_before = dict(resilience._stats)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def one_call(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await _cached_llm_call(slide_agent, f'Write slide {i + 1}, titled "Benchmark slide {i}".', "deck", use_cache=False)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    # Sequential warm-up, so hedging has the agent's latency to work from
+    for i in range(resilience.LLM_HEDGE_MIN_SAMPLES):
+        await one_call(-1 - i)
+    latencies.clear()
+    failures = 0
+    await asyncio.gather(*[one_call(i) for i in range(args.calls)])
+
+    latencies.sort()
+    stats = {key: resilience._stats[key] - stats_before[key] for key in ("attempts", "retries", "hedges", "hedge_wins")}
+    return {
+        "success": (args.calls - failures) / args.calls,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        **stats,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Agent calls under injected slowness and failures.")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--first-token", type=float, default=0.1, help="Fake LLM seconds per (normal) call.")
+    parser.add_argument("--min-success", type=float, default=0.99)
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'scenario':<36}{'success':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'attempts':>10}{'hedges':>8}{'won':>5}")
+    for name, faults, settings, checked in SCENARIOS:
+        result = asyncio.run(run_scenario(faults, settings, args))
+        print(f"{name:<36}{result['success']:>9.1%}{result['p50_ms']:>9.0f}{result['p99_ms']:>9.0f}{result['max_ms']:>9.0f}"
+              f"{result['attempts']:>10}{result['hedges']:>8}{result['hedge_wins']:>5}")
+        if checked and result["success"] < args.min_success:
+            failed.append(name)
+
+    for name in failed:
+        print(f"'{name}' completed fewer than {args.min_success:.0%} of its calls.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
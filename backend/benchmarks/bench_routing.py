@@ -0,0 +1,138 @@
+# bench_routing.py
+#
+# Edit calls routed across three fake models with different latency profiles (FakeLlm from
+# fakes.py, no API calls), through the same path as the endpoints (_cached_llm_call):
+#   - "pro":   slow and steady, what every agent ran on before routing
+#   - "flash": fast, made slow, then recovered, then unavailable
+#   - "lite":  fastest, for light requests (short single-slide edits)
+# Reports, per phase, latency percentiles, the share of calls within the edit latency target,
+# the success rate and which model calls were routed to.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_routing
+#   python -m benchmarks.bench_routing --calls 400 --slo 0.5
+#
+# Exits with status 1 if routing doesn't keep more calls within the target than a single model
+# when "flash" degrades, doesn't go back to it once it recovers, or loses calls (or keeps sending
+# most of them to it first) when it is down.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+from agent import resilience, routing
+from agent.agent import edit_agent
+from agent.routing import model_router
+from agent_logic import _cached_llm_call
+from benchmarks.fakes import FakeLlm
+from benchmarks.bench_pipeline import percentile
+
+# A prompt over LLM_LIGHT_PROMPT_TOKENS, like an edit of a slide with a lot of text
+HEAVY_PADDING = "Context: " + "lorem ipsum " * 700
+
+
+async def run_phase(args, heavy_every: int = 0) -> dict:
+    """`args.calls` edits; every `heavy_every`-th one has a heavy prompt."""
+    routed_before = dict(model_router._routed_to)
+    stats_before = dict(model_router._stats)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def one_call(i: int):
+        nonlocal failures
+        prompt = f"Edit {i}: make the title of this slide shorter."
+        if heavy_every and i % heavy_every == 0:
+            prompt += HEAVY_PADDING
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await _cached_llm_call(edit_agent, prompt, "edit", use_cache=False)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*[one_call(i) for i in range(args.calls)])
+    latencies.sort()
+    return {
+        "success": (args.calls - failures) / args.calls,
+        "within_slo": sum(seconds <= args.slo for seconds in latencies) / args.calls,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "fallbacks": model_router._stats["fallbacks"] - stats_before["fallbacks"],
+        "probes": model_router._stats["probes"] - stats_before["probes"],
+        "routed_to": {
+            name.removeprefix("fake-"): count - routed_before.get(name, 0)
+            for name, count in model_router._routed_to.items() if count > routed_before.get(name, 0)
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Latency-aware model routing across fake models.")
+    parser.add_argument("--calls", type=int, default=200, help="Edit calls per phase.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--slo", type=float, default=0.4, help="Edit latency target, seconds.")
+    args = parser.parse_args()
+
+    pro = FakeLlm(model="fake-pro", first_token_seconds=0.3, seconds_per_kchar=0.0)
+    flash = FakeLlm(model="fake-flash", first_token_seconds=0.1, seconds_per_kchar=0.0)
+    lite = FakeLlm(model="fake-lite", first_token_seconds=0.03, seconds_per_kchar=0.0)
+    model_router.slos["edit"] = args.slo
+    resilience.LLM_RETRY_BASE_SECONDS = 0.01
+    # Skipped models are probed more often than by default, to fit the benchmark's few seconds
+    routing.LLM_ROUTE_PROBE_SECONDS = 0.5
+
+    def degrade_flash():
+        flash.slow_fraction, flash.slow_factor = 0.5, 5.0
+
+    def recover_flash():
+        flash.slow_fraction = 0.0
+        time.sleep(routing.LLM_ROUTE_PROBE_SECONDS)
+
+    def flash_down():
+        flash.error_fraction = 1.0
+
+    # (name, chain for edits, light chain, change to the models before the phase, heavy_every)
+    phases = (
+        ("pro only (before routing)", [pro], [], None, 5),
+        ("lite for light, flash > pro", [flash, pro], [lite], None, 5),
+        ("flash slow, flash only", [flash], [], degrade_flash, 0),
+        ("flash slow, flash > pro", [flash, pro], [], None, 0),
+        ("flash recovered, flash > pro", [flash, pro], [], recover_flash, 0),
+        ("flash down, flash > pro", [flash, pro], [], flash_down, 0),
+    )
+
+    results = {}
+    print(f"{'phase':<32}{'success':>9}{'in SLO':>8}{'p50 ms':>8}{'p90 ms':>8}{'fallbacks':>11}{'probes':>8}  routed to")
+    for name, chain, light_chain, change, heavy_every in phases:
+        if change:
+            change()
+        model_router.chains["edit"] = chain
+        model_router.light_chain = light_chain
+        results[name] = result = asyncio.run(run_phase(args, heavy_every))
+        routed = ", ".join(f"{model} {count}" for model, count in sorted(result["routed_to"].items()))
+        print(f"{name:<32}{result['success']:>9.1%}{result['within_slo']:>8.1%}{result['p50_ms']:>8.0f}"
+              f"{result['p90_ms']:>8.0f}{result['fallbacks']:>11}{result['probes']:>8}  {routed}")
+
+    failures = []
+    if results["flash slow, flash > pro"]["within_slo"] <= results["flash slow, flash only"]["within_slo"]:
+        failures.append("routing kept no more calls within the target than flash alone while it was slow")
+    recovered = results["flash recovered, flash > pro"]["routed_to"]
+    if recovered.get("flash", 0) <= recovered.get("pro", 0):
+        failures.append("most calls still went to pro after flash recovered")
+    down = results["flash down, flash > pro"]
+    if down["success"] < 1.0:
+        failures.append("calls failed while flash was down, with pro to fall back on")
+    if down["routed_to"].get("flash", 0) > args.calls / 4:
+        failures.append("more than a quarter of the calls were still sent to flash first while it was down")
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
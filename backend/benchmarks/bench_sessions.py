@@ -0,0 +1,138 @@
+# bench_sessions.py
+#
+# Size of the requests sent to the model over many edits of one presentation, whose calls all run
+# in the presentation's agent session (fake agents from fakes.py, which record each request's
+# size: the prompt plus the session history sent with it). With the session history bounded
+# (AGENT_SESSION_HISTORY_TOKENS) the size must level off; without the bound it grows with every
+# edit. Also sends a burst of concurrent edits to the same session, and edits whose model calls
+# often fail (and are retried): a failed call must leave no unanswered turn in the session.
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_sessions
+#   python -m benchmarks.bench_sessions --edits 100
+#
+# Exits with status 1 if an edit fails, with the bound, the requests of the second half of the
+# edits vary by more than --max-growth, or a session holds a turn without a reply.
+
+import os
+import sys
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from agent.agent import session_service, APP_NAME, USER_ID
+from benchmarks import fakes
+from benchmarks.bench_pipeline import EDIT_INSTRUCTIONS
+
+
+async def create(client: httpx.AsyncClient, label: str, slides: int) -> str:
+    response = await client.post("/create_ppt", json={"description": f"{label} deck about urban cycling infrastructure", "num_slides": slides})
+    response.raise_for_status()
+    return response.json()["presentation_id"]
+
+
+def edit_request(presentation_id: str, i: int, slides: int) -> dict:
+    # Agentic instructions, numbered so no two prompts are the same (and none is a cache hit)
+    return {
+        "presentation_id": presentation_id, "slide_index": i % slides, "element_id": "bullet_point_0",
+        "edit_instruction": f"{EDIT_INSTRUCTIONS[i % len(EDIT_INSTRUCTIONS)]} (round {i})", "current_content": "",
+    }
+
+
+async def edit_sizes(client: httpx.AsyncClient, args, label: str) -> dict:
+    """Request sizes of `args.edits` sequential edits of a new presentation, one per edit."""
+    presentation_id = await create(client, label, args.slides)
+    sizes = []
+    errors = 0
+    for i in range(args.edits):
+        calls = len(fakes.request_chars)
+        response = await client.post("/edit_ppt", json=edit_request(presentation_id, i, args.slides))
+        if response.status_code != 200:
+            errors += 1
+            print(f"edit {i}: {response.status_code} {response.text[:200]}")
+        sizes.append(max(fakes.request_chars[calls:], default=0))
+    return {"presentation_id": presentation_id, "sizes": sizes, "errors": errors}
+
+
+def unanswered_turns(presentation_id: str) -> int:
+    """Messages in the presentation's session without a reply from the agent (an error event is none)."""
+    session = session_service.sessions[APP_NAME][USER_ID][f"presentation_{presentation_id}"]
+    replied = {
+        event.invocation_id for event in session.events
+        if event.author != "user" and event.content and event.content.parts and event.content.parts[0].text
+    }
+    return sum(event.author == "user" and event.invocation_id not in replied for event in session.events)
+
+
+async def run(args) -> int:
+    fakes.install_fake_agents(0, 0)
+    failures = []
+    bound = session_service.history_tokens
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        bounded = await edit_sizes(client, args, "bounded")
+        session_service.history_tokens = 10 ** 9
+        unbounded = await edit_sizes(client, args, "unbounded")
+        session_service.history_tokens = bound
+
+        responses = await asyncio.gather(*[
+            client.post("/edit_ppt", json=edit_request(bounded["presentation_id"], args.edits + i, args.slides))
+            for i in range(args.concurrent)
+        ])
+        concurrent_errors = sum(response.status_code != 200 for response in responses)
+
+        # Failing calls: each edit's call is retried until it succeeds (or LLM_MAX_ATTEMPTS run out)
+        fakes.install_fake_agents(0, 0, error_fraction=args.error_fraction)
+        flaky_id = await create(client, "flaky", args.slides)
+        flaky = await asyncio.gather(*[
+            client.post("/edit_ppt", json=edit_request(flaky_id, i, args.slides)) for i in range(args.concurrent)
+        ])
+        flaky_done = sum(response.status_code == 200 for response in flaky)
+        unanswered = {label: unanswered_turns(presentation_id) for label, presentation_id in (
+            ("bounded", bounded["presentation_id"]), ("unbounded", unbounded["presentation_id"]), ("flaky", flaky_id)
+        )}
+
+    print(f"Request size in characters over {args.edits} edits of one presentation (prompt + session history)")
+    marks = sorted({0, 1, 4, 9, 24, 49, 99, args.edits - 1} & set(range(args.edits)))
+    print(f"{'edit':<12}" + "".join(f"{mark + 1:>9}" for mark in marks))
+    for label, result in (("bounded", bounded), ("unbounded", unbounded)):
+        print(f"{label:<12}" + "".join(f"{result['sizes'][mark]:>9}" for mark in marks))
+    print(f"(bounded: AGENT_SESSION_HISTORY_TOKENS={bound})")
+    print(f"{args.concurrent} concurrent edits in the same session: {args.concurrent - concurrent_errors} succeeded")
+    print(f"{args.concurrent} edits with {args.error_fraction:.0%} of model calls failing: {flaky_done} succeeded; "
+          f"unanswered turns in the sessions: {', '.join(f'{label} {count}' for label, count in unanswered.items())}")
+
+    second_half = bounded["sizes"][args.edits // 2:]
+    growth = max(second_half) / max(1, min(second_half)) - 1
+    if growth > args.max_growth:
+        failures.append(f"with the bound, requests still vary by {growth:.0%} over the second half of the edits, above {args.max_growth:.0%}")
+    if bounded["errors"] or unbounded["errors"] or concurrent_errors:
+        failures.append(f"{bounded['errors'] + unbounded['errors'] + concurrent_errors} edits failed")
+    if any(unanswered.values()):
+        failures.append(f"sessions hold turns without a reply: {unanswered}")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Agent request size over many edits, with and without the session history bound.")
+    parser.add_argument("--edits", type=int, default=50)
+    parser.add_argument("--slides", type=int, default=5)
+    parser.add_argument("--concurrent", type=int, default=10, help="Concurrent edits sent to the same session at the end.")
+    parser.add_argument("--error-fraction", type=float, default=0.3, help="Model calls failing during the last edits.")
+    parser.add_argument("--max-growth", type=float, default=0.1,
+                        help="Largest acceptable spread of request sizes over the second half of the edits (0.1 = 10%%).")
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# bench_startup.py
+#
+# Cold start of an API worker, each run in a fresh interpreter (as a new uvicorn worker would be):
+#   - time to import main, and to be ready to serve (the app's lifespan has run), with the startup
+#     warm-up (STARTUP_WARMUP=1) and without it (STARTUP_WARMUP=0)
+#   - the first requests served by the new worker, a create (fake agents from fakes.py, no API
+#     calls or LLM latency) then its download, against the same requests once warm: what the
+#     warm-up (or its absence) moves into or out of the first users' requests
+#   - importing main from inside a running event loop (as under uvicorn's --reload or in a test),
+#     which must not try to start one of its own
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --runs 10 --target-seconds 2.5
+#
+# Exits with status 1 if the median time to ready with the warm-up exceeds --target-seconds, or
+# main can't be imported from inside a running event loop.
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line of timings in seconds
+_CHILD = """
+import os, sys, json, time, asyncio
+started = time.perf_counter()
+import main as app_main
+imported = time.perf_counter() - started
+
+async def timed(client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    response.raise_for_status()
+    return response, time.perf_counter() - start
+
+async def first_requests():
+    import httpx
+    from benchmarks.fakes import install_fake_agents
+    install_fake_agents(0, 0)
+    result = {"import": imported}
+    async with app_main.app.router.lifespan_context(app_main.app):
+        result["ready"] = time.perf_counter() - started
+        result.update({name: app_main.startup_timings[name] for name in ("warmup_seconds",)})
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+            for run in ("first", "warm"):
+                request = {"description": f"{run} deck about quarterly operations", "num_slides": 5}
+                response, result[f"{run}_create"] = await timed(client, "POST", "/create_ppt", json=request)
+                presentation_id = response.json()["presentation_id"]
+                _, result[f"{run}_download"] = await timed(client, "GET", f"/download_ppt/{presentation_id}")
+    return result
+
+print(json.dumps(asyncio.run(first_requests())))
+app_main.render_executor.shutdown()
+"""
+
+# Imports main from inside a running event loop
+_CHILD_IN_LOOP = """
+import asyncio
+
+async def import_main():
+    import main
+    return main.app is not None
+
+print(asyncio.run(import_main()))
+"""
+
+
+def run_child(code: str, warmup: bool) -> subprocess.CompletedProcess:
+    env = {**os.environ, "STARTUP_WARMUP": "1" if warmup else "0"}
+    env.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+    return subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=600)
+
+
+def measure(warmup: bool, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        completed = run_child(_CHILD, warmup)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Startup run failed:\n{completed.stderr}")
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {name: statistics.median(sample[name] for sample in samples) for name in samples[0]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="API worker cold start, with and without the startup warm-up.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per configuration (medians are reported).")
+    parser.add_argument("--target-seconds", type=float, default=3.0, help="Highest acceptable median time to ready with the warm-up.")
+    args = parser.parse_args()
+    failures = []
+
+    results = {warmup: measure(warmup, args.runs) for warmup in (False, True)}
+    print(f"Median of {args.runs} fresh interpreters, seconds")
+    print(f"{'':<16}{'import':>8}{'warm-up':>9}{'ready':>8}{'1st create':>12}{'1st download':>14}{'warm create':>13}{'warm download':>15}")
+    for warmup, result in results.items():
+        print(f"{'STARTUP_WARMUP=' + ('1' if warmup else '0'):<16}{result['import']:>8.2f}{result['warmup_seconds']:>9.2f}{result['ready']:>8.2f}"
+              f"{result['first_create']:>12.3f}{result['first_download']:>14.3f}{result['warm_create']:>13.3f}{result['warm_download']:>15.3f}")
+    if results[True]["ready"] > args.target_seconds:
+        failures.append(f"ready {results[True]['ready']:.2f}s after startup with the warm-up, above the {args.target_seconds:.2f}s target")
+
+    completed = run_child(_CHILD_IN_LOOP, False)
+    in_loop = completed.returncode == 0 and completed.stdout.strip().endswith("True")
+    print(f"\nImport from inside a running event loop: {'ok' if in_loop else 'failed'}")
+    if not in_loop:
+        failures.append(f"main can't be imported from inside a running event loop:\n{completed.stderr}")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# bench_stream.py
+#
+# Streamed deck creation (/create_ppt_stream) with a fake streaming agent (FakeLlm from fakes.py,
+# which sends its JSON in chunks over SSE):
+#   - DeckStreamParser on a deck's JSON split every way into two chunks, into one-character chunks
+#     and into random chunks, with strings holding escapes, quotes and JSON punctuation: the events
+#     must be the same as for the whole text
+#   - time to the first slide against time to the complete deck, at several deck sizes; compared
+#     after the model's first token, which no streaming can bring forward
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_stream
+#   python -m benchmarks.bench_stream --slides 5 20 --llm-per-kchar 0.5
+#
+# Exits with status 1 if the parser's events depend on how the text is split, or the first slide
+# arrives later than --max-first-slide-share of the way from the first token to the complete deck.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import main as app_main
+from agent_logic import DeckStreamParser
+from models.model import PresentationContent
+from benchmarks.fakes import fake_output, install_fake_agents
+
+# Strings that a chunk boundary could split in the middle of an escape sequence or fool a parser
+# that doesn't track strings
+TRICKY_STRINGS = (
+    'Say "hello" to {braces}, [brackets], commas, and colons: done',
+    "Back\\slash \\\" and a trailing backslash \\",
+    "Unicode café — 中文 and an emoji \U0001F680",
+    "Tabs\tand\nnewlines \\n that aren't",
+    "}]},{\"slides\": [",
+)
+
+
+def tricky_deck(num_slides: int) -> dict:
+    deck = fake_output(PresentationContent, f"streaming benchmark deck of approximately {num_slides} slides")
+    deck["name"] = TRICKY_STRINGS[0]
+    for i, slide in enumerate(deck["slides"]):
+        slide["title"] = TRICKY_STRINGS[i % len(TRICKY_STRINGS)]
+        slide["bullet_points"].append(TRICKY_STRINGS[(i + 1) % len(TRICKY_STRINGS)])
+    return deck
+
+
+def parse(chunks) -> list:
+    parser = DeckStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def check_parser(num_slides: int, random_splits: int) -> list:
+    """Returns the splits (as descriptions) whose events differ from the expected ones."""
+    deck = tricky_deck(num_slides)
+    failures = []
+    expected = [("deck", {"name": deck["name"], "overall_theme": deck["overall_theme"]})] + [("slide", slide) for slide in deck["slides"]]
+    for indent in (None, 2):
+        # Keys in the order the agent writes them, "slides" last; and indented, as some models answer
+        text = json.dumps(deck, indent=indent, ensure_ascii=indent is None)
+        if parse([text]) != expected:
+            failures.append(f"whole text (indent {indent})")
+            continue
+        for split in range(1, len(text)):
+            if parse([text[:split], text[split:]]) != expected:
+                failures.append(f"two chunks split at {split} of {len(text)} (indent {indent}): ...{text[max(0, split - 20):split]!r}|{text[split:split + 20]!r}...")
+        if parse(list(text)) != expected:
+            failures.append(f"one-character chunks (indent {indent})")
+        rng = random.Random(num_slides)
+        for _ in range(random_splits):
+            cuts = sorted(rng.sample(range(1, len(text)), rng.randint(2, 40)))
+            chunks = [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+            if parse(chunks) != expected:
+                failures.append(f"random chunks at {cuts} (indent {indent})")
+    return failures
+
+
+async def post_streamed(path: str, body: dict):
+    """
+    Sends a POST straight to the ASGI app and yields the response body chunks as the app sends
+    them (httpx's ASGI transport only returns the body once the response is complete).
+    """
+    chunks = asyncio.Queue()
+    request = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode("ascii"), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(request)).encode("ascii"))],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": request, "more_body": False}
+        await asyncio.Event().wait() # No disconnect; the app is cancelled when done
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            await chunks.put(message.get("body", b""))
+            if not message.get("more_body", False):
+                await chunks.put(None)
+
+    app = asyncio.create_task(app_main.app(scope, receive, send))
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+    finally:
+        app.cancel()
+
+
+async def time_stream(num_slides: int, label: str) -> dict:
+    start = time.perf_counter()
+    first_slide = None
+    slides = 0
+    last = None
+    pending = b""
+    async for chunk in post_streamed("/create_ppt_stream", {
+        "description": f"{label} streamed deck about supply chain resilience", "num_slides": num_slides, "use_cache": False,
+    }):
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            last = json.loads(line)
+            if last["event"] == "slide":
+                slides += 1
+                if first_slide is None:
+                    first_slide = time.perf_counter() - start
+    return {"first_slide": first_slide, "complete": time.perf_counter() - start, "slides": slides, "last": last}
+
+
+async def run(args) -> list:
+    install_fake_agents(args.llm_first_token, args.llm_per_kchar)
+    failures = []
+    # Started like the server, through the app's lifespan, so the first deck isn't also the warm-up
+    async with app_main.app.router.lifespan_context(app_main.app):
+        print(f"\nFake LLM {args.llm_first_token}s to first token + {args.llm_per_kchar}s/kchar, streamed in 200-character chunks")
+        print(f"{'slides':<8}{'first slide s':>14}{'complete s':>12}{'share after first token':>25}")
+        for num_slides in args.slides:
+            result = await time_stream(num_slides, f"{num_slides}-slide")
+            if result["last"] is None or result["last"]["event"] != "complete" or result["first_slide"] is None:
+                failures.append(f"{num_slides} slides: the stream ended with {result['last']}")
+                continue
+            share = (result["first_slide"] - args.llm_first_token) / (result["complete"] - args.llm_first_token)
+            print(f"{num_slides:<8}{result['first_slide']:>14.2f}{result['complete']:>12.2f}{share:>25.0%}")
+            if num_slides > 1 and share > args.max_first_slide_share:
+                failures.append(f"{num_slides} slides: the first slide arrived {share:.0%} of the way from the first token "
+                                f"to the complete deck, above {args.max_first_slide_share:.0%}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Streamed deck parsing and time to first slide.")
+    parser.add_argument("--slides", type=int, nargs="+", default=(5, 10, 20), help="Deck sizes to stream.")
+    parser.add_argument("--parser-slides", type=int, default=6, help="Slides of the deck the parser is checked on.")
+    parser.add_argument("--random-splits", type=int, default=200, help="Random chunkings the parser is checked on.")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Fake LLM seconds to first token.")
+    parser.add_argument("--llm-per-kchar", type=float, default=0.2, help="Fake LLM seconds per 1000 output characters.")
+    parser.add_argument("--max-first-slide-share", type=float, default=0.5,
+                        help="Latest acceptable first slide, as a share of the time from the first token to the complete deck.")
+    args = parser.parse_args()
+
+    failures = check_parser(args.parser_slides, args.random_splits)
+    print(f"DeckStreamParser on a {args.parser_slides}-slide deck split every way: "
+          f"{'ok' if not failures else f'{len(failures)} splits gave different events'}")
+    try:
+        failures += asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+    for failure in failures[:20]:
+        print(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
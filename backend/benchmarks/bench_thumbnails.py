@@ -0,0 +1,141 @@
+# bench_thumbnails.py
+#
+# Slide thumbnails through the API (/presentations/{id}/thumbnails and
+# /presentations/{id}/slides/{i}/thumbnail) on a deck with an image on every other slide:
+#   - drawing time per slide and thumbnail size, PNG against WebP
+#   - a cold render of the whole deck on one render worker against the whole pool
+#   - the same request again (nothing drawn), then after an edit of one slide (only it drawn)
+#   - a conditional request for an unchanged slide (304, nothing drawn)
+#
+# Run from the backend directory:
+#   python -m benchmarks.bench_thumbnails
+#   python -m benchmarks.bench_thumbnails --slides 100 --width 640
+#
+# Exits with status 1 if an unchanged slide is drawn again or the conditional request isn't a 304.
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark") # genai.Client() needs a key to construct
+
+import httpx
+import main as app_main
+from image_processing import store_image
+from presentation_store import new_presentation_entry
+from render_executor import RenderExecutor
+from thumbnails import ThumbnailCache, THUMBNAIL_FORMATS
+from benchmarks.bench_generator import build_case
+
+
+def seed_presentation(num_slides: int, image_size) -> str:
+    content, images = build_case(num_slides, True, image_size)
+    slides = []
+    for i, slide in enumerate(content.slides):
+        # Every other slide keeps its image; the rest show the placeholder
+        image_key = store_image(images[slide.image_hash]) if i % 2 == 0 else None
+        slides.append(slide.model_copy(update={"image_hash": image_key}))
+    content = content.model_copy(update={"slides": slides})
+    presentation_id = f"thumbnails-{num_slides}"
+    app_main.presentations_store[presentation_id] = new_presentation_entry("benchmark", content)
+    return presentation_id
+
+
+async def timed_get(client: httpx.AsyncClient, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.get(url, **kwargs)
+    return response, (time.perf_counter() - start) * 1000
+
+
+def drawn() -> int:
+    return app_main.thumbnail_cache.stats()["rendered"]
+
+
+async def run(args) -> int:
+    presentation_id = seed_presentation(args.slides, tuple(args.image_size))
+    base = f"/presentations/{presentation_id}"
+    pool = app_main.render_executor
+    failures = []
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+        print(f"{args.slides} slides, {args.width}px wide, render pool: {pool.kind} x{pool.max_workers}")
+        print(f"{'request':<36}{'ms':>9}{'drawn':>7}{'KB/slide':>10}")
+
+        def report(label: str, response: httpx.Response, ms: float, drawn_before: int):
+            thumbnails = response.json()["thumbnails"]
+            kb = sum(len(t["data"]) * 3 / 4 for t in thumbnails) / max(1, len(thumbnails)) / 1024
+            print(f"{label:<36}{ms:>9.0f}{drawn() - drawn_before:>7}{kb:>10.1f}")
+
+        # Cold renders: one worker, then the pool, for each format
+        for image_format in THUMBNAIL_FORMATS:
+            for label, executor in (("1 worker", RenderExecutor(pool.kind, 1)), (f"pool of {pool.max_workers}", pool)):
+                app_main.thumbnail_cache = ThumbnailCache()
+                app_main.render_executor = executor
+                await client.get(f"{base}/slides/0/thumbnail", params={"width": args.width, "format": image_format}) # Worker warm-up
+                app_main.thumbnail_cache = ThumbnailCache()
+                response, ms = await timed_get(client, f"{base}/thumbnails", params={"width": args.width, "format": image_format})
+                report(f"cold, {image_format}, {label}", response, ms, 0)
+                if executor is not pool:
+                    executor.shutdown()
+        app_main.render_executor = pool
+
+        # The last cold render left the cache warm: nothing is drawn again
+        params = {"width": args.width, "format": image_format}
+        before = drawn()
+        response, ms = await timed_get(client, f"{base}/thumbnails", params=params)
+        report("warm, all slides", response, ms, before)
+        if drawn() != before:
+            failures.append(f"{drawn() - before} unchanged slides were drawn again")
+
+        # Edit one slide: only it is drawn, and only it is sent to a client at the previous version
+        presentation_data = app_main.presentations_store[presentation_id]
+        version = presentation_data["version"]
+        content = presentation_data["content"]
+        edited = 1
+        slides = list(content.slides)
+        slides[edited] = slides[edited].model_copy(update={"title": slides[edited].title + " (edited)"})
+        content.slides = slides
+        app_main.mark_slides_changed(presentation_data, [edited])
+
+        before = drawn()
+        response, ms = await timed_get(client, f"{base}/thumbnails", params={**params, "since_version": version})
+        report("after 1 edit, since previous version", response, ms, before)
+        if drawn() - before != 1 or [t["slide_index"] for t in response.json()["thumbnails"]] != [edited]:
+            failures.append(f"after editing slide {edited}, {drawn() - before} slides were drawn")
+        before = drawn()
+        response, ms = await timed_get(client, f"{base}/thumbnails", params=params)
+        report("after 1 edit, all slides", response, ms, before)
+        if drawn() != before:
+            failures.append(f"{drawn() - before} slides were drawn again for a full resync after the edit")
+
+        # A client that has slide 0's thumbnail revalidates it
+        response = await client.get(f"{base}/slides/0/thumbnail", params=params)
+        etag = response.headers["ETag"]
+        before = drawn()
+        response, ms = await timed_get(client, f"{base}/slides/0/thumbnail", params=params, headers={"If-None-Match": etag})
+        print(f"{'If-None-Match, unchanged slide':<36}{ms:>9.1f}{drawn() - before:>7}   status {response.status_code}")
+        if response.status_code != 304:
+            failures.append(f"conditional request for an unchanged slide got {response.status_code}, not 304")
+
+    for failure in failures:
+        print(failure)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Slide thumbnail rendering and caching through the API.")
+    parser.add_argument("--slides", type=int, default=40)
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768), metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    finally:
+        app_main.render_executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# fakes.py
+
+import io
+import re
+import json
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import AsyncGenerator, List, Optional, Type
+from pydantic import BaseModel
+from PIL import Image
+from google.genai import types
+from google.genai import errors as genai_errors
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from models.model import PresentationContent, SlideContent, PresentationOutline, MermaidOutput
+
+# Deterministic stand-ins for Gemini, so the whole request pipeline (ADK Runner, sessions,
+# caches, rendering) can be measured offline. Latency is simulated with asyncio.sleep:
+# a fixed time to first token plus a time per 1000 characters of output, which is roughly
+# how the real models behave. Faults (slow responses, API errors, malformed output) can be
+# injected at given rates, to exercise the retry and hedging logic (see agent/resilience.py).
+
+# Draws which calls get a fault; seeded so a run is reproducible
+_fault_rng = random.Random(0)
+# Size in characters of every request a FakeLlm has received, in order: the text of all its
+# contents, i.e. the prompt and the session history sent along with it
+request_chars: List[int] = []
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _words(rng: random.Random, count: int) -> str:
+    vocabulary = (
+        "adoption growth model data strategy customer platform risk cost energy network "
+        "market team roadmap quality insight scale value process design impact"
+    ).split()
+    return " ".join(rng.choice(vocabulary) for _ in range(count)).capitalize()
+
+
+def _slide(rng: random.Random, title: Optional[str] = None) -> dict:
+    return {
+        "title": title or _words(rng, 4),
+        "bullet_points": [_words(rng, rng.randint(8, 14)) for _ in range(rng.randint(3, 5))],
+        "image_description": _words(rng, 6),
+    }
+
+
+def fake_output(schema: Type[BaseModel], prompt: str) -> dict:
+    """A valid, deterministic response of `schema` for `prompt` (same prompt, same response)."""
+    rng = random.Random(_seed(prompt))
+    match = re.search(r"approximately (\d+) slides", prompt)
+    num_slides = int(match.group(1)) if match else 5
+    if schema is PresentationContent:
+        return {"name": _words(rng, 3), "overall_theme": "professional", "slides": [_slide(rng) for _ in range(num_slides)]}
+    if schema is PresentationOutline:
+        return {"name": _words(rng, 3), "overall_theme": "professional", "slide_titles": [_words(rng, 4) for _ in range(num_slides)]}
+    if schema is SlideContent:
+        match = re.search(r'titled "([^"]*)"', prompt)
+        return _slide(rng, match.group(1) if match else None)
+    if schema is MermaidOutput:
+        nodes = [f"N{i}[{_words(rng, 2)}]" for i in range(rng.randint(4, 8))]
+        edges = "\n".join(f"    {a.split('[')[0]} --> {b.split('[')[0]}" for a, b in zip(nodes, nodes[1:]))
+        return {"elements": "graph TD\n" + "\n".join(f"    {n}" for n in nodes) + "\n" + edges, "explanation": _words(rng, 20)}
+    raise ValueError(f"No fake output for {schema.__name__}")
+
+
+class FakeLlm(BaseLlm):
+    """
+    ADK model that answers with `fake_output(output_schema, prompt)` after a simulated delay.
+    Supports streaming (StreamingMode.SSE) by sending the JSON in chunks. Without an
+    `output_schema` it answers with the schema of the agent calling it, so one FakeLlm can
+    stand in for a model shared by several agents (see agent/routing.py).
+    A `slow_fraction` of calls take `slow_factor` times longer, an `error_fraction` fail with a
+    503 and an `invalid_fraction` answer with truncated JSON.
+    """
+    output_schema: Optional[Type[BaseModel]] = None
+    first_token_seconds: float = 0.5
+    seconds_per_kchar: float = 0.2
+    slow_fraction: float = 0.0
+    slow_factor: float = 10.0
+    error_fraction: float = 0.0
+    invalid_fraction: float = 0.0
+
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        request_chars.append(sum(len(part.text or "") for content in llm_request.contents for part in content.parts or []))
+        prompt = llm_request.contents[-1].parts[0].text or ""
+        text = json.dumps(fake_output(self.output_schema or llm_request.config.response_schema, prompt))
+        slow = self.slow_factor if _fault_rng.random() < self.slow_fraction else 1.0
+        fault = _fault_rng.random()
+        await asyncio.sleep(self.first_token_seconds * slow)
+        if fault < self.error_fraction:
+            raise genai_errors.ServerError(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+        if fault < self.error_fraction + self.invalid_fraction:
+            text = text[:len(text) // 2]
+        if stream:
+            chunk = 200
+            for start in range(0, len(text), chunk):
+                await asyncio.sleep(self.seconds_per_kchar * chunk / 1000)
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text[start:start + chunk])]), partial=True)
+        else:
+            await asyncio.sleep(self.seconds_per_kchar * len(text) / 1000 * slow)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), turn_complete=True)
+
+
+def install_fake_agents(first_token_seconds: float = 0.5, seconds_per_kchar: float = 0.2, **faults):
+    """Points every agent at a FakeLlm with the given latency and fault rates (see FakeLlm)."""
+    from agent import agent as agents
+    for agent in (agents.ppt_agent, agents.edit_agent, agents.outline_agent, agents.slide_agent, agents.worflow):
+        agent.model = FakeLlm(
+            model=f"fake-{agent.name}", output_schema=agent.output_schema,
+            first_token_seconds=first_token_seconds, seconds_per_kchar=seconds_per_kchar, **faults
+        )
+
+
+def fake_image(prompt: str, size=(1024, 768)) -> bytes:
+    """
+    A deterministic PNG for `prompt`: two gradients and a noise channel, so it compresses
+    about as badly as a real generated image.
+    """
+    rng = random.Random(_seed(prompt))
+    red_offset, green_offset = rng.randint(0, 255), rng.randint(0, 255)
+    red = Image.linear_gradient("L").resize(size).point(lambda v: (v + red_offset) % 256)
+    green = Image.linear_gradient("L").rotate(90).resize(size).point(lambda v: (v + green_offset) % 256)
+    blue = Image.frombytes("L", size, rng.randbytes(size[0] * size[1]))
+    buffer = io.BytesIO()
+    Image.merge("RGB", (red, green, blue)).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class FakeImageClient:
+    """
+    Stands in for `genai.Client` in image generation: `client.aio.models.generate_content`
+    returns a response carrying `fake_image(prompt)` after `latency_seconds`.
+    Prompts in `fail_prompts` fail with a 503 instead. Counts the requests in flight, and the
+    most there have been at once, to check concurrency limits.
+    """
+
+    def __init__(self, latency_seconds: float = 2.0, size=(1024, 768), fail_prompts=()):
+        self.latency_seconds = latency_seconds
+        self.size = size
+        self.fail_prompts = set(fail_prompts)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._images = {}
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_content))
+
+    async def _generate_content(self, model, contents, config=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        finally:
+            self.in_flight -= 1
+        if contents in self.fail_prompts:
+            raise genai_errors.ServerError(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+        image_bytes = self._images.get(contents)
+        if image_bytes is None:
+            image_bytes = self._images[contents] = fake_image(contents, self.size)
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=image_bytes), text=None)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
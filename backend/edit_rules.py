@@ -0,0 +1,203 @@
+# edit_rules.py
+
+import re
+from typing import Dict, List, Optional, Tuple
+from models.model import SlideContent
+
+# Local fast path for literal edit instructions ("change this to 'Introduction to AI'",
+# "delete this bullet", "move bullet 2 to the top"). They are applied to the SlideContent
+# directly; anything the rules don't recognize goes to the edit agent as before.
+# Bullet numbers in instructions count from 1, the way people count; element ids count from 0.
+
+_PLEASE = r"^(?:please\s+)?"
+_THIS = r"(?:this|it|the\s+(?:title|text|bullet(?:\s+point)?|point|line|image\s+description|description))"
+_BULLET = r"(?:bullet(?:\s+point)?|point|line)"
+_QUOTED = r"""(?P<q>["'“‘])(?P<text>.+)["'”’]"""
+_BULLET_REF = rf"(?:{_THIS}|{_BULLET}\s+(?:#\s*)?(?P<src>\d+))"
+
+_REPLACE = [
+    re.compile(_PLEASE + rf"(?:change|replace|set|rename|update|edit)(?:\s+{_THIS})?\s+(?:to|with|as|into)\s*:?\s*{_QUOTED}$", re.I),
+    re.compile(_PLEASE + rf"(?:make\s+(?:this|it)|(?:this|it)\s+should\s+(?:be|say|read))\s*:?\s*{_QUOTED}$", re.I),
+]
+_DELETE = re.compile(
+    _PLEASE + r"(?:delete|remove|drop)(?:\s+(?:this|it|the))?"
+    r"(?:\s+(?:bullet(?:\s+point)?|point|line|image(?:\s+description)?|description))?$", re.I
+)
+_INSERT = re.compile(
+    _PLEASE + rf"(?:add|insert|append)\s+(?:(?:a|an|another)\s+)?(?:new\s+)?(?:{_BULLET}\s*)?"
+    rf"(?:(?:saying|that\s+says|reading|with(?:\s+the\s+text)?)\s*)?:?\s*{_QUOTED}"
+    r"(?:\s+(?P<where>above|before|below|after)(?:\s+(?:this|it))?"
+    r"|\s+(?:at\s+the\s+|to\s+the\s+)?(?P<end>top|start|beginning|bottom|end))?$", re.I
+)
+_MOVE_TO_END = re.compile(
+    _PLEASE + rf"move\s+{_BULLET_REF}(?:\s+{_BULLET})?\s+(?:to\s+the\s+|to\s+)?"
+    r"(?P<pos>top|start|beginning|first|bottom|end|last|up|down)(?:\s+of\s+the\s+list)?$", re.I
+)
+_MOVE_TO_POSITION = re.compile(
+    _PLEASE + rf"move\s+{_BULLET_REF}\s+to\s+(?:position|place|spot|{_BULLET})\s+(?:#\s*)?(?P<dst>\d+)$", re.I
+)
+_SWAP = re.compile(
+    _PLEASE + rf"swap\s+{_BULLET_REF}\s+(?:and|with)\s+(?:{_BULLET}\s+)?(?:#\s*)?(?P<dst>\d+)$", re.I
+)
+
+# Fast-path counters, reported by /store_stats
+_stats: Dict[str, object] = {"fast_path": 0, "agent": 0, "by_rule": {}}
+
+
+def _literal_text(match: "re.Match") -> Optional[str]:
+    """
+    The quoted text of an instruction, or None if it is empty or the quoting is ambiguous
+    (e.g. "change this to 'A' and make it 'B'": a quote next to a space inside the text).
+    Apostrophes within words ("the company's goals") are fine.
+    """
+    text = match.group("text")
+    if not text.strip() or re.search(r"""\s["'“”‘’]|["'“”‘’]\s""", text):
+        return None
+    return text
+
+
+def _bullet_index(element_id: str) -> Optional[int]:
+    match = re.fullmatch(r"bullet_point_(\d+)", element_id)
+    return int(match.group(1)) if match else None
+
+
+def _source_index(match: "re.Match", element_id: str) -> Optional[int]:
+    """The bullet an instruction refers to: "bullet N" if it names one, else the selected element."""
+    if match.group("src") is not None:
+        return int(match.group("src")) - 1
+    return _bullet_index(element_id)
+
+
+def _with_bullets(slide: SlideContent, bullets: List[str]) -> SlideContent:
+    return slide.model_copy(update={"bullet_points": bullets})
+
+
+def _replace(slide: SlideContent, element_id: str, text: Optional[str]) -> Optional[SlideContent]:
+    if text is None:
+        return None
+    if element_id == "title":
+        return slide.model_copy(update={"title": text})
+    if element_id == "image_description":
+        return slide.model_copy(update={"image_description": text})
+    index = _bullet_index(element_id)
+    if index is None or index >= len(slide.bullet_points):
+        return None
+    bullets = list(slide.bullet_points)
+    bullets[index] = text
+    return _with_bullets(slide, bullets)
+
+
+def _delete(slide: SlideContent, element_id: str) -> Optional[SlideContent]:
+    if element_id == "image_description":
+        # The description is what the image was generated from, so the image goes with it
+        return slide.model_copy(update={"image_description": None, "image_hash": None})
+    index = _bullet_index(element_id)
+    if index is None or index >= len(slide.bullet_points):
+        return None # A slide always needs its title; leave anything else to the agent
+    bullets = list(slide.bullet_points)
+    del bullets[index]
+    return _with_bullets(slide, bullets)
+
+
+def _insert(slide: SlideContent, element_id: str, match: "re.Match") -> Optional[SlideContent]:
+    text = _literal_text(match)
+    if text is None:
+        return None
+    bullets = list(slide.bullet_points)
+    index = _bullet_index(element_id)
+    if index is not None and index >= len(bullets):
+        return None
+    where, end = (match.group("where") or "").lower(), (match.group("end") or "").lower()
+    if end in ("top", "start", "beginning"):
+        position = 0
+    elif end in ("bottom", "end") or index is None:
+        position = len(bullets)
+    elif where in ("above", "before"):
+        position = index
+    else:
+        position = index + 1 # Next to the selected bullet by default
+    bullets.insert(position, text)
+    return _with_bullets(slide, bullets)
+
+
+def _move(slide: SlideContent, source: Optional[int], destination: int) -> Optional[SlideContent]:
+    bullets = list(slide.bullet_points)
+    if source is None or not 0 <= source < len(bullets) or not 0 <= destination < len(bullets):
+        return None
+    bullets.insert(destination, bullets.pop(source))
+    return _with_bullets(slide, bullets)
+
+
+def apply_literal_edit(slide: SlideContent, element_id: str, instruction: str) -> Optional[Tuple[str, SlideContent]]:
+    """
+    Applies `instruction` to `element_id` of `slide` without the LLM if it is a literal
+    replace, delete, insert or reorder. Returns (rule, updated slide), or None if the
+    instruction needs the agent. `slide` itself is never modified.
+    """
+    instruction = instruction.strip().rstrip(".!").strip()
+
+    for pattern in _REPLACE:
+        match = pattern.match(instruction)
+        if match:
+            updated = _replace(slide, element_id, _literal_text(match))
+            return ("replace", updated) if updated is not None else None
+
+    if _DELETE.match(instruction):
+        updated = _delete(slide, element_id)
+        return ("delete", updated) if updated is not None else None
+
+    match = _INSERT.match(instruction)
+    if match:
+        updated = _insert(slide, element_id, match)
+        return ("insert", updated) if updated is not None else None
+
+    match = _MOVE_TO_END.match(instruction)
+    if match:
+        source = _source_index(match, element_id)
+        position = match.group("pos").lower()
+        if position in ("top", "start", "beginning", "first"):
+            destination = 0
+        elif position in ("bottom", "end", "last"):
+            destination = len(slide.bullet_points) - 1
+        elif source is None:
+            return None
+        else:
+            destination = source - 1 if position == "up" else source + 1
+        updated = _move(slide, source, destination)
+        return ("reorder", updated) if updated is not None else None
+
+    match = _MOVE_TO_POSITION.match(instruction)
+    if match:
+        updated = _move(slide, _source_index(match, element_id), int(match.group("dst")) - 1)
+        return ("reorder", updated) if updated is not None else None
+
+    match = _SWAP.match(instruction)
+    if match:
+        first, second = _source_index(match, element_id), int(match.group("dst")) - 1
+        bullets = list(slide.bullet_points)
+        if first is None or not 0 <= first < len(bullets) or not 0 <= second < len(bullets):
+            return None
+        bullets[first], bullets[second] = bullets[second], bullets[first]
+        return "reorder", _with_bullets(slide, bullets)
+
+    return None
+
+
+def record_edit(rule: Optional[str]):
+    """Counts an edit as handled by the fast path (`rule`) or sent to the agent (None)."""
+    if rule is None:
+        _stats["agent"] += 1
+    else:
+        _stats["fast_path"] += 1
+        _stats["by_rule"][rule] = _stats["by_rule"].get(rule, 0) + 1
+
+
+def fast_path_stats() -> Dict[str, object]:
+    """How many edits the fast path handled, per rule, and its hit rate."""
+    total = _stats["fast_path"] + _stats["agent"]
+    return {
+        "fast_path": _stats["fast_path"],
+        "agent": _stats["agent"],
+        "by_rule": dict(_stats["by_rule"]),
+        "hit_rate": round(_stats["fast_path"] / total, 4) if total else 0.0,
+    }
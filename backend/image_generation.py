@@ -0,0 +1,64 @@
+# image_generation.py
+
+import os
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Tuple
+from google.genai import types
+
+IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
+# How many image requests a deck-level generation keeps in flight at once
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+
+
+async def generate_image_bytes(client, prompt: str) -> Optional[bytes]:
+    """
+    Generates one image for `prompt` through the async GenAI client and returns its raw bytes,
+    or None if the model answered without an image.
+    `client` is a `genai.Client` (or any object exposing the same `aio.models.generate_content`).
+    """
+    response = await client.aio.models.generate_content(
+        model=IMAGE_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE']
+        )
+    )
+
+    if not response or not response.candidates:
+        return None
+    for part in response.candidates[0].content.parts:
+        if part.inline_data is not None:
+            return part.inline_data.data
+    return None
+
+
+async def generate_slide_images(
+    client,
+    prompts: Dict[int, str], # Key: slide index, Value: image prompt
+    concurrency: int = IMAGE_CONCURRENCY
+) -> AsyncIterator[Tuple[int, Optional[bytes], Optional[Exception]]]:
+    """
+    Generates images for many slides concurrently, at most `concurrency` requests at a time.
+    Yields (slide_index, image_bytes, error) as each slide finishes, in completion order,
+    so callers can report per-slide progress. A failure on one slide doesn't stop the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate_one(slide_index: int, prompt: str):
+        async with semaphore:
+            try:
+                image_bytes = await generate_image_bytes(client, prompt)
+                if image_bytes is None:
+                    return slide_index, None, ValueError("No image generated.")
+                return slide_index, image_bytes, None
+            except Exception as e:
+                return slide_index, None, e
+
+    tasks = [asyncio.create_task(generate_one(i, prompt)) for i, prompt in prompts.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # If the consumer stops early (e.g. the client disconnected), don't leave requests running.
+        for task in tasks:
+            task.cancel()
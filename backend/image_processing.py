@@ -0,0 +1,154 @@
+# image_processing.py
+
+import io
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+from PIL import Image
+from image_store import image_store
+from metrics import span
+from themes import IMAGE_WIDTH, IMAGE_HEIGHT
+
+# IMAGE_NORMALIZE: "0" embeds images exactly as generated instead of normalizing them.
+# IMAGE_TARGET_DPI: resolution images are downsampled to for their placement box on the slide
+#                   (4x3 inches, so 600x450 pixels at 150 DPI). Images are never upscaled.
+# IMAGE_FORMAT: "jpeg" recompresses opaque images to JPEG (images with transparency stay PNG);
+#               "png" keeps every image lossless and only resizes it.
+# IMAGE_JPEG_QUALITY: JPEG quality (1-95).
+IMAGE_NORMALIZE = os.getenv("IMAGE_NORMALIZE", "1") != "0"
+IMAGE_TARGET_DPI = int(os.getenv("IMAGE_TARGET_DPI", "150"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+_EMU_PER_INCH = 914400
+
+
+def _has_transparency(img: Image.Image) -> bool:
+    if img.mode in ("RGBA", "LA", "PA"):
+        # Generated images often carry an alpha channel that is opaque everywhere
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def normalize_image(
+    image_bytes: bytes,
+    dpi: int = IMAGE_TARGET_DPI,
+    image_format: str = IMAGE_FORMAT,
+    quality: int = IMAGE_JPEG_QUALITY,
+) -> bytes:
+    """
+    Downsamples an image to `dpi` for the slide's picture box and recompresses it: to JPEG,
+    unless it has transparency or `image_format` is "png". Returns whichever of the result and
+    the original is smaller, and the original if it can't be decoded (python-pptx reports that).
+    Deterministic, so the same source always normalizes to the same bytes.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.load()
+    except Exception as e:
+        print(f"Could not normalize image ({e}), embedding it as is.")
+        return image_bytes
+
+    # Pictures are stretched to the box, so each side is scaled independently
+    box_size = (round(IMAGE_WIDTH * dpi / _EMU_PER_INCH), round(IMAGE_HEIGHT * dpi / _EMU_PER_INCH))
+    size = (min(img.width, box_size[0]), min(img.height, box_size[1]))
+    resized = size != img.size
+    lossless = image_format == "png" or _has_transparency(img)
+    target_format = "PNG" if lossless else "JPEG"
+    if not resized and img.format == target_format:
+        return image_bytes
+
+    if not lossless and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    if resized:
+        img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    buffer = io.BytesIO()
+    if lossless:
+        img.save(buffer, format="PNG", dpi=(dpi, dpi))
+    else:
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, dpi=(dpi, dpi))
+    normalized = buffer.getvalue()
+    return normalized if len(normalized) < len(image_bytes) else image_bytes
+
+
+class NormalizedImages:
+    """
+    Read-only view of an image store that returns each image normalized for its placement on
+    a slide (see `normalize_image`), which is what the renderers embed. The normalized variant
+    is stored alongside the original, keyed by the original's hash, so an image is normalized
+    once however many slides, decks and renders use it; the original stays in the store for
+    the frontend. Safe to use from the render threads.
+    """
+
+    def __init__(self, store=image_store, enabled: bool = IMAGE_NORMALIZE):
+        self.store = store
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Key: hash of the original, Value: hash of its normalized variant (the same if unchanged)
+        self._variants: Dict[str, str] = {}
+        self._normalized = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the normalized bytes of an image, or None if no image has that hash."""
+        if not self.enabled:
+            return self.store.get(key)
+        with self._lock:
+            variant = self._variants.get(key)
+        if variant is not None:
+            image_bytes = self.store.get(variant)
+            if image_bytes is not None:
+                return image_bytes
+
+        source = self.store.get(key)
+        if source is None:
+            with self._lock:
+                self._variants.pop(key, None) # The original was dropped from the store
+            return None
+        with span("image_normalize"):
+            image_bytes = normalize_image(source)
+        variant = self.store.put(image_bytes)
+        with self._lock:
+            if key not in self._variants:
+                self._normalized += 1
+                self._bytes_in += len(source)
+                self._bytes_out += len(image_bytes)
+            self._variants[key] = variant
+        return image_bytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.store
+
+    def with_variants(self, keys: Iterable[str]) -> Set[str]:
+        """`keys` and the hashes of their normalized variants."""
+        keys = set(keys)
+        with self._lock:
+            return keys | {self._variants[key] for key in keys if key in self._variants}
+
+    def stored_bytes(self, key: str) -> int:
+        """Bytes the store holds for an image: the original and its normalized variant."""
+        with self._lock:
+            variant = self._variants.get(key)
+        size = self.store.size(key)
+        if variant is not None and variant != key:
+            size += self.store.size(variant)
+        return size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"normalized": self._normalized, "bytes_in": self._bytes_in, "bytes_out": self._bytes_out}
+
+
+# What the renderers read slide images from by default
+normalized_images = NormalizedImages()
+
+
+def store_image(image_bytes: bytes) -> str:
+    """
+    Stores a newly generated image and returns its hash, normalizing it right away so the next
+    render finds the variant ready. Blocking; call it on the render executor.
+    """
+    key = image_store.put(image_bytes)
+    normalized_images.get(key)
+    return key
@@ -0,0 +1,167 @@
+# image_store.py
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+# IMAGE_STORE_MEMORY_BYTES: how many bytes of images to keep in memory. Beyond it the least
+#                           recently used are spilled to IMAGE_STORE_SPILL_DIR.
+# IMAGE_STORE_SPILL_DIR: directory for spilled images. Without it, a temporary directory removed
+#                        on exit.
+# IMAGE_STORE_MAX_BYTES: how many bytes of images to keep in all, in memory and spilled; beyond it
+#                        the least recently used spilled images no presentation uses are dropped.
+IMAGE_STORE_MEMORY_BYTES = int(os.getenv("IMAGE_STORE_MEMORY_BYTES", str(256 * 1024 * 1024)))
+IMAGE_STORE_SPILL_DIR = os.getenv("IMAGE_STORE_SPILL_DIR")
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """The content address of an image: hex SHA-256 of its raw bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ImageStore:
+    """
+    Content-addressed store for slide images, keyed by the SHA-256 of their raw bytes.
+    Slides reference images by hash, so an image used on several slides (or in several
+    presentations) is held once. Least recently used images are spilled to `spill_dir` (a
+    temporary directory without one) once the in-memory total goes over `memory_limit_bytes`,
+    and spilled images are dropped once the total goes over `max_bytes`, except those `in_use`
+    returns: an image a presentation still references is never dropped, even if that keeps the
+    store over `max_bytes`. Safe to use from the render threads.
+    """
+
+    def __init__(
+        self,
+        memory_limit_bytes: int = IMAGE_STORE_MEMORY_BYTES,
+        spill_dir: Optional[str] = IMAGE_STORE_SPILL_DIR,
+        max_bytes: int = IMAGE_STORE_MAX_BYTES
+    ):
+        self.memory_limit_bytes = memory_limit_bytes
+        self.spill_dir = spill_dir
+        self.max_bytes = max_bytes
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        # Created on the first spill without a spill_dir, and removed with the store
+        self._spill_tmp: Optional[tempfile.TemporaryDirectory] = None
+        # Returns the hashes of images that must not be dropped; set by whoever knows which are
+        # referenced (main.py: the presentations' images). Called from any thread, without the lock.
+        self.in_use: Optional[Callable[[], Iterable[str]]] = None
+        self._lock = threading.Lock()
+        # Key: hash, Value: bytes; ordered from least to most recently used
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # Key: hash, Value: size in bytes of the spilled file; ordered from least to most recently used
+        self._spilled: "OrderedDict[str, int]" = OrderedDict()
+        self._spilled_bytes = 0
+        self._dropped = 0
+
+    def put(self, image_bytes: bytes) -> str:
+        """Stores an image (a no-op if it is already stored) and returns its hash."""
+        key = image_hash(image_bytes)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return key
+            if key in self._spilled:
+                self._spilled.move_to_end(key)
+                return key
+            self._memory[key] = bytes(image_bytes)
+            self._memory_bytes += len(image_bytes)
+            over_limits = self._over_limits()
+        if over_limits:
+            self._enforce_limits(keep=key)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the raw bytes of an image, or None if no image has that hash."""
+        with self._lock:
+            image_bytes = self._memory.get(key)
+            if image_bytes is not None:
+                self._memory.move_to_end(key)
+                return image_bytes
+            if key not in self._spilled:
+                return None
+            self._spilled.move_to_end(key)
+        try:
+            with open(self._spill_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Dropped since the lookup
+            return None
+
+    def size(self, key: str) -> int:
+        """Size in bytes of a stored image (0 if no image has that hash), without reading it."""
+        with self._lock:
+            image_bytes = self._memory.get(key)
+            if image_bytes is not None:
+                return len(image_bytes)
+            return self._spilled.get(key, 0)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._memory or key in self._spilled
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory) + len(self._spilled)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "images": len(self._memory) + len(self._spilled),
+                "memory_bytes": self._memory_bytes,
+                "spilled_images": len(self._spilled),
+                "spilled_bytes": self._spilled_bytes,
+                "dropped_images": self._dropped,
+            }
+
+    def _spill_path(self, key: str) -> str:
+        if self.spill_dir is None:
+            self._spill_tmp = tempfile.TemporaryDirectory(prefix="image-store-")
+            self.spill_dir = self._spill_tmp.name
+        return os.path.join(self.spill_dir, key)
+
+    def _over_limits(self) -> bool:
+        # Called with the lock held
+        return self._memory_bytes > self.memory_limit_bytes or self._memory_bytes + self._spilled_bytes > self.max_bytes
+
+    def _enforce_limits(self, keep: str):
+        """
+        Spills the least recently used images in memory until within the memory limit, then
+        drops the least recently used spilled ones until within the total. `keep` (the image
+        just added, even if it alone exceeds the limits) stays in memory; images in use are
+        never dropped.
+        """
+        in_use = set(self.in_use()) if self.in_use is not None else set()
+        in_use.add(keep)
+        with self._lock:
+            for key in list(self._memory):
+                if self._memory_bytes <= self.memory_limit_bytes:
+                    break
+                if key == keep:
+                    continue
+                image_bytes = self._memory.pop(key)
+                self._memory_bytes -= len(image_bytes)
+                with open(self._spill_path(key), "wb") as f:
+                    f.write(image_bytes)
+                self._spilled[key] = len(image_bytes)
+                self._spilled_bytes += len(image_bytes)
+            for key in list(self._spilled):
+                if self._memory_bytes + self._spilled_bytes <= self.max_bytes:
+                    break
+                if key in in_use:
+                    continue
+                self._spilled_bytes -= self._spilled.pop(key)
+                self._dropped += 1
+                try:
+                    os.remove(self._spill_path(key))
+                except FileNotFoundError:
+                    pass
+
+
+# Shared by every presentation so identical images across decks are stored once
+image_store = ImageStore()
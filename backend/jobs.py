@@ -0,0 +1,369 @@
+# jobs.py
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+from render_executor import RENDER_WORKERS
+
+# JOB_QUEUE_DB: path of the SQLite file of the job queue, so queued jobs and finished jobs' results
+#               survive a restart (jobs that were running are started again); jobs.sqlite3 next to
+#               this file by default. ":memory:" keeps the queue in memory, lost on restart.
+# JOB_WORKERS: jobs run at once. By default (0) enough to keep both stages below busy: their limits
+#              plus JOB_INTERACTIVE_WORKERS.
+# JOB_INTERACTIVE_WORKERS: of those, workers that only take "interactive" jobs, so one submitted
+#                          behind a bulk backlog starts right away instead of after a bulk job.
+# JOB_LLM_CONCURRENCY: bulk jobs generating content (LLM calls) at once.
+# JOB_RENDER_CONCURRENCY: bulk jobs rendering their PPTX at once. Below RENDER_WORKERS, so render
+#                         workers are left for downloads and interactive requests.
+#                         Interactive jobs count towards neither limit.
+# JOB_MAX_ATTEMPTS: times a job is started before it is failed. A job is only started again if the
+#                   server stopped while it was running, so this stops a job that crashes it.
+# JOB_RETENTION_SECONDS: finished jobs (and their results) are deleted this long after finishing.
+# JOB_THROUGHPUT_WINDOW_SECONDS: recent completions the reported throughput and latencies cover.
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3"))
+JOB_INTERACTIVE_WORKERS = int(os.getenv("JOB_INTERACTIVE_WORKERS", "2"))
+JOB_LLM_CONCURRENCY = int(os.getenv("JOB_LLM_CONCURRENCY", "4"))
+JOB_RENDER_CONCURRENCY = int(os.getenv("JOB_RENDER_CONCURRENCY", str(max(1, RENDER_WORKERS - 1))))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_THROUGHPUT_WINDOW_SECONDS = float(os.getenv("JOB_THROUGHPUT_WINDOW_SECONDS", "300"))
+
+# Lanes in priority order: workers take the oldest job of the first lane that has one
+JOB_LANES = ("interactive", "bulk")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+# Handler of a job: (job_id, request, lane) -> result, both JSON-serializable dicts
+JobHandler = Callable[[str, Dict, str], Awaitable[Dict]]
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class JobQueue:
+    """
+    Background jobs: submitted in batches, run by a pool of asyncio workers in lane priority
+    order, and kept (with their result or error) in a SQLite table, so a client can submit many
+    jobs, then poll or stream their status and fetch their results.
+    Jobs go through two stages, content generation ("llm") and rendering ("render"), each with
+    its own concurrency limit for bulk jobs (see `stage`), so a bulk backlog can't take every LLM
+    call or render worker from interactive requests.
+    Only for use on the event loop.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        db_path: str = JOB_QUEUE_DB,
+        workers: int = JOB_WORKERS,
+        interactive_workers: int = JOB_INTERACTIVE_WORKERS,
+        stage_limits: Optional[Dict[str, int]] = None,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ):
+        self.handler = handler
+        self.stage_limits = stage_limits or {"llm": JOB_LLM_CONCURRENCY, "render": JOB_RENDER_CONCURRENCY}
+        self.workers = workers or sum(self.stage_limits.values()) + interactive_workers
+        self.interactive_workers = min(interactive_workers, self.workers)
+        self.max_attempts = max_attempts
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        if db_path != ":memory:":
+            # Each status change is a commit; WAL makes those cheap without risking the file
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, batch_id TEXT NOT NULL, lane INTEGER NOT NULL, status TEXT NOT NULL, "
+            "request TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "submitted_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        # Workers pick the oldest (lowest rowid) queued job of a lane
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, lane)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_batch ON jobs (batch_id)")
+        self._db.commit()
+
+        self._worker_tasks: List[asyncio.Task] = []
+        # Key: job id, Value: task running it
+        self._running: Dict[str, asyncio.Task] = {}
+        # Set (and replaced) on every status change: wakes idle workers and status streams
+        self._changed = asyncio.Event()
+        # Key: stage, Value: semaphore bounding the bulk jobs in it
+        self._stage_slots = {stage: asyncio.Semaphore(limit) for stage, limit in self.stage_limits.items()}
+        self._stage_active = {stage: 0 for stage in self.stage_limits}
+        self._stage_waiting = {stage: 0 for stage in self.stage_limits}
+        # (finished_at, lane, queue wait seconds, run seconds, status) of recently finished jobs
+        self._recent: deque = deque()
+        self.started_at = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        """
+        Starts the workers, if not yet running. Jobs left "running" by a previous process are
+        queued again, or failed once started `max_attempts` times.
+        """
+        if self._worker_tasks:
+            return
+        now = time.time()
+        self._db.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, "
+            "error = 'The server stopped while this job was running, ' || attempts || ' times.' "
+            "WHERE status = 'running' AND attempts >= ?",
+            (now, self.max_attempts)
+        )
+        requeued = self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'").rowcount
+        self._db.execute("DELETE FROM jobs WHERE finished_at < ?", (now - JOB_RETENTION_SECONDS,))
+        self._db.commit()
+        queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued:
+            print(f"Job queue resuming {queued} queued jobs ({requeued} interrupted by the last shutdown).")
+        self.started_at = time.monotonic()
+        for i in range(self.workers):
+            lanes = (0,) if i < self.interactive_workers else tuple(range(len(JOB_LANES)))
+            self._worker_tasks.append(asyncio.ensure_future(self._worker(lanes)))
+
+    async def stop(self):
+        """
+        Stops the workers. Running jobs are left "running", to be started again by the next `start`.
+        """
+        tasks, self._worker_tasks = self._worker_tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- submitting and cancelling ---
+
+    def submit(self, requests: List[Dict], lane: str = "bulk") -> Dict:
+        """
+        Queues one job per request, in order, as one batch. Returns the batch id and the job ids.
+        """
+        if lane not in JOB_LANES:
+            raise ValueError(f"Unknown lane '{lane}'. Lanes: {', '.join(JOB_LANES)}.")
+        batch_id = str(uuid.uuid4())
+        job_ids = [str(uuid.uuid4()) for _ in requests]
+        now = time.time()
+        self._db.executemany(
+            "INSERT INTO jobs (id, batch_id, lane, status, request, submitted_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            [(job_id, batch_id, JOB_LANES.index(lane), json.dumps(request), now) for job_id, request in zip(job_ids, requests)]
+        )
+        self._db.commit()
+        self.start()
+        self._notify()
+        return {"batch_id": batch_id, "job_ids": job_ids}
+
+    def cancel(self, job_ids: Iterable[str]) -> int:
+        """
+        Cancels jobs that haven't finished: queued ones don't start, running ones are interrupted.
+        Returns how many were cancelled.
+        """
+        cancelled = 0
+        now = time.time()
+        for job_id in job_ids:
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+                cancelled += 1
+            else:
+                cancelled += self._db.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (now, job_id)
+                ).rowcount
+        self._db.commit()
+        self._notify()
+        return cancelled
+
+    # --- status ---
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """A job's status, timings, request and, once finished, its result or error."""
+        row = self._db.execute(
+            "SELECT id, batch_id, lane, status, request, result, error, attempts, submitted_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0], "batch_id": row[1], "lane": JOB_LANES[row[2]], "status": row[3],
+            "request": json.loads(row[4]), "result": json.loads(row[5]) if row[5] else None, "error": row[6],
+            "attempts": row[7], "submitted_at": row[8], "started_at": row[9], "finished_at": row[10],
+        }
+
+    def statuses(self, batch_id: Optional[str] = None, job_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Status of each job of a batch (in submission order), or of the given jobs."""
+        if batch_id is not None:
+            rows = self._db.execute("SELECT id, status, error FROM jobs WHERE batch_id = ? ORDER BY rowid", (batch_id,)).fetchall()
+        else:
+            rows = []
+            for job_id in job_ids or []:
+                row = self._db.execute("SELECT id, status, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None:
+                    rows.append(row)
+        return [{"job_id": job_id, "status": status, "error": error} for job_id, status, error in rows]
+
+    def batch(self, batch_id: str) -> Optional[Dict]:
+        """
+        Progress of a batch: jobs per status, elapsed time since its first job started, the rate
+        its jobs have been finishing at and, from it, the estimated time left.
+        """
+        rows = self._db.execute(
+            "SELECT status, COUNT(*), MIN(submitted_at), MIN(started_at), MAX(finished_at) FROM jobs WHERE batch_id = ? GROUP BY status",
+            (batch_id,)
+        ).fetchall()
+        if not rows:
+            return None
+        counts = {status: 0 for status in ("queued", "running") + FINISHED_STATUSES}
+        counts.update({row[0]: row[1] for row in rows})
+        started = [row[3] for row in rows if row[3] is not None]
+        finished = sum(counts[status] for status in FINISHED_STATUSES)
+        remaining = counts["queued"] + counts["running"]
+        end = time.time() if remaining else max(row[4] for row in rows if row[4] is not None)
+        elapsed = end - min(started) if started else 0.0
+        per_minute = finished / elapsed * 60 if elapsed > 0 else None
+        return {
+            "batch_id": batch_id,
+            "jobs": sum(counts.values()),
+            **counts,
+            "submitted_at": min(row[2] for row in rows),
+            "elapsed_seconds": round(elapsed, 3),
+            "jobs_per_minute": round(per_minute, 2) if per_minute else None,
+            # Unknown until a job of the batch has finished
+            "eta_seconds": round(remaining / per_minute * 60, 1) if per_minute else (None if remaining else 0.0),
+        }
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """An event set on the next status change of any job (each change sets a new one)."""
+        return self._changed
+
+    def stats(self) -> Dict:
+        """
+        Jobs per lane and status, stage occupancy, and over the last JOB_THROUGHPUT_WINDOW_SECONDS
+        the rate jobs finished at and their queue wait and run time (waits for a stage included) per lane.
+        """
+        now = time.time()
+        while self._recent and self._recent[0][0] < now - JOB_THROUGHPUT_WINDOW_SECONDS:
+            self._recent.popleft()
+        # The window can't reach back past the start of this process
+        window = min(JOB_THROUGHPUT_WINDOW_SECONDS, time.monotonic() - self.started_at) if self.started_at else 0.0
+
+        counts = {status: {lane: 0 for lane in JOB_LANES} for status in ("queued", "running") + FINISHED_STATUSES}
+        for status, lane, count in self._db.execute("SELECT status, lane, COUNT(*) FROM jobs GROUP BY status, lane"):
+            counts[status][JOB_LANES[lane]] = count
+
+        stats = {f"{status}_jobs": per_lane for status, per_lane in counts.items()}
+        finished = [entry for entry in self._recent if entry[4] == "done"]
+        stats["jobs_per_minute"] = round(len(finished) / window * 60, 2) if window > 0 else 0.0
+        stats["failed_per_minute"] = round(sum(entry[4] == "failed" for entry in self._recent) / window * 60, 2) if window > 0 else 0.0
+        backlog = sum(counts["queued"].values()) + sum(counts["running"].values())
+        stats["backlog_eta_seconds"] = round(backlog / stats["jobs_per_minute"] * 60, 1) if stats["jobs_per_minute"] else 0.0
+        for name, column in (("queue_wait", 2), ("run", 3)):
+            for quantile, fraction in (("p50", 0.50), ("p90", 0.90)):
+                per_lane = {}
+                for lane in JOB_LANES:
+                    value = _percentile(sorted(entry[column] for entry in finished if entry[1] == lane), fraction)
+                    if value is not None:
+                        per_lane[lane] = round(value, 3)
+                stats[f"{name}_{quantile}_seconds"] = per_lane
+        stats["stage_active"] = dict(self._stage_active)
+        stats["stage_waiting"] = dict(self._stage_waiting)
+        stats["workers"] = len(self._worker_tasks)
+        return stats
+
+    # --- running jobs ---
+
+    @asynccontextmanager
+    async def stage(self, name: str, lane: str) -> AsyncIterator[None]:
+        """
+        Holds one of the stage's slots for a bulk job; interactive jobs go straight through,
+        so they never wait behind the bulk backlog. Used by the job handler around each stage.
+        """
+        if lane != "bulk":
+            self._stage_active[name] += 1
+            try:
+                yield
+            finally:
+                self._stage_active[name] -= 1
+            return
+        self._stage_waiting[name] += 1
+        try:
+            await self._stage_slots[name].acquire()
+        finally:
+            self._stage_waiting[name] -= 1
+        self._stage_active[name] += 1
+        try:
+            yield
+        finally:
+            self._stage_active[name] -= 1
+            self._stage_slots[name].release()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _claim(self, lanes) -> Optional[tuple]:
+        """Marks the oldest queued job of the first lane (of `lanes`) that has one as running."""
+        for lane in lanes:
+            row = self._db.execute(
+                "SELECT id, request, submitted_at FROM jobs WHERE status = 'queued' AND lane = ? ORDER BY rowid LIMIT 1", (lane,)
+            ).fetchone()
+            if row is None:
+                continue
+            now = time.time()
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?", (now, row[0])
+            )
+            self._db.commit()
+            return row[0], json.loads(row[1]), JOB_LANES[lane], now - row[2]
+        return None
+
+    async def _worker(self, lanes):
+        while True:
+            # Taken before looking for a job, so a job submitted in between isn't missed
+            changed = self._changed
+            job = self._claim(lanes)
+            if job is None:
+                await changed.wait()
+                continue
+            self._notify()
+            await self._run(*job)
+
+    async def _run(self, job_id: str, request: Dict, lane: str, queue_wait: float):
+        started = time.monotonic()
+        task = asyncio.ensure_future(self.handler(job_id, request, lane))
+        self._running[job_id] = task
+        try:
+            # Waited on rather than awaited, so the job being cancelled (see `cancel`) can't be
+            # mistaken for the worker being stopped
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            # The worker is stopping: the job stays "running", to be started again
+            task.cancel()
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+        result, error = None, None
+        if task.cancelled():
+            status, error = "cancelled", "Cancelled while running."
+        elif task.exception() is not None:
+            print(f"Job {job_id} failed: {task.exception()}")
+            status, error = "failed", str(task.exception())
+        else:
+            status, result = "done", task.result()
+
+        now = time.time()
+        self._db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, now, job_id)
+        )
+        self._db.commit()
+        self._recent.append((now, lane, queue_wait, time.monotonic() - started, status))
+        self._notify()
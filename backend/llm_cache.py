@@ -0,0 +1,217 @@
+# llm_cache.py
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# LLM_CACHE_MEMORY_BYTES: bytes of cached responses (as JSON) to keep in memory.
+# LLM_CACHE_TTL_SECONDS: how long a cached response may be reused. 0 disables the cache.
+# LLM_CACHE_DB: path of a SQLite file for a persistent tier that survives restarts.
+#               Without it, responses are only cached in memory.
+# LLM_CACHE_BYPASS: comma-separated endpoints that never use the cache ("deck", "edit", "sketch").
+LLM_CACHE_MEMORY_BYTES = int(os.getenv("LLM_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")
+LLM_CACHE_BYPASS = {name.strip() for name in os.getenv("LLM_CACHE_BYPASS", "").split(",") if name.strip()}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapses whitespace so prompts that differ only in indentation or line breaks
+    (e.g. the same template filled in from different call sites) share a cache entry.
+    """
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+@lru_cache(maxsize=None)
+def _schema_fingerprint(output_schema) -> str:
+    if output_schema is None:
+        return ""
+    schema = json.dumps(output_schema.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+
+def cache_key(agent, prompt: str) -> str:
+    """
+    Key of an agent response: the agent's name, model and output schema plus the normalized
+    prompt, so changing any of them (e.g. adding a field to SlideContent) misses the cache.
+    """
+    model = getattr(agent.model, "model", agent.model)
+    parts = [agent.name, str(model), _schema_fingerprint(agent.output_schema), normalize_prompt(prompt)]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache of structured agent responses, keyed by `cache_key`.
+    Entries expire after `ttl_seconds`; the least recently used are dropped once the in-memory
+    total goes over `memory_budget_bytes`. With `db_path`, entries are also written to a SQLite
+    file and read back from it on a memory miss (e.g. after a restart).
+    Concurrent identical requests share one LLM call (single-flight).
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = LLM_CACHE_MEMORY_BYTES,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        db_path: Optional[str] = LLM_CACHE_DB
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # Key: cache key, Value: (stored_at, latency_seconds, json); least to most recently used.
+        # stored_at is wall-clock time so entries read back from SQLite expire correctly.
+        self._memory: "OrderedDict[str, Tuple[float, float, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Key: cache key, Value: the task of the LLM call in flight for it
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, latency REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.persistent_hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """Returns the cached response for `key`, or None if there is no fresh one."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        entry = self._memory.get(key)
+        persistent = False
+        if entry is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT stored_at, latency, data FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and now - row[0] <= self.ttl_seconds:
+                entry = tuple(row)
+                persistent = True
+                self._remember(key, entry)
+        if entry is None or now - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+
+        self._memory.move_to_end(key)
+        self.hits += 1
+        if persistent:
+            self.persistent_hits += 1
+        self.saved_seconds += entry[1]
+        return json.loads(entry[2])
+
+    def store(self, key: str, value: Any, latency: float):
+        """Caches a response that took `latency` seconds to produce. None is never cached."""
+        if not self.enabled or value is None:
+            return
+        entry = (time.time(), latency, json.dumps(value))
+        self._remember(key, entry)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, stored_at, latency, data) VALUES (?, ?, ?, ?)",
+                    (key, *entry)
+                )
+                self._db.execute("DELETE FROM responses WHERE stored_at < ?", (entry[0] - self.ttl_seconds,))
+                self._db.commit()
+
+    async def get_or_call(self, agent, prompt: str, call: Callable[[], Awaitable[Any]], bypass: bool = False) -> Any:
+        """
+        Returns the cached response of `agent` to `prompt`, or awaits `call()` to produce it
+        (sharing the call with any identical request already in flight) and caches the result.
+        With `bypass`, always calls the LLM but still caches the fresh response.
+        """
+        key = cache_key(agent, prompt)
+        if bypass or not self.enabled:
+            self.bypassed += 1
+            return await self._call_and_store(key, call)
+
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+            # Shielded: one waiter being cancelled (client disconnect) mustn't cancel the others.
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._call_and_store(key, call))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _call_and_store(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        value = await call()
+        self.store(key, value, time.perf_counter() - start)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters, hit ratio and the LLM time saved by cache hits.
+        "misses" counts every lookup not answered from the cache; "shared_in_flight" is the part
+        of them that joined an identical call already in flight instead of making a new one.
+        """
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "shared_in_flight": self.shared,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round((self.hits + self.shared) / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+        if self._db is not None:
+            with self._db_lock:
+                stats["persistent_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
+
+    def _remember(self, key: str, entry: Tuple[float, float, str]):
+        self._forget(key, persistent=False)
+        self._memory[key] = entry
+        self._memory_bytes += len(entry[2])
+        # Keep the entry just added, even if it alone exceeds the budget.
+        while self._memory_bytes > self.memory_budget_bytes and len(self._memory) > 1:
+            _, (_, _, data) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+
+    def _forget(self, key: str, persistent: bool = True):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[2])
+        if persistent and self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+
+
+# Shared by every endpoint that calls an agent
+llm_cache = LLMCache()
@@ -1,30 +1,114 @@
 # main.py (FastAPI Application)
-from fastapi import FastAPI, HTTPException, Response, Body
+import time
+# Startup timings (see `lifespan`) are measured from here, before the heavy imports below
+BOOT_STARTED = time.perf_counter()
+from fastapi import FastAPI, HTTPException, Response, Body, Header, File, Form, UploadFile, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-import uvicorn
+from typing import Iterable, Iterator, List, Dict, Optional, Union
 import io
+import os
+import gc
+import json
 import uuid # For generating unique presentation IDs
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware  
 # Import your agentic modules
-from ppt_generator import generate_presentation_pptx
-from agent_logic import get_slide_content_from_description, get_edited_content_from_agent, PresentationContent, SlideContent,get_mermaid_output_from_description
+from ppt_generator import RenderedPresentation
+from render_executor import RenderExecutor, RenderExecutorSaturated, RENDER_LARGE_DECK_SLIDES, RENDER_LARGE_DECK_DIR
+from image_generation import generate_image_bytes, generate_slide_images, IMAGE_CONCURRENCY
+from image_store import image_store
+from image_processing import normalized_images, store_image
+from themes import theme_registry, ThemeExists
+from jobs import JobQueue, JOB_LANES, FINISHED_STATUSES
+from thumbnails import thumbnail_cache, thumbnail_key, THUMBNAIL_WIDTH, THUMBNAIL_FORMAT, THUMBNAIL_FORMATS, MIN_THUMBNAIL_WIDTH, MAX_THUMBNAIL_WIDTH
+from pptx.dml.color import RGBColor
+from presentation_store import PresentationStore, SlideConflict, new_presentation_entry, discard_pptx_file, lock_slides
+from llm_cache import llm_cache
+from agent.agent import session_stats, create_runners
+from agent.resilience import AgentCallTimeout, resilience_stats
+from agent.routing import model_router
+from edit_rules import fast_path_stats
+from prompt_builder import prompt_stats
+from metrics import span, register_collector, render_metrics, TimingMiddleware, TimedJSONResponse
+from agent_logic import get_slide_content_from_description, get_slide_content_parallel, get_edited_content_from_agent, get_batch_edited_content_from_agent, EDIT_CONCURRENCY, PresentationContent, SlideContent,get_mermaid_output_from_description, stream_slide_content_from_description
 import base64
 
 from google import genai
-from google.genai import types
-import base64
 
-client = genai.Client()
+# STARTUP_WARMUP: "1" (default) does the work first requests would otherwise pay for (see `warm_up`)
+#                 before the app starts serving; "0" starts serving as soon as possible, e.g. for
+#                 workers started to absorb a burst, and leaves it to the first requests.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+
+# The GenAI client (for image generation), created on first use: building it loads the HTTP stack
+# and takes a few hundred milliseconds of every worker's boot. Use `get_genai_client()`.
+client = None
+
+# PPTX rendering is CPU-bound; it runs on this executor so a large deck doesn't stall
+# every other request on the event loop. Configured through RENDER_* environment variables.
+# Its worker processes are started by the first renders (or the warm-up).
+render_executor = RenderExecutor()
+
+# Seconds spent importing this module, warming up, and from the start of the import until
+# the app was ready to serve (see `lifespan`)
+startup_timings: Dict[str, float] = {"import_seconds": 0.0, "warmup_seconds": 0.0, "ready_seconds": 0.0}
+
+
+def get_genai_client():
+    """The GenAI client, created on first use."""
+    global client
+    if client is None:
+        client = genai.Client()
+    return client
+
+
+async def warm_up():
+    """
+    Does now what the first requests would otherwise wait for: compiling the registered themes,
+    starting the render worker processes (after the themes, so forked workers inherit them),
+    creating the agents' runners and the GenAI client. Makes no LLM or image requests.
+    """
+    await render_executor.run(theme_registry.compile_all)
+    await render_executor.warm_up()
+    create_runners()
+    get_genai_client()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_WARMUP:
+        started = time.perf_counter()
+        await warm_up()
+        startup_timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    # The modules, agents and themes loaded so far live as long as the process; moved out of the
+    # collector's reach, a full collection no longer scans them and stalls the event loop for
+    # a few hundred milliseconds under load (see benchmarks/bench_render_load.py).
+    gc.collect()
+    gc.freeze()
+    startup_timings["ready_seconds"] = round(time.perf_counter() - BOOT_STARTED, 3)
+    print(f"Ready {startup_timings['ready_seconds']:.2f}s after startup began "
+          f"({startup_timings['import_seconds']:.2f}s importing, {startup_timings['warmup_seconds']:.2f}s warming up).")
+    # Resumes the background jobs left queued (or running) by the last shutdown
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    render_executor.shutdown()
+
 
 app = FastAPI(
     title="Agentic PPT Creator Backend",
     description="Backend for an agentic website to create and edit presentations from descriptions.",
     version="0.1.0",
+    # Times JSON serialization of responses as the "serialize" stage
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan,
 )
 
+# Per-route request latency for /metrics, and the Server-Timing header when SERVER_TIMING=1
+app.add_middleware(TimingMiddleware)
+
 #enamable CORS for frontend development
 
 app.add_middleware(
@@ -41,6 +125,12 @@ class CreatePptRequest(BaseModel):
     num_slides: Optional[int] = 5 # Default to 5 slides
     audience: Optional[str] = "general" # Default audience
     tone: Optional[str] = "informative" # Default tone
+    # "single": the whole deck in one LLM call. "parallel": an outline first, then every slide
+    # generated concurrently (faster for long decks; a failing slide is retried on its own).
+    generation_mode: Optional[str] = "single"
+    fan_out: Optional[int] = None # Max slides generated at once in "parallel" mode; defaults to SLIDE_FAN_OUT
+    use_cache: Optional[bool] = True # False always asks the LLM (the fresh result still replaces the cached one)
+    theme: Optional[str] = None # A registered theme (see GET /themes) to use instead of the agent's suggestion
 
 class EditPptRequest(BaseModel):
     presentation_id: str # A unique ID for the ongoing presentation session
@@ -48,69 +138,360 @@ class EditPptRequest(BaseModel):
     element_id: str # A unique ID for the element being edited (e.g., "title", "bullet_point_0")
     edit_instruction: str # User's natural language instruction (e.g., "change this to 'Introduction to AI'")
     current_content: str # The current content of the element (important for LLM context)
+    use_cache: Optional[bool] = True # False always asks the LLM (the fresh result still replaces the cached one)
+    # The slide's "version" as the client last received it. If the slide has changed since, the
+    # edit is rejected with a 409 instead of being applied; without it, edits of a slide queue up.
+    base_version: Optional[int] = None
+
+class SlideEdit(BaseModel):
+    slide_index: int
+    element_id: str # e.g., "title", "bullet_point_0"
+    edit_instruction: str
+    current_content: str
+    base_version: Optional[int] = None # As in EditPptRequest; a stale slide's edits get the status "conflict"
+
+class BatchEditPptRequest(BaseModel):
+    presentation_id: str
+    edits: List[SlideEdit] # Edits of the same slide are sent to the agent together, in this order
+    atomic: Optional[bool] = False # True: apply nothing unless every slide's edits succeed
+    concurrency: Optional[int] = None # Max slides edited at once; defaults to EDIT_CONCURRENCY
+    use_cache: Optional[bool] = True
+
+class BatchEditPptResponse(BaseModel):
+    presentation_id: str
+    slides: List[Dict] # Only the slides that changed
+    version: int # Presentation version after this request
+    results: List[Dict] # One per edit, in request order: {"edit_index", "slide_index", "element_id", "status", "detail"}
+    message: str
+
+class GenerateDeckImagesRequest(BaseModel):
+    presentation_id: str
+    slide_indices: Optional[List[int]] = None # Defaults to every slide with an image_description
+    overwrite: Optional[bool] = False # Regenerate images for slides that already have one
+    concurrency: Optional[int] = None # Max image requests in flight; defaults to IMAGE_CONCURRENCY
 
 class PptResponse(BaseModel):
     presentation_id: str # Unique ID for the generated presentation
-    slides: List[Dict] # A list of dictionaries representing slides for frontend display
+    slides: List[Dict] # Slides for frontend display: all of them on creation, only the changed ones on edits
+    version: int = 1 # Presentation version after this request
     message: str
 
 
-# In-memory store for ongoing presentations.
+# Store for ongoing presentations, bounded by PRESENTATION_STORE_* settings: least recently
+# used presentations are compressed into a cold tier and rehydrated transparently on access.
 # In a production application, this should be replaced with a persistent database
 # (e.g., PostgreSQL, MongoDB, or Firestore) to store data reliably.
-# Key: presentation_id (str), Value: {"description": str, "content": PresentationContent, "raw_pptx_data": bytes}
-presentations_store: Dict[str, Dict] = {}
+# Key: presentation_id (str), Value: entry dict, see `new_presentation_entry`.
+presentations_store = PresentationStore()
+# The image store drops least recently used images beyond its IMAGE_STORE_* limits, but never
+# those of a presentation, hot or cold (originals, and the variants they are rendered with)
+image_store.in_use = lambda: normalized_images.with_variants(presentations_store.image_hashes())
 
 
-@app.post("/create_ppt", response_model=PptResponse, summary="Create a new presentation based on a description")
-async def create_ppt(request: CreatePptRequest):
+def frontend_slide(slide_index: int, slide: SlideContent, version: int = 1) -> Dict:
     """
-    Endpoint to create a new presentation.
-    The agent first generates structured content, then the content is used
-    to generate a PPTX file.
+    Simplified JSON representation of a slide for the frontend.
+    This allows the frontend to display the content without needing to parse the PPTX.
+    `version` is the presentation version the slide last changed in (1 for a new presentation).
+    """
+    return {
+        "slide_index": slide_index,
+        "version": version,
+        "title": slide.title,
+        "bullet_points": slide.bullet_points,
+        "image_description": slide.image_description,
+        # Add any other fields from SlideContent that the frontend needs to display
+    }
+
+
+def frontend_slides(presentation_data: Dict, slide_indices: Optional[Iterable[int]] = None) -> List[Dict]:
+    """Frontend representation of the given slides of a stored presentation (all by default), in slide order."""
+    content: PresentationContent = presentation_data["content"]
+    slide_versions = presentation_data["slide_versions"]
+    if slide_indices is None:
+        slide_indices = range(len(content.slides))
+    return [frontend_slide(i, content.slides[i], slide_versions[i]) for i in sorted(slide_indices)]
+
+
+def mark_slides_changed(presentation_data: Dict, slide_indices: List[int]):
+    """Records a content change; the PPTX is rebuilt on the next download rather than now."""
+    presentation_data["version"] += 1
+    presentation_data["dirty_slides"].update(slide_indices)
+    for slide_index in slide_indices:
+        presentation_data["slide_versions"][slide_index] = presentation_data["version"]
+
+
+def check_slide_index(content: PresentationContent, slide_index):
+    if not isinstance(slide_index, int) or slide_index < 0 or slide_index >= len(content.slides):
+        raise HTTPException(status_code=400, detail=f"Slide index {slide_index} is out of bounds for the current presentation.")
+
+
+def agent_timeout(error: AgentCallTimeout) -> HTTPException:
+    """504: the model kept timing out, which a retry later may not."""
+    return HTTPException(status_code=504, detail=str(error))
+
+
+def slide_conflict(error: SlideConflict, presentation_data: Dict) -> HTTPException:
+    """409 carrying the slide as it is now, so the client can rebase its change and retry."""
+    return HTTPException(status_code=409, detail={
+        "message": str(error),
+        "version": presentation_data["version"],
+        "slide": frontend_slides(presentation_data, [error.slide_index])[0],
+    })
+
+
+def check_theme(theme: Optional[str]):
+    if theme is not None and theme_registry.get(theme) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown theme '{theme}'. Available themes: {', '.join(theme_registry.names())}.")
+
+
+def render_executor_busy(error: RenderExecutorSaturated) -> HTTPException:
+    """503 telling the client to retry once the render workers have caught up."""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "1"})
+
+
+def check_thumbnail_options(width: int, image_format: str):
+    if not MIN_THUMBNAIL_WIDTH <= width <= MAX_THUMBNAIL_WIDTH:
+        raise HTTPException(status_code=400, detail=f"Thumbnail width must be between {MIN_THUMBNAIL_WIDTH} and {MAX_THUMBNAIL_WIDTH} pixels.")
+    if image_format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown thumbnail format '{image_format}'. Available formats: {', '.join(THUMBNAIL_FORMATS)}.")
+
+
+async def slide_thumbnails(presentation_data: Dict, slide_indices: Iterable[int], width: int, image_format: str) -> Dict[int, tuple]:
+    """
+    Thumbnails of the given slides of a stored presentation, as {slide_index: (key, image bytes)}.
+    A slide whose thumbnail is cached (same content, theme, size and format, in any presentation)
+    isn't drawn again, so after an edit only the edited slides are; the others are drawn together,
+    in parallel across the render workers.
+    """
+    content: PresentationContent = presentation_data["content"]
+    theme = theme_registry.resolve(content.overall_theme)
+    slides = list(content.slides) # Snapshot: an edit may swap the slide list while we render
+    thumbnails = {}
+    # Key: thumbnail key, Value: (slide to draw, indices of the slides it is the thumbnail of)
+    missing: Dict[str, tuple] = {}
+    for slide_index in slide_indices:
+        key = thumbnail_key(slides[slide_index], theme, width, image_format)
+        thumbnail = thumbnail_cache.get(key)
+        if thumbnail is not None:
+            thumbnails[slide_index] = (key, thumbnail)
+        elif key in missing:
+            missing[key][1].append(slide_index)
+        else:
+            missing[key] = (slides[slide_index], [slide_index])
+    if missing:
+        with span("thumbnails"):
+            rendered = await render_executor.render_thumbnails([slide for slide, _ in missing.values()], theme, width, image_format)
+        for (key, (_, indices)), thumbnail in zip(missing.items(), rendered):
+            thumbnail_cache.put(key, thumbnail)
+            for slide_index in indices:
+                thumbnails[slide_index] = (key, thumbnail)
+    return thumbnails
+
+
+def rerender_slides(presentation_data: Dict, content: PresentationContent, slide_indices: List[int]) -> bytes:
+    """
+    Re-renders the given slides of a stored presentation from `content` (a snapshot of the
+    stored content) and returns the new PPTX bytes.
+    Blocking; runs on a render thread because the rendered state lives in this process.
     """
+    with presentation_data["render_lock"]:
+        rendered: Optional[RenderedPresentation] = presentation_data["rendered"]
+        if rendered is None:
+            # The initial render happened in a worker process; build the reusable
+            # state here on the first rebuild (content already includes the changes).
+            rendered = RenderedPresentation(content)
+            presentation_data["rendered"] = rendered
+        else:
+            try:
+                for slide_index in slide_indices:
+                    rendered.update_slide(slide_index, content.slides[slide_index])
+            except Exception:
+                # Don't keep a half-updated rendering around; the next build starts from scratch.
+                presentation_data["rendered"] = None
+                raise
+        pptx_buffer = io.BytesIO()
+        rendered.save(pptx_buffer)
+        return pptx_buffer.getvalue()
+
+
+async def build_pptx(presentation_data: Dict, version: int) -> Union[bytes, str]:
+    """
+    Builds the PPTX for the presentation's current content, tagged as `version`.
+    The first build is a full render on the render executor; later builds re-render only
+    the slides changed since the previous one. Decks of RENDER_LARGE_DECK_SLIDES or more are
+    streamed to a file instead, and the file's path is returned in place of the bytes.
+    """
+    content: PresentationContent = presentation_data["content"]
+    # Slides are replaced, never mutated in place, so a shallow copy of the list is a consistent
+    # snapshot even if an edit lands while the render runs.
+    snapshot = content.model_copy(update={"slides": list(content.slides)})
+    dirty_slides = presentation_data["dirty_slides"]
+    presentation_data["dirty_slides"] = set()
+    if len(snapshot.slides) >= RENDER_LARGE_DECK_SLIDES:
+        return await build_pptx_file(presentation_data, snapshot, version, dirty_slides)
     try:
-        # Step 1: Agent generates structured content (titles, bullet points, image ideas) using LLMs
-        print(f"Generating content for description: '{request.description}'")
+        if presentation_data["built_version"] is None:
+            with span("render_full"):
+                raw_pptx_data = await render_executor.render(snapshot)
+        else:
+            with span("render_incremental"):
+                raw_pptx_data = await render_executor.run(rerender_slides, presentation_data, snapshot, sorted(dirty_slides))
+    except BaseException:
+        presentation_data["dirty_slides"] |= dirty_slides
+        raise
+    finally:
+        presentation_data["build"] = None
+
+    discard_pptx_file(presentation_data)
+    presentation_data["raw_pptx_data"] = raw_pptx_data
+    presentation_data["built_version"] = version
+    return raw_pptx_data
+
+
+async def build_pptx_file(presentation_data: Dict, snapshot: PresentationContent, version: int, dirty_slides) -> str:
+    """
+    Streams a large deck to a new file, slide by slide, so neither the rendered deck nor its
+    bytes are held in memory. Always a full render: keeping the incremental state of a deck
+    this size around would cost the memory this avoids.
+    """
+    path = os.path.join(RENDER_LARGE_DECK_DIR, f"{uuid.uuid4()}-v{version}.pptx")
+    try:
+        with span("render_stream"):
+            await render_executor.render_to_file(snapshot, path)
+    except BaseException:
+        presentation_data["dirty_slides"] |= dirty_slides
+        raise
+    finally:
+        presentation_data["build"] = None
+
+    # Downloads that already opened the previous file keep reading it after it is unlinked.
+    discard_pptx_file(presentation_data)
+    presentation_data["pptx_file"] = path
+    presentation_data["raw_pptx_data"] = None
+    presentation_data["rendered"] = None
+    presentation_data["built_version"] = version
+    return path
+
+
+async def get_pptx(presentation_data: Dict) -> Union[bytes, str]:
+    """
+    Returns the PPTX for the current version, building it if needed: its bytes, or the path of
+    its file for a large deck. Concurrent callers for the same version share a single in-flight build.
+    """
+    version = presentation_data["version"]
+    if presentation_data["built_version"] == version:
+        return presentation_data["pptx_file"] or presentation_data["raw_pptx_data"]
+
+    build = presentation_data["build"]
+    if build is None or build[0] != version:
+        if build is not None:
+            # An older version is still building; let it finish first so the incremental
+            # renders apply in order.
+            try:
+                await asyncio.shield(build[1])
+            except Exception:
+                pass
+            return await get_pptx(presentation_data)
+        build = (version, asyncio.ensure_future(build_pptx(presentation_data, version)))
+        presentation_data["build"] = build
+    # Shielded so one client disconnecting doesn't cancel the build the others are waiting on.
+    return await asyncio.shield(build[1])
+
+
+# Size of the chunks PPTX downloads are streamed in
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def iter_pptx_bytes(pptx_bytes: bytes) -> Iterator[memoryview]:
+    view = memoryview(pptx_bytes)
+    for offset in range(0, len(view), DOWNLOAD_CHUNK_SIZE):
+        yield view[offset:offset + DOWNLOAD_CHUNK_SIZE]
+
+
+def iter_pptx_file(f) -> Iterator[bytes]:
+    # Reads from the already open file, so a rebuild that replaces it mid-download is harmless.
+    with f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+def pptx_etag(presentation_id: str, version: int) -> str:
+    # Builds are deterministic, so the same content version always has the same bytes.
+    return f'"{presentation_id}-v{version}"'
+
+
+def encode_image_base64(image_bytes: bytes) -> str:
+    return base64.b64encode(image_bytes).decode("utf-8")
+
+
+def check_create_request(request: CreatePptRequest):
+    if request.generation_mode not in ("single", "parallel"):
+        raise HTTPException(status_code=400, detail="generation_mode must be 'single' or 'parallel'.")
+    check_theme(request.theme)
+
+
+async def generate_presentation(request: CreatePptRequest, presentation_id: str) -> Dict:
+    """
+    Generates a presentation's content with the agent and stores it under `presentation_id`,
+    which also keys the agent session later edits of the presentation continue.
+    Returns the stored entry. The PPTX file itself is built when it is first downloaded (see /download_ppt).
+    """
+    # Step 1: Agent generates structured content (titles, bullet points, image ideas) using LLMs
+    print(f"Generating content ({request.generation_mode}) for description: '{request.description}'")
+    if request.generation_mode == "parallel":
+        generated_content: PresentationContent = await get_slide_content_parallel(
+            description=request.description,
+            num_slides=request.num_slides,
+            audience=request.audience,
+            tone=request.tone,
+            use_cache=request.use_cache is not False,
+            session_key=presentation_id,
+            **({"fan_out": request.fan_out} if request.fan_out else {})
+        )
+    else:
         generated_content: PresentationContent = await get_slide_content_from_description(
             description=request.description,
             num_slides=request.num_slides,
             audience=request.audience,
-            tone=request.tone
+            tone=request.tone,
+            use_cache=request.use_cache is not False,
+            session_key=presentation_id
         )
-        print("Content generation complete.")
+    print("Content generation complete.")
+    if request.theme:
+        # Decks are rendered with the theme named by 'overall_theme'
+        generated_content.overall_theme = request.theme
 
-        # Step 2: Generate the initial PPTX file in memory from the structured content
-        pptx_buffer = io.BytesIO()
-        generate_presentation_pptx(generated_content, pptx_buffer)
-        pptx_buffer.seek(0) # Rewind the buffer to the beginning after writing
+    # Step 2: Store the structured content.
+    presentation_data = new_presentation_entry(request.description, generated_content)
+    presentations_store[presentation_id] = presentation_data
+    return presentation_data
 
-        # Generate a unique ID for this presentation session
+
+@app.post("/create_ppt", response_model=PptResponse, summary="Create a new presentation based on a description")
+async def create_ppt(request: CreatePptRequest):
+    """
+    Endpoint to create a new presentation.
+    The agent first generates structured content, then the content is used
+    to generate a PPTX file.
+    """
+    check_create_request(request)
+    try:
+        # Generate a unique ID for this presentation session.
         presentation_id = str(uuid.uuid4())
-        presentations_store[presentation_id] = {
-            "description": request.description,
-            "content": generated_content, # Store the structured content for future edits
-            "raw_pptx_data": pptx_buffer.getvalue() # Store the raw bytes for download
-        }
+        presentation_data = await generate_presentation(request, presentation_id)
 
         # For the frontend, we'll send a simplified JSON representation of the slides.
-        # This allows the frontend to display the content without needing to parse the PPTX.
-        frontend_slides = []
-        for i, slide in enumerate(generated_content.slides):
-            frontend_slides.append({
-                "slide_index": i,
-                "title": slide.title,
-                "bullet_points": slide.bullet_points,
-                "image_description": slide.image_description,
-                # Add any other fields from SlideContent that the frontend needs to display
-            })
-
         return PptResponse(
             presentation_id=presentation_id,
-            slides=frontend_slides,
+            slides=frontend_slides(presentation_data),
+            version=presentation_data["version"],
             message="Presentation created successfully!"
         )
 
+    except AgentCallTimeout as te:
+        raise agent_timeout(te)
     except ValueError as ve:
         # Catch specific errors from agent_logic (e.g., LLM parsing failure)
         raise HTTPException(status_code=400, detail=f"Content generation error: {str(ve)}")
@@ -119,63 +500,117 @@ async def create_ppt(request: CreatePptRequest):
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during presentation creation: {str(e)}")
 
 
+@app.post("/create_ppt_stream", summary="Create a new presentation, streaming slides as they are generated")
+async def create_ppt_stream(request: CreatePptRequest):
+    """
+    Streaming variant of /create_ppt. Sends newline-delimited JSON events as the agent writes the deck:
+      {"event": "deck", "name": "...", "overall_theme": "..."}                 (first)
+      {"event": "slide", "slide": {...}}                                       (one per slide, as soon as it is complete and valid)
+      {"event": "complete", "presentation_id": "...", "version": 1, "message": "..."}  (last, once the deck is stored)
+      {"event": "error", "detail": "..."}                                      (instead of "complete" if generation fails)
+    """
+    check_theme(request.theme)
+
+    async def deck_events():
+        started = time.perf_counter()
+        slide_index = 0
+        presentation_id = str(uuid.uuid4())
+        try:
+            print(f"Streaming content for description: '{request.description}'")
+            async for kind, value in stream_slide_content_from_description(
+                description=request.description,
+                num_slides=request.num_slides,
+                audience=request.audience,
+                tone=request.tone,
+                use_cache=request.use_cache is not False,
+                session_key=presentation_id
+            ):
+                if kind == "deck":
+                    if request.theme:
+                        value = {**value, "overall_theme": request.theme}
+                    yield json.dumps({"event": "deck", **value}) + "\n"
+                elif kind == "slide":
+                    if slide_index == 0:
+                        print(f"First slide streamed after {time.perf_counter() - started:.2f}s.")
+                    yield json.dumps({"event": "slide", "slide": frontend_slide(slide_index, value)}) + "\n"
+                    slide_index += 1
+                elif kind == "done":
+                    if request.theme:
+                        value.overall_theme = request.theme
+                    presentation_data = new_presentation_entry(request.description, value)
+                    presentations_store[presentation_id] = presentation_data
+                    print(f"Content generation complete after {time.perf_counter() - started:.2f}s.")
+                    yield json.dumps({
+                        "event": "complete", "presentation_id": presentation_id, "version": presentation_data["version"],
+                        "message": "Presentation created successfully!"
+                    }) + "\n"
+        except ValueError as ve:
+            yield json.dumps({"event": "error", "detail": f"Content generation error: {str(ve)}"}) + "\n"
+        except Exception as e:
+            print(f"Error creating PPT: {e}")
+            yield json.dumps({"event": "error", "detail": f"An unexpected error occurred during presentation creation: {str(e)}"}) + "\n"
+
+    return StreamingResponse(deck_events(), media_type="application/x-ndjson")
+
+
 @app.post("/edit_ppt", response_model=PptResponse, summary="Edit a specific element on a slide using agentic instructions")
 async def edit_ppt(request: EditPptRequest):
     """
     Endpoint to apply an agentic edit to a specific element on a slide.
     The agent processes the instruction, updates the structured content,
-    and then the PPTX is regenerated.
+    and the PPTX is regenerated on the next download.
     """
     try:
         
         if request.presentation_id not in presentations_store:
             raise HTTPException(status_code=404, detail="Presentation not found. Please create one first.")
 
-        current_presentation_data = presentations_store[request.presentation_id]
-        current_content: PresentationContent = current_presentation_data["content"]
+        # Checked out so the presentation can't be evicted while the agent is working on it
+        with presentations_store.use(request.presentation_id) as current_presentation_data:
+            current_content: PresentationContent = current_presentation_data["content"]
+            check_slide_index(current_content, request.slide_index)
 
-        # Step 1: Agent processes the edit instruction and returns the updated slide content.
-        # This function uses LLMs to understand the edit and suggest new content for the element.
-        #print(f"Editing slide {request.slide_index}, element '{request.element_id}' with instruction: '{request.edit_instruction}'")
-        updated_slide: SlideContent = await get_edited_content_from_agent(
-            current_presentation_content=current_content, # Provide full presentation context
-            slide_index=request.slide_index,
-            element_id=request.element_id,
-            edit_instruction=request.edit_instruction,
-            current_element_content=request.current_content
-        )
-        
+            # The slide stays locked while the agent works on it, so a concurrent change of the
+            # same slide can't be overwritten by this one (edits of other slides go ahead).
+            base_versions = {request.slide_index: request.base_version} if request.base_version is not None else None
+            async with lock_slides(current_presentation_data, [request.slide_index], base_versions):
+                # Step 1: Agent processes the edit instruction and returns the updated slide content.
+                # This function uses LLMs to understand the edit and suggest new content for the element.
+                #print(f"Editing slide {request.slide_index}, element '{request.element_id}' with instruction: '{request.edit_instruction}'")
+                updated_slide: SlideContent = await get_edited_content_from_agent(
+                    current_presentation_content=current_content, # Provide full presentation context
+                    slide_index=request.slide_index,
+                    element_id=request.element_id,
+                    edit_instruction=request.edit_instruction,
+                    current_element_content=request.current_content,
+                    use_cache=request.use_cache is not False,
+                    session_key=request.presentation_id
+                )
 
-        # Update the in-memory structured content with the agent's edits for the specific slide.
-        # It's crucial that `get_edited_content_from_agent` returns a complete `SlideContent` object.
-        current_content.slides[request.slide_index] = updated_slide
 
-        # Step 2: Regenerate the entire PPTX file with the newly updated structured content.
-        # This is simpler than trying to modify an existing PPTX document in place for complex edits.
-        pptx_buffer = io.BytesIO()
-        generate_presentation_pptx(current_content, pptx_buffer)
-        pptx_buffer.seek(0)
-        presentations_store[request.presentation_id]["raw_pptx_data"] = pptx_buffer.getvalue()
-
-        # For the frontend, send the updated simplified representation of all slides.
-        frontend_slides = []
-        for i, slide in enumerate(current_content.slides):
-            frontend_slides.append({
-                "slide_index": i,
-                "title": slide.title,
-                "bullet_points": slide.bullet_points,
-                "image_description": slide.image_description,
-            })
+                # Update the in-memory structured content with the agent's edits for the specific slide.
+                # It's crucial that `get_edited_content_from_agent` returns a complete `SlideContent` object.
+                current_content.slides[request.slide_index] = updated_slide
 
+                # Step 2: Mark the slide as changed; only it is re-rendered on the next download.
+                mark_slides_changed(current_presentation_data, [request.slide_index])
+
+        # For the frontend, send only the changed slide and the new version; clients that
+        # missed other changes catch up through /presentations/{id}/changes.
         return PptResponse(
             presentation_id=request.presentation_id,
-            slides=frontend_slides,
+            slides=frontend_slides(current_presentation_data, [request.slide_index]),
+            version=current_presentation_data["version"],
             message="Presentation edited successfully!"
         )
 
     except HTTPException as he:
         # Re-raise HTTP exceptions generated within this endpoint
         raise he
+    except SlideConflict as sc:
+        raise slide_conflict(sc, current_presentation_data)
+    except AgentCallTimeout as te:
+        raise agent_timeout(te)
     except ValueError as ve:
         # Catch specific errors from agent_logic
         raise HTTPException(status_code=400, detail=f"Edit processing error: {str(ve)}")
@@ -184,21 +619,260 @@ async def edit_ppt(request: EditPptRequest):
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during presentation editing: {str(e)}")
 
 
+@app.post("/edit_ppt_batch", response_model=BatchEditPptResponse, summary="Apply many agentic edits across slides in one request")
+async def edit_ppt_batch(request: BatchEditPptRequest):
+    """
+    Endpoint to apply a list of edits across slides.
+    Edits are grouped per slide so each slide takes one agent call, and the slides are edited
+    concurrently. The updated slides are then applied together, as one new version (so the PPTX
+    is rebuilt once, on the next download).
+    Each edit gets a status: "applied", "failed" (its slide's agent call failed; the slide is
+    unchanged), "conflict" (its slide changed after the edit's base_version; the slide's edits are
+    not attempted) or "skipped" (atomic batch not applied because another slide failed). An atomic
+    batch with a conflict is rejected with a 409 before any agent call.
+    """
+    if request.presentation_id not in presentations_store:
+        raise HTTPException(status_code=404, detail="Presentation not found. Please create one first.")
+    if not request.edits:
+        raise HTTPException(status_code=400, detail="No edits given.")
+
+    # Key: slide index, Value: indices into request.edits, in request order
+    edits_by_slide: Dict[int, List[int]] = {}
+    for edit_index, edit in enumerate(request.edits):
+        edits_by_slide.setdefault(edit.slide_index, []).append(edit_index)
+
+    results = [
+        {"edit_index": i, "slide_index": edit.slide_index, "element_id": edit.element_id, "status": None, "detail": None}
+        for i, edit in enumerate(request.edits)
+    ]
+
+    # Checked out so the presentation can't be evicted while the agent is working on it
+    with presentations_store.use(request.presentation_id) as current_presentation_data:
+        current_content: PresentationContent = current_presentation_data["content"]
+        # The whole batch is rejected for a bad index, before any slide is locked or agent called
+        for slide_index in edits_by_slide:
+            check_slide_index(current_content, slide_index)
+        semaphore = asyncio.Semaphore(max(1, request.concurrency or EDIT_CONCURRENCY))
+
+        async def edit_slide(slide_index: int, edit_indices: List[int]):
+            async with semaphore:
+                return await get_batch_edited_content_from_agent(
+                    current_presentation_content=current_content,
+                    slide_index=slide_index,
+                    edits=[
+                        (request.edits[i].element_id, request.edits[i].edit_instruction, request.edits[i].current_content)
+                        for i in edit_indices
+                    ],
+                    use_cache=request.use_cache is not False,
+                    session_key=request.presentation_id
+                )
+
+        # Every slide of the batch stays locked until the batch is applied, as in /edit_ppt
+        async with lock_slides(current_presentation_data, edits_by_slide):
+            # A slide is stale if it changed after the oldest version any of its edits was based on
+            conflicts: Dict[int, SlideConflict] = {}
+            for slide_index, edit_indices in edits_by_slide.items():
+                base_versions = [request.edits[i].base_version for i in edit_indices if request.edits[i].base_version is not None]
+                if base_versions:
+                    slide_version = current_presentation_data["slide_versions"][slide_index]
+                    if slide_version > min(base_versions):
+                        conflicts[slide_index] = SlideConflict(slide_index, min(base_versions), slide_version)
+            if request.atomic and conflicts:
+                raise slide_conflict(next(iter(conflicts.values())), current_presentation_data)
+            for slide_index, conflict in conflicts.items():
+                for i in edits_by_slide[slide_index]:
+                    results[i].update(status="conflict", detail=str(conflict))
+
+            slide_indices = [i for i in edits_by_slide if i not in conflicts]
+            outcomes = await asyncio.gather(
+                *[edit_slide(i, edits_by_slide[i]) for i in slide_indices], return_exceptions=True
+            )
+
+            updated_slides: Dict[int, SlideContent] = {}
+            for slide_index, outcome in zip(slide_indices, outcomes):
+                if isinstance(outcome, BaseException):
+                    if not isinstance(outcome, Exception):
+                        raise outcome # Cancellation and the like
+                    detail = str(outcome) if isinstance(outcome, ValueError) else f"An unexpected error occurred: {outcome}"
+                    for i in edits_by_slide[slide_index]:
+                        results[i].update(status="failed", detail=detail)
+                else:
+                    updated_slides[slide_index] = outcome
+
+            failed = len(updated_slides) < len(edits_by_slide)
+            if request.atomic and failed:
+                updated_slides = {}
+            for slide_index in slide_indices:
+                for i in edits_by_slide[slide_index]:
+                    if results[i]["status"] is None:
+                        results[i]["status"] = "applied" if slide_index in updated_slides else "skipped"
+
+            if updated_slides:
+                # All slides are swapped in together with no await in between, so no other request
+                # (or download) can see the batch half applied.
+                slides = list(current_content.slides)
+                for slide_index, slide in updated_slides.items():
+                    slides[slide_index] = slide
+                current_content.slides = slides
+                mark_slides_changed(current_presentation_data, list(updated_slides))
+
+    applied = sum(result["status"] == "applied" for result in results)
+    print(f"Batch edit of {request.presentation_id}: {applied}/{len(results)} edits applied across {len(updated_slides)} slides.")
+    return BatchEditPptResponse(
+        presentation_id=request.presentation_id,
+        slides=frontend_slides(current_presentation_data, updated_slides),
+        version=current_presentation_data["version"],
+        results=results,
+        message="Presentation edited successfully!" if not failed else f"{applied} of {len(results)} edits applied."
+    )
+
+
+@app.get("/presentations/{presentation_id}/changes", summary="Slides changed since a given version")
+async def presentation_changes(presentation_id: str, since_version: int = 0):
+    """
+    Lets a client resync cheaply: returns the current version and only the slides that changed
+    after `since_version` (nothing if the client is up to date).
+    If the slide list itself changed shape since then (or `since_version` is unknown to the
+    server), every slide is returned with "full": true and the client should replace its copy.
+    """
+    presentation_data = presentations_store.get(presentation_id)
+    if presentation_data is None:
+        raise HTTPException(status_code=404, detail="Presentation not found.")
+
+    version = presentation_data["version"]
+    full = since_version < presentation_data["structure_version"] or since_version > version
+    if full:
+        slide_indices = None
+    else:
+        slide_indices = [i for i, v in enumerate(presentation_data["slide_versions"]) if v > since_version]
+    return {
+        "presentation_id": presentation_id,
+        "version": version,
+        "slide_count": len(presentation_data["content"].slides),
+        "full": full,
+        "slides": frontend_slides(presentation_data, slide_indices),
+    }
+
+
+@app.get("/presentations/{presentation_id}/slides/{slide_index}/thumbnail", summary="Image of one slide")
+async def slide_thumbnail(
+    presentation_id: str,
+    slide_index: int,
+    width: int = THUMBNAIL_WIDTH,
+    image_format: str = Query(THUMBNAIL_FORMAT, alias="format"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    The slide drawn as it is laid out in the PPTX (see thumbnails.py), `width` pixels wide, as
+    PNG or WebP. The ETag is the thumbnail's content key: a request whose If-None-Match matches
+    gets a 304 without drawing anything.
+    """
+    check_thumbnail_options(width, image_format)
+    if presentation_id not in presentations_store:
+        raise HTTPException(status_code=404, detail="Presentation not found.")
+
+    with presentations_store.use(presentation_id) as presentation_data:
+        content = presentation_data["content"]
+        check_slide_index(content, slide_index)
+        key = thumbnail_key(content.slides[slide_index], theme_registry.resolve(content.overall_theme), width, image_format)
+        headers = {"ETag": f'"{key}"', "Cache-Control": "no-cache"}
+        if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        try:
+            key, thumbnail = (await slide_thumbnails(presentation_data, [slide_index], width, image_format))[slide_index]
+        except RenderExecutorSaturated as rs:
+            raise render_executor_busy(rs)
+    headers["ETag"] = f'"{key}"'
+    return Response(content=thumbnail, media_type=THUMBNAIL_FORMATS[image_format], headers=headers)
+
+
+@app.get("/presentations/{presentation_id}/thumbnails", summary="Images of the slides changed since a given version")
+async def presentation_thumbnails(
+    presentation_id: str,
+    since_version: int = 0,
+    width: int = THUMBNAIL_WIDTH,
+    image_format: str = Query(THUMBNAIL_FORMAT, alias="format")
+):
+    """
+    Like /presentations/{id}/changes, but with each changed slide's thumbnail (base64) instead
+    of its content: every slide the first time (`since_version` 0), then only those edited since
+    the version the client has. Slides are drawn in parallel, and only if their content changed.
+    """
+    check_thumbnail_options(width, image_format)
+    if presentation_id not in presentations_store:
+        raise HTTPException(status_code=404, detail="Presentation not found.")
+
+    with presentations_store.use(presentation_id) as presentation_data:
+        version = presentation_data["version"]
+        slide_versions = list(presentation_data["slide_versions"])
+        full = since_version < presentation_data["structure_version"] or since_version > version
+        if full:
+            slide_indices = range(len(slide_versions))
+        else:
+            slide_indices = [i for i, v in enumerate(slide_versions) if v > since_version]
+        try:
+            thumbnails = await slide_thumbnails(presentation_data, slide_indices, width, image_format)
+        except RenderExecutorSaturated as rs:
+            raise render_executor_busy(rs)
+
+    return {
+        "presentation_id": presentation_id,
+        "version": version,
+        "slide_count": len(slide_versions),
+        "full": full,
+        "media_type": THUMBNAIL_FORMATS[image_format],
+        "thumbnails": [
+            {
+                "slide_index": i,
+                "version": slide_versions[i],
+                "etag": f'"{thumbnails[i][0]}"',
+                "data": base64.b64encode(thumbnails[i][1]).decode("ascii"),
+            }
+            for i in sorted(thumbnails)
+        ],
+    }
+
+
 @app.get("/download_ppt/{presentation_id}", summary="Download the generated PPTX file")
-async def download_ppt(presentation_id: str):
+async def download_ppt(presentation_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Endpoint to download the generated (or edited) PPTX file.
+    The file is built on demand, at most once per content version, and streamed in chunks
+    (large decks straight from their file on disk). The response carries an ETag for the
+    version; a request whose If-None-Match matches it gets a 304 without a build.
     """
     if presentation_id not in presentations_store:
         raise HTTPException(status_code=404, detail="Presentation not found.")
 
-    pptx_bytes = presentations_store[presentation_id]["raw_pptx_data"]
-    name = presentations_store[presentation_id]["content"].name or "presentation"
+    with presentations_store.use(presentation_id) as presentation_data:
+        etag = pptx_etag(presentation_id, presentation_data["version"])
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+
+        try:
+            pptx = await get_pptx(presentation_data)
+            if isinstance(pptx, str):
+                # Opened before the entry is released: eviction or a rebuild may delete the file next.
+                pptx_file = open(pptx, "rb")
+                size = os.fstat(pptx_file.fileno()).st_size
+                chunks = iter_pptx_file(pptx_file)
+            else:
+                size = len(pptx)
+                chunks = iter_pptx_bytes(pptx)
+        except RenderExecutorSaturated as rs:
+            raise render_executor_busy(rs)
+        except Exception as e:
+            print(f"Error building PPT: {e}")
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred while building the presentation: {str(e)}")
+        name = presentation_data["content"].name or "presentation"
 
-    return Response(
-        content=pptx_bytes,
+    headers["Content-Disposition"] = f"attachment; filename={name}.pptx"
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        chunks,
         media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        headers={"Content-Disposition": f"attachment; filename={name}.pptx"}
+        headers=headers
     )
 
 
@@ -214,8 +888,12 @@ async def sketch(description: dict):
     try:
         # Here you would implement the logic to process the sketch description
         # For now, we just return a mock response
-        output = await get_mermaid_output_from_description(description['message'])
+        output = await get_mermaid_output_from_description(
+            description['message'], use_cache=description.get('use_cache', True) is not False
+        )
         return {"result": output}
+    except AgentCallTimeout as te:
+        raise agent_timeout(te)
     except Exception as e:
         print(f"Error processing sketch: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
@@ -226,64 +904,432 @@ async def generate_image(data: dict = Body(...)):
     """
     Generate an image from a description using Google GenAI and return it as base64.
     Expects: { "description": "your prompt here" }
+    Optional "base_version": the slide's version as the client last received it; if the slide
+    changes before the image is applied, the request gets a 409 (as in /edit_ppt).
     """
     try:
         # print("Generating image with description:", data)
         prompt = data.get("description")
         slide_index = data.get("slide_index")  # Optional, default to first slide
         presentations_id = data.get("presentation_id")  # Get the presentations store from the request
+        base_version = data.get("base_version")
+        if presentations_id not in presentations_store:
+            raise HTTPException(status_code=404, detail="Presentation not found. Please create one first.")
         # print(presentations_store)
         # current_presentation_data = presentations_store[presentations_id]['content'].slides[slide_index]
         # current_presentation_data = presentations_store[presentations_id]
         # curren_content = current_presentation_data['content']#.slides[slide_index]
 
         
-        current_presentation_data = presentations_store[presentations_id]
-        current_content: PresentationContent = current_presentation_data["content"]
-        
-        if not prompt:
-            raise HTTPException(status_code=400, detail="Missing 'description' in request.")
-
-        # Initialize Google GenAI (make sure your API key is set in the environment)
-        response = client.models.generate_content(
-                    model="gemini-2.0-flash-preview-image-generation",
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE']
-                    )
-                )
+        with presentations_store.use(presentations_id) as current_presentation_data:
+            current_content: PresentationContent = current_presentation_data["content"]
 
-        for part in response.candidates[0].content.parts:
-            if part.text is not None:
-                pass
-            elif part.inline_data is not None:
-                img_base64 = base64.b64encode(part.inline_data.data).decode("utf-8")
-                current_content.slides[slide_index].image_base64 = img_base64
-                
-                #current_content.slides[request.slide_index] = updated_slide
-                # current_content.slides[slide_index] = curren_slide_content
-                # print(current_presentation_data)
-                pptx_buffer = io.BytesIO()
-                generate_presentation_pptx(current_content, pptx_buffer)
-                pptx_buffer.seek(0)
-                presentations_store[presentations_id]["raw_pptx_data"] = pptx_buffer.getvalue()
-                return {"base64": img_base64}
-
-        # The SDK returns a response with a list of generated images (as bytes)
-        # We'll take the first image and encode it as base64
-        if not response or not hasattr(response, "images") or not response.images:
-            raise HTTPException(status_code=500, detail="No image generated.")
-        
+            if not prompt:
+                raise HTTPException(status_code=400, detail="Missing 'description' in request.")
+            check_slide_index(current_content, slide_index)
+            base_versions = {slide_index: base_version} if base_version is not None else None
+            slide_version = current_presentation_data["slide_versions"][slide_index]
+            if base_version is not None and slide_version > base_version:
+                # Fail fast rather than generate an image that can't be applied
+                raise SlideConflict(slide_index, base_version, slide_version)
+
+            # Uses the async GenAI client so the image request doesn't block the event loop
+            # (make sure your API key is set in the environment)
+            with span("image_generate"):
+                image_bytes = await generate_image_bytes(get_genai_client(), prompt)
+            if image_bytes is None:
+                raise HTTPException(status_code=500, detail="No image generated.")
+
+            # Slides reference images by content hash; the bytes live once in the image store,
+            # next to a variant normalized for the slide's picture box.
+            # The slide is replaced rather than mutated so in-flight builds see a consistent snapshot.
+            with span("image_store"):
+                image_hash = await render_executor.run(store_image, image_bytes)
+            # Locked only to apply the image (not while it is generated): an edit of the slide in
+            # progress finishes first, and the image then goes onto its result.
+            async with lock_slides(current_presentation_data, [slide_index], base_versions):
+                current_content.slides[slide_index] = current_content.slides[slide_index].model_copy(update={"image_hash": image_hash})
+                mark_slides_changed(current_presentation_data, [slide_index])
+                version = current_presentation_data["version"]
+                changed_slides = frontend_slides(current_presentation_data, [slide_index])
+        # The frontend displays the image inline, so it still gets base64 in the response
+        with span("base64_encode"):
+            img_base64 = await render_executor.run(encode_image_base64, image_bytes)
+        return {"base64": img_base64, "image_hash": image_hash, "version": version, "slides": changed_slides}
+
+    except HTTPException as he:
+        raise he
+    except SlideConflict as sc:
+        raise slide_conflict(sc, current_presentation_data)
+    except RenderExecutorSaturated as rs:
+        raise render_executor_busy(rs)
     except Exception as e:
         print(f"Error generating image: {e}")
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
 
+@app.post("/generate_deck_images", summary="Generate images for many slides of a presentation at once")
+async def generate_deck_images(request: GenerateDeckImagesRequest):
+    """
+    Generates an image for every requested slide from its `image_description`, running up to
+    `concurrency` requests at a time. The PPTX is rebuilt once for the whole batch, on the next download.
+    Streams newline-delimited JSON progress events:
+      {"event": "slide", "slide_index": 3, "status": "done"}            (one per slide, as it finishes)
+      {"event": "slide", "slide_index": 5, "status": "failed", "error": "..."}
+      {"event": "complete", "generated": 9, "failed": 1, "version": 7, "slides": [...]}  (the changed slides)
+    Images are applied to the presentation only once all slides have finished.
+    """
+    if request.presentation_id not in presentations_store:
+        raise HTTPException(status_code=404, detail="Presentation not found. Please create one first.")
+
+    current_content: PresentationContent = presentations_store[request.presentation_id]["content"]
+
+    slide_indices = request.slide_indices
+    if slide_indices is None:
+        slide_indices = range(len(current_content.slides))
+    prompts = {}
+    for slide_index in slide_indices:
+        if slide_index < 0 or slide_index >= len(current_content.slides):
+            raise HTTPException(status_code=400, detail=f"Slide index {slide_index} is out of bounds for the current presentation.")
+        slide = current_content.slides[slide_index]
+        if slide.image_description and (request.overwrite or not slide.image_hash):
+            prompts[slide_index] = slide.image_description
+
+    concurrency = request.concurrency or IMAGE_CONCURRENCY
+
+    async def progress_events():
+        generated = {}
+        failed = 0
+        async for slide_index, image_bytes, error in generate_slide_images(get_genai_client(), prompts, concurrency):
+            if error is not None:
+                failed += 1
+                print(f"Error generating image for slide {slide_index}: {error}")
+                yield json.dumps({"event": "slide", "slide_index": slide_index, "status": "failed", "error": str(error)}) + "\n"
+            else:
+                generated[slide_index] = image_bytes
+                yield json.dumps({"event": "slide", "slide_index": slide_index, "status": "done"}) + "\n"
+
+        version = None
+        changed_slides = []
+        if generated:
+            try:
+                image_hashes = {}
+                for slide_index, image_bytes in generated.items():
+                    with span("image_store"):
+                        image_hashes[slide_index] = await render_executor.run(store_image, image_bytes)
+                # Looked up again: the presentation may have gone cold while the images were generated
+                with presentations_store.use(request.presentation_id) as current_presentation_data:
+                    current_content: PresentationContent = current_presentation_data["content"]
+                    # Applied once edits in progress on these slides have finished, as in /generate
+                    async with lock_slides(current_presentation_data, generated):
+                        for slide_index, image_hash in image_hashes.items():
+                            current_content.slides[slide_index] = current_content.slides[slide_index].model_copy(update={"image_hash": image_hash})
+                        # One version bump for the whole batch, so it is rendered once on the next download
+                        mark_slides_changed(current_presentation_data, list(generated))
+                        version = current_presentation_data["version"]
+                        changed_slides = frontend_slides(current_presentation_data, generated)
+            except Exception as e:
+                print(f"Error storing generated images: {e}")
+                yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+                return
+
+        yield json.dumps({
+            "event": "complete", "generated": len(generated), "failed": failed, "version": version, "slides": changed_slides
+        }) + "\n"
+
+    return StreamingResponse(progress_events(), media_type="application/x-ndjson")
+
+
+@app.get("/themes", summary="Themes presentations can be rendered with")
+async def list_themes():
+    """
+    The built-in themes and the uploaded .pptx templates. Pass a name as `theme` to /create_ppt;
+    otherwise the theme is picked from the agent's suggested 'overall_theme'.
+    """
+    return {"themes": [
+        {"name": name, "template": theme_registry.get(name).template_bytes is not None} for name in theme_registry.names()
+    ]}
+
+
+def parse_hex_color(value: Optional[str]) -> Optional[RGBColor]:
+    if value is None:
+        return None
+    try:
+        return RGBColor.from_string(value.lstrip("#"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{value}' is not a hex color like #1F4E79.")
+
+
+@app.post("/themes", summary="Upload a .pptx template as a theme")
+async def upload_theme(
+    name: str = Form(...),
+    file: UploadFile = File(...),
+    primary_color: Optional[str] = Form(None), # Title text, e.g. "#1F1F1F"
+    secondary_color: Optional[str] = Form(None), # Bullet and caption text
+    accent_color: Optional[str] = Form(None) # Image placeholder border
+):
+    """
+    Registers a .pptx file as a theme: decks using it are built on its slide masters and
+    "Blank" layout (or the layout with the fewest placeholders), at its slide size. Its own
+    slides are ignored. The template is compiled once, here. A name can't be reused (409):
+    decks already rendered with a theme keep it.
+    """
+    colors = [parse_hex_color(primary_color), parse_hex_color(secondary_color), parse_hex_color(accent_color)]
+    if any(color is None for color in colors):
+        if any(color is not None for color in colors):
+            raise HTTPException(status_code=400, detail="Give all three colors or none.")
+        colors = None
+    pptx_bytes = await file.read()
+    try:
+        theme = await render_executor.run(theme_registry.register_template, name, pptx_bytes, colors)
+    except RenderExecutorSaturated as rs:
+        raise render_executor_busy(rs)
+    except ThemeExists as te:
+        raise HTTPException(status_code=409, detail=str(te))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    compiled = theme.compiled()
+    return {
+        "name": theme.name,
+        "slide_width": compiled.slide_width,
+        "slide_height": compiled.slide_height,
+        "message": f"Theme '{theme.name}' registered.",
+    }
+
+
+# --- Background jobs ---
+
+# Seconds a job waits before trying again to render while every render worker is busy
+JOB_RENDER_RETRY_SECONDS = 0.5
+# Longest silence on a job status stream: a progress event is sent when nothing changed for this long
+JOB_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+class SubmitJobsRequest(BaseModel):
+    requests: List[CreatePptRequest] # One job per request, run as /create_ppt would
+    # Lane: "bulk" (default) or "interactive", which is run first and isn't held to the bulk concurrency limits
+    priority: Optional[str] = "bulk"
+
+
+async def run_create_ppt_job(job_id: str, payload: Dict, lane: str) -> Dict:
+    """
+    Runs a queued /create_ppt request: generates the deck, stored under the job's id, and builds
+    its PPTX so the first download doesn't wait for a render. Returns what the job keeps to
+    restore the presentation if the store no longer has it when the job is fetched.
+    """
+    request = CreatePptRequest.model_validate(payload)
+    async with job_queue.stage("llm", lane):
+        await generate_presentation(request, job_id)
+    async with job_queue.stage("render", lane):
+        with presentations_store.use(job_id) as presentation_data:
+            while True:
+                try:
+                    await get_pptx(presentation_data)
+                    break
+                except RenderExecutorSaturated:
+                    # Downloads have every render worker busy; a job can wait for one
+                    await asyncio.sleep(JOB_RENDER_RETRY_SECONDS)
+            return {"description": request.description, "content": presentation_data["content"].model_dump(mode="json")}
+
+
+# Queue of /create_ppt requests run in the background, configured through JOB_* environment
+# variables. Kept in the JOB_QUEUE_DB file, it survives restarts; its workers start with the app (see `lifespan`).
+job_queue = JobQueue(run_create_ppt_job)
+
+
+def job_response(job: Dict) -> Dict:
+    """
+    A job as returned by the API: its status and timings and, once done, the created
+    presentation as /create_ppt returns it (restored from the job's result if the store lost
+    it, e.g. in a restart; edits made since are lost then).
+    """
+    response = {key: job[key] for key in (
+        "job_id", "batch_id", "lane", "status", "error", "attempts", "submitted_at", "started_at", "finished_at"
+    )}
+    if job["status"] == "done":
+        presentation_id = job["job_id"]
+        if presentation_id not in presentations_store:
+            result = job["result"]
+            presentations_store[presentation_id] = new_presentation_entry(
+                result["description"], PresentationContent.model_validate(result["content"])
+            )
+        presentation_data = presentations_store[presentation_id]
+        response["result"] = PptResponse(
+            presentation_id=presentation_id,
+            slides=frontend_slides(presentation_data),
+            version=presentation_data["version"],
+            message="Presentation created successfully!"
+        ).model_dump()
+    return response
+
+
+def get_job_or_404(job_id: str) -> Dict:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+def get_batch_or_404(batch_id: str) -> Dict:
+    batch = job_queue.batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return batch
+
+
+def job_events(batch_id: Optional[str] = None, job_id: Optional[str] = None) -> StreamingResponse:
+    """
+    Newline-delimited JSON events for a batch's jobs, or one job, until all of them have finished:
+      {"event": "job", "job_id": "...", "status": "...", "error": ...}   (each job's status first, then every change)
+      {"event": "progress", ...}                                          (after changes and when idle: the batch's progress, or the job's status)
+      {"event": "complete", ...}                                          (last: the batch's progress, or the job with its result)
+    """
+
+    async def events():
+        last_status = {}
+        while True:
+            # Taken before reading the statuses, so a change in between isn't missed
+            changed = job_queue.changed
+            statuses = job_queue.statuses(batch_id=batch_id) if batch_id else job_queue.statuses(job_ids=[job_id])
+            if not statuses:
+                return # Deleted (see JOB_RETENTION_SECONDS)
+            for status in statuses:
+                if last_status.get(status["job_id"]) != status["status"]:
+                    last_status[status["job_id"]] = status["status"]
+                    yield json.dumps({"event": "job", **status}) + "\n"
+            if all(status["status"] in FINISHED_STATUSES for status in statuses):
+                final = job_queue.batch(batch_id) if batch_id else job_response(job_queue.get(job_id))
+                yield json.dumps({"event": "complete", **final}) + "\n"
+                return
+            progress = job_queue.batch(batch_id) if batch_id else statuses[0]
+            yield json.dumps({"event": "progress", **progress}) + "\n"
+            try:
+                await asyncio.wait_for(changed.wait(), JOB_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202, summary="Queue many presentations to be created in the background")
+async def submit_jobs(request: SubmitJobsRequest):
+    """
+    Queues one background job per /create_ppt request and returns at once with their ids.
+    Jobs run in submission order, interactive ones first; each generates its deck (stored under
+    the job's id) and builds its PPTX. Poll GET /jobs/{job_id} or /jobs/batches/{batch_id}, or
+    stream their .../events, to follow them and fetch the results.
+    """
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="No requests to queue.")
+    if request.priority not in JOB_LANES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(JOB_LANES)}.")
+    for i, create_request in enumerate(request.requests):
+        try:
+            check_create_request(create_request)
+        except HTTPException as e:
+            raise HTTPException(status_code=400, detail=f"Request {i}: {e.detail}")
+    submitted = job_queue.submit([create_request.model_dump() for create_request in request.requests], request.priority)
+    return {**submitted, "lane": request.priority, "message": f"{len(submitted['job_ids'])} jobs queued."}
+
+
+@app.get("/jobs/stats", summary="Background job throughput")
+async def job_stats():
+    """
+    Jobs per lane and status, how many are generating content or rendering (or waiting to),
+    and over the last JOB_THROUGHPUT_WINDOW_SECONDS the jobs finished per minute, the queue wait
+    and run time per lane, and the estimated time to clear the backlog.
+    """
+    return job_queue.stats()
+
+
+@app.get("/jobs/batches/{batch_id}", summary="Progress and job statuses of a batch")
+async def get_job_batch(batch_id: str):
+    batch = get_batch_or_404(batch_id)
+    return {**batch, "statuses": job_queue.statuses(batch_id=batch_id)}
+
+
+@app.get("/jobs/batches/{batch_id}/events", summary="Stream the status changes of a batch's jobs")
+async def job_batch_events(batch_id: str):
+    get_batch_or_404(batch_id)
+    return job_events(batch_id=batch_id)
+
+
+@app.delete("/jobs/batches/{batch_id}", summary="Cancel a batch's unfinished jobs")
+async def cancel_job_batch(batch_id: str):
+    get_batch_or_404(batch_id)
+    cancelled = job_queue.cancel(status["job_id"] for status in job_queue.statuses(batch_id=batch_id))
+    return {"batch_id": batch_id, "cancelled": cancelled}
+
+
+@app.get("/jobs/{job_id}", summary="Status and result of a background job")
+async def get_job(job_id: str):
+    return job_response(get_job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/events", summary="Stream the status changes of a background job")
+async def job_status_events(job_id: str):
+    get_job_or_404(job_id)
+    return job_events(job_id=job_id)
+
+
+@app.delete("/jobs/{job_id}", summary="Cancel a background job")
+async def cancel_job(job_id: str):
+    get_job_or_404(job_id)
+    return {"job_id": job_id, "cancelled": job_queue.cancel([job_id]) > 0}
+
+
+# Gauges read from each component's own counters when /metrics is scraped
+register_collector("presentations", presentations_store.stats)
+register_collector("images", image_store.stats)
+register_collector("image_normalize", normalized_images.stats)
+register_collector("llm_cache", llm_cache.stats)
+register_collector("agent", session_stats)
+register_collector("prompt", prompt_stats)
+register_collector("llm_calls", resilience_stats)
+register_collector("llm_routing", model_router.stats)
+register_collector("edit_fast_path", fast_path_stats)
+register_collector("render", render_executor.stats)
+register_collector("thumbnails", thumbnail_cache.stats)
+register_collector("jobs", job_queue.stats)
+register_collector("startup", lambda: dict(startup_timings))
+
+startup_timings["import_seconds"] = round(time.perf_counter() - BOOT_STARTED, 3)
+
+
+@app.get("/metrics", summary="Prometheus metrics")
+async def metrics():
+    """
+    Per-stage and per-route latency histograms (LLM calls, validation, rendering, image handling,
+    serialization) and the counters of the stores, caches, agent sessions and render workers,
+    in the Prometheus text format.
+    """
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/store_stats", summary="Presentation store and LLM cache counters")
+async def store_stats():
+    """
+    Hit, miss and eviction counters and resident sizes of the presentation and image stores,
+    the hit ratio and saved latency of the LLM response cache, the pooled agent sessions, and
+    how many edits the local fast path handled without the agent.
+    """
+    return {
+        "presentations": presentations_store.stats(),
+        "images": image_store.stats(),
+        "image_normalize": normalized_images.stats(),
+        "thumbnails": thumbnail_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "agent_sessions": session_stats(),
+        "edit_fast_path": fast_path_stats(),
+    }
+
+
 if __name__ == "__main__":
     # To run this FastAPI application:
     # 1. Ensure you have uvicorn installed: pip install uvicorn
     # 2. Run from your terminal in the 'backend' directory: uvicorn main:app --reload --port 8000
     #    The --reload flag is for development, it reloads the server on code changes.
     #    The --port 8000 matches the frontend's API_BASE_URL.
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
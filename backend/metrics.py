@@ -0,0 +1,204 @@
+# metrics.py
+
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.responses import JSONResponse
+
+# METRICS_ENABLED: "0" turns the timing spans into no-ops (the /metrics gauges still work).
+# SERVER_TIMING: "1" adds a Server-Timing header with the stages of each request, so the
+#                breakdown shows up in the browser's network panel. Stages that run after the
+#                response headers are sent (e.g. while streaming) are not included.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+# Histogram buckets in seconds, from a cached edit to a slow deck generation
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stages of the request being handled, for the Server-Timing header: a list of (stage, seconds),
+# or None outside a request or when SERVER_TIMING is off.
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("request_stages", default=None)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram of durations, one series per label value.
+    Observations only take a lock and a bisect, so they are cheap enough for every request.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # Key: label value, Value: [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def exposition(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: (list(counts), total, count) for value, (counts, total, count) in self._series.items()}
+        for value, (counts, total, count) in sorted(series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+stage_seconds = Histogram("ppt_stage_duration_seconds", "Time spent in each stage of request handling.", "stage")
+request_seconds = Histogram("ppt_request_duration_seconds", "Time from request to response headers, per route.", "route")
+
+# Key: metric name prefix, Value: callable returning a (possibly nested) dict of numbers.
+# Read at scrape time, so components keep their own counters and pay nothing per request.
+_collectors: Dict[str, Callable[[], Dict]] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def record(stage: str, seconds: float):
+    """Records a duration measured by the caller as `stage`, like a `span` would."""
+    if not METRICS_ENABLED:
+        return
+    stage_seconds.observe(stage, seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NO_SPAN = nullcontext()
+
+
+def span(stage: str):
+    """
+    Times the enclosed block as `stage` (e.g. "llm_call", "render"), in the stage histogram and,
+    with SERVER_TIMING, in the Server-Timing header of the current request. Works in both sync
+    and async code. A shared no-op when METRICS_ENABLED is off.
+    """
+    return _Span(stage) if METRICS_ENABLED else _NO_SPAN
+
+
+def register_collector(prefix: str, collect: Callable[[], Dict]):
+    """
+    Exposes the numbers returned by `collect()` as gauges named ppt_<prefix>_<key>.
+    A nested dict of numbers (e.g. counts per rule) becomes one gauge with a "key" label.
+    """
+    _collectors[prefix] = collect
+
+
+def _collector_lines(prefix: str, collect: Callable[[], Dict]) -> List[str]:
+    try:
+        values = collect()
+    except Exception as e:
+        print(f"Metrics collector '{prefix}' failed: {e}")
+        return []
+    lines = []
+    for key, value in values.items():
+        name = f"ppt_{prefix}_{key}"
+        if isinstance(value, dict):
+            numbers = {k: v for k, v in value.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+            if not numbers:
+                continue
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f'{name}{{key="{_escape(str(k))}"}} {v}' for k, v in sorted(numbers.items()))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return lines
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = stage_seconds.exposition() + request_seconds.exposition()
+    for prefix, collect in list(_collectors.items()):
+        lines.extend(_collector_lines(prefix, collect))
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(stages: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing value: one entry per stage (repeated stages are summed) plus the total, in ms."""
+    durations: Dict[str, float] = {}
+    for stage, seconds in stages:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that times each HTTP request up to its response headers, per route
+    template (so /download_ppt/{presentation_id} is one series, not one per presentation),
+    and adds the Server-Timing header when SERVER_TIMING is on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stages = [] if SERVER_TIMING else None
+        token = _request_stages.set(stages)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                route = scope.get("route")
+                request_seconds.observe(getattr(route, "path", "unmatched"), elapsed)
+                if stages is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing_header(stages, elapsed).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that times its serialization as the "serialize" stage."""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
@@ -9,7 +9,7 @@ class SlideContent(BaseModel):
     title: str = Field(..., description="The main title of the slide.")
     bullet_points: List[str] = Field(default_factory=list, description="Key bullet points or paragraphs for the slide.")
     image_description: Optional[str] = Field(None, description="A brief, descriptive phrase for a relevant image to be placed on the slide. This can be used to generate or find an image.")
-    image_base64: Optional[str] = Field(None, description="Base64 encoded string of an image to be placed on the slide. If provided, this will override the image_description for direct image insertion.")
+    image_hash: Optional[str] = Field(None, description="Content hash of an image in the server's image store to be placed on the slide. Set by the server when an image is generated; if provided, this will override the image_description for direct image insertion.")
     # Future additions could include:
     # layout_type: Optional[str] = Field(None, description="Suggested layout type for the slide (e.g., 'title_only', 'title_and_content', 'two_column').")
     # slide_notes: Optional[str] = Field(None, description="Speaker notes for the slide.")
@@ -18,9 +18,21 @@ class PresentationContent(BaseModel):
     """
     Represents the structured content for an entire presentation, composed of multiple slides.
     """
+    # Field order is the order the LLM writes them in (it becomes the schema's property ordering),
+    # so the name and theme arrive before the slides when the response is streamed.
     name: str = Field(..., description="The name or title of the presentation.")
+    overall_theme: Optional[str] = Field(None, description="A suggested overall theme or style for the presentation (e.g., 'professional', 'minimalist', 'playful', 'academic').")
     slides: List[SlideContent] = Field(..., description="A list of slide objects for the presentation.")
+
+
+class PresentationOutline(BaseModel):
+    """
+    Represents the outline of a presentation: its name, theme and one title per slide.
+    Used to generate the slides themselves independently of each other.
+    """
+    name: str = Field(..., description="The name or title of the presentation.")
     overall_theme: Optional[str] = Field(None, description="A suggested overall theme or style for the presentation (e.g., 'professional', 'minimalist', 'playful', 'academic').")
+    slide_titles: List[str] = Field(..., description="The title of each slide, in presentation order.")
 
 
 class MermaidOutput(BaseModel):
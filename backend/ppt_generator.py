@@ -1,176 +1,313 @@
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import MSO_ANCHOR, MSO_AUTO_SIZE, PP_ALIGN
-from pptx.dml.color import RGBColor
-from pptx.enum.shapes import MSO_SHAPE
-from pptx.enum.dml import MSO_LINE
-from models.model import PresentationContent
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI, PackURI
+from pptx.opc.serialized import _ContentTypesItem
+from pptx.opc.package import Part
+from models.model import PresentationContent, SlideContent
+from image_processing import normalized_images
+from metrics import span
+from themes import Theme, CompiledTheme, theme_registry, IMAGE_WIDTH, IMAGE_HEIGHT
 import io
-import os
-import base64
-import tempfile
+import struct
+import zlib
+from typing import Dict, Optional
 
 
-def generate_presentation_pptx(content: PresentationContent, output_buffer: io.BytesIO):
+def _render_slide(theme: CompiledTheme, slide, slide_data: SlideContent, images):
+    """
+    Draws the title, image (or image placeholder) and bullet points of one slide
+    onto an empty python-pptx slide, from the theme's precompiled shapes.
+    `images` maps image hashes to raw image bytes.
+    """
+    theme.add_title(slide, slide_data.title)
+
+    # --- Determine Layout based on content presence ---
+    has_bullets = bool(slide_data.bullet_points)
+    has_image = bool(slide_data.image_description)
+    bullet_box, image_position = theme.layouts[(has_bullets, has_image)]
+
+    if has_image:
+        # An unknown hash (e.g. one the edit agent made up) falls back to the placeholder
+        img_bytes = images.get(slide_data.image_hash) if slide_data.image_hash else None
+        if img_bytes is not None:
+            # Hand the raw bytes to python-pptx as an in-memory stream.
+            # A stream (rather than a temp file) also keeps the picture's 'descr' attribute
+            # stable, which the incremental renderer relies on for identical output.
+            slide.shapes.add_picture(io.BytesIO(img_bytes), *image_position, width=IMAGE_WIDTH, height=IMAGE_HEIGHT)
+        else:
+            theme.add_image_placeholder(slide, *image_position, slide_data.image_description)
+
+    if has_bullets:
+        theme.add_bullets(slide, *bullet_box, slide_data.bullet_points)
+
+
+def _clear_slide(slide):
+    """
+    Removes every shape and picture relationship from a slide, leaving it as
+    `add_slide` created it on the blank layout.
+    """
+    sp_tree = slide.shapes._spTree
+    for shape_elm in list(sp_tree.iter_shape_elms()):
+        sp_tree.remove(shape_elm)
+    for rId, rel in list(slide.part.rels.items()):
+        if rel.reltype == RT.IMAGE:
+            slide.part.rels.pop(rId)
+
+
+# --- Zip writing ---
+# python-pptx's own writer stamps every zip member with the current time, so two saves of the
+# same deck never match byte for byte and every member is re-deflated on each save. We write the
+# package ourselves with a fixed timestamp and keep each member's compressed bytes around.
+_ZIP_DOS_TIME = 0
+_ZIP_DOS_DATE = (1 << 5) | 1 # 1980-01-01, the earliest date a zip header can hold
+
+
+class _ZipEntry:
+    """A single deflated zip member, along with what it was built from (for cache checks)."""
+
+    def __init__(self, membername: str, data: bytes, source):
+        self.membername = membername.encode("utf-8")
+        self.source = source
+        self.crc = zlib.crc32(data)
+        self.size = len(data)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self.compressed = compressor.compress(data) + compressor.flush()
+
+
+class _ZipWriter:
+    """
+    Writes pre-deflated entries to `output` as they are added; only the small central directory
+    records are kept until `close`. `output` only needs a `write` method (a file, a buffer, a socket...).
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.offset = 0
+        self.central_directory = []
+
+    def add(self, entry: _ZipEntry):
+        local_header = struct.pack(
+            "<4s5H3L2H", b"PK\x03\x04", 20, 0, zlib.DEFLATED, _ZIP_DOS_TIME, _ZIP_DOS_DATE,
+            entry.crc, len(entry.compressed), entry.size, len(entry.membername), 0
+        )
+        self.output.write(local_header)
+        self.output.write(entry.membername)
+        self.output.write(entry.compressed)
+        self.central_directory.append(struct.pack(
+            "<4s6H3L5H2L", b"PK\x01\x02", 20, 20, 0, zlib.DEFLATED, _ZIP_DOS_TIME, _ZIP_DOS_DATE,
+            entry.crc, len(entry.compressed), entry.size, len(entry.membername), 0, 0, 0, 0, 0, self.offset
+        ) + entry.membername)
+        self.offset += len(local_header) + len(entry.membername) + len(entry.compressed)
+
+    def close(self):
+        central_directory_bytes = b"".join(self.central_directory)
+        self.output.write(central_directory_bytes)
+        self.output.write(struct.pack(
+            "<4s4H2LH", b"PK\x05\x06", 0, 0, len(self.central_directory), len(self.central_directory),
+            len(central_directory_bytes), self.offset, 0
+        ))
+
+
+def _write_zip(output_buffer, entries):
+    """Writes pre-deflated entries as a zip archive to `output_buffer`."""
+    writer = _ZipWriter(output_buffer)
+    for entry in entries:
+        writer.add(entry)
+    writer.close()
+
+
+class RenderedPresentation:
+    """
+    The rendered python-pptx state of one presentation.
+    Kept alongside the PresentationContent so that an edit re-renders only the changed slide
+    and re-compresses only that slide's parts when the package is saved again.
+    Saving after any sequence of `update_slide` calls produces exactly the same bytes as
+    `generate_presentation_pptx` on the updated content.
+    """
+
+    def __init__(self, content: PresentationContent, images=normalized_images, theme: Optional[Theme] = None):
+        self.images = images
+        # The theme is picked from the agent's free-text 'overall_theme' unless given
+        self.theme = (theme or theme_registry.resolve(content.overall_theme)).compiled()
+        self.prs = self.theme.new_presentation() # The theme's masters, layouts and slide size, no slides
+
+        with span("render_slides"):
+            # Always start with a blank slide layout for manual placement
+            slide_layout = self.prs.slide_layouts[self.theme.blank_layout_index]
+            for slide_data in content.slides:
+                slide = self.prs.slides.add_slide(slide_layout)
+                _render_slide(self.theme, slide, slide_data, self.images)
+
+        # Key: zip membername, Value: _ZipEntry last written under that name
+        self._zip_entries = {}
+        # Membernames of parts and rels that changed in place since the last save
+        self._dirty_members = set()
+
+    def update_slide(self, slide_index: int, slide_data: SlideContent):
+        """
+        Re-renders a single slide from its updated content, leaving every other slide untouched.
+        """
+        slide = self.prs.slides[slide_index]
+        with span("render_slides"):
+            _clear_slide(slide)
+            _render_slide(self.theme, slide, slide_data, self.images)
+        self._dirty_members.add(slide.part.partname.membername)
+        self._dirty_members.add(slide.part.partname.rels_uri.membername)
+        self._renumber_images()
+
+    def _renumber_images(self):
+        """
+        Names image parts in order of first use across the slides, as a fresh build would,
+        so that replacing an image mid-deck doesn't leave the numbering out of order.
+        """
+        seen = set()
+        renamed = set()
+        image_rels = []
+        for slide in self.prs.slides:
+            for rel in slide.part.rels.values():
+                if rel.reltype != RT.IMAGE:
+                    continue
+                image_rels.append((slide.part, rel))
+                image_part = rel.target_part
+                if image_part in seen:
+                    continue
+                seen.add(image_part)
+                partname = PackURI(f"/ppt/media/image{len(seen)}.{image_part.partname.ext}")
+                if image_part.partname != partname:
+                    image_part.partname = partname
+                    renamed.add(image_part)
+
+        # python-pptx caches each relationship's target partname and path on first use;
+        # drop them so the slide rels pick up the new names.
+        for slide_part, rel in image_rels:
+            if rel.target_part in renamed:
+                rel.__dict__.pop("target_partname", None)
+                rel.__dict__.pop("target_ref", None)
+                self._dirty_members.add(slide_part.partname.rels_uri.membername)
+
+    def _entry_for(self, pack_uri, source, serialize) -> _ZipEntry:
+        """
+        Zip entry for one package member, reused until its source object is replaced or the
+        member is marked dirty. The entry holds a reference to its source, so the identity check
+        can't be fooled by id reuse.
+        """
+        membername = pack_uri.membername
+        entry = self._zip_entries.get(membername)
+        if entry is None or entry.source is not source or membername in self._dirty_members:
+            entry = _ZipEntry(membername, serialize(), source)
+        return entry
+
+    def _content_types_entry(self, parts) -> _ZipEntry:
+        """Zip entry for [Content_Types].xml, rebuilt only when the set of parts or their types change."""
+        key = tuple((part.partname, part.content_type) for part in parts)
+        entry = self._zip_entries.get(CONTENT_TYPES_URI.membername)
+        if entry is None or entry.source != key:
+            entry = _ZipEntry(
+                CONTENT_TYPES_URI.membername, serialize_part_xml(_ContentTypesItem.xml_for(parts)), key
+            )
+        return entry
+
+    def save(self, output_buffer: io.BytesIO):
+        """
+        Writes the presentation as a .pptx package to `output_buffer`.
+        """
+        package = self.prs.part.package
+        parts = list(package.iter_parts())
+
+        # Mirrors python-pptx's PackageWriter: content types, package rels, then each part and its rels.
+        with span("serialize_parts"):
+            entries = [
+                self._content_types_entry(parts),
+                self._entry_for(PACKAGE_URI.rels_uri, package, lambda: package._rels.xml),
+            ]
+            for part in parts:
+                entries.append(self._entry_for(part.partname, part, lambda: part.blob))
+                if part._rels:
+                    entries.append(self._entry_for(part.partname.rels_uri, part, lambda: part.rels.xml))
+
+        with span("zip_write"):
+            _write_zip(output_buffer, entries)
+
+        # Only keep entries still in the package so replaced images are released.
+        self._zip_entries = {entry.membername.decode("utf-8"): entry for entry in entries}
+        self._dirty_members.clear()
+
+
+def stream_presentation_pptx(content: PresentationContent, output, images=normalized_images, theme: Optional[Theme] = None):
+    """
+    Writes the same package as `generate_presentation_pptx` (every part byte-identical; only the
+    order of the zip members differs), but one slide at a time: each slide is rendered, written to
+    `output` with any images it introduces, and dropped before the next one. Memory stays flat
+    however long the deck is, so this is the mode for very large decks. `output` only needs a
+    `write` method, e.g. a file opened for writing.
+    """
+    theme = (theme or theme_registry.resolve(content.overall_theme)).compiled()
+    prs = theme.new_presentation()
+    package = prs.part.package
+    slide_layout = prs.slide_layouts[theme.blank_layout_index]
+    slide_ids = prs.slides._sldIdLst
+    writer = _ZipWriter(output)
+
+    slide_partnames = []
+    # Key: image SHA1, Value: partname of the image, numbered in order of first use as in a full build
+    media: Dict[str, PackURI] = {}
+    media_parts = []
+    with span("render_slides"):
+        for slide_data in content.slides:
+            slide = prs.slides.add_slide(slide_layout)
+            _render_slide(theme, slide, slide_data, images)
+            slide.part.partname = PackURI(f"/ppt/slides/slide{len(slide_partnames) + 1}.xml")
+            for rel in slide.part.rels.values():
+                if rel.reltype != RT.IMAGE:
+                    continue
+                image_part = rel.target_part
+                partname = media.get(image_part.sha1)
+                if partname is None:
+                    partname = PackURI(f"/ppt/media/image{len(media) + 1}.{image_part.partname.ext}")
+                    media[image_part.sha1] = partname
+                    media_parts.append(Part(partname, image_part.content_type, package))
+                    writer.add(_ZipEntry(partname.membername, image_part.blob, None))
+                image_part.partname = partname
+                rel.__dict__.pop("target_partname", None)
+                rel.__dict__.pop("target_ref", None)
+            writer.add(_ZipEntry(slide.part.partname.membername, slide.part.blob, None))
+            writer.add(_ZipEntry(slide.part.partname.rels_uri.membername, slide.part.rels.xml, None))
+            slide_partnames.append((slide.part.partname, slide.part.content_type))
+
+            # Detach the slide again; nothing refers to it any more, so it (and its images) can be freed
+            slide_id = slide_ids[-1]
+            prs.part.drop_rel(slide_id.rId)
+            slide_ids.remove(slide_id)
+
+    # The presentation part lists the slides; relate it to empty stand-in parts so its XML and
+    # rels come out as if the slides were still there, with the same slide ids and rIds as a full build.
+    stubs = set()
+    for i, (partname, content_type) in enumerate(slide_partnames):
+        stub = Part(partname, content_type, package)
+        stubs.add(stub)
+        slide_ids._add_sldId(id=256 + i, rId=prs.part.relate_to(stub, RT.SLIDE))
+
+    with span("zip_write"):
+        parts = [part for part in package.iter_parts() if part not in stubs]
+        writer.add(_ZipEntry(
+            CONTENT_TYPES_URI.membername, serialize_part_xml(_ContentTypesItem.xml_for(parts + list(stubs) + media_parts)), None
+        ))
+        writer.add(_ZipEntry(PACKAGE_URI.rels_uri.membername, package._rels.xml, None))
+        for part in parts:
+            writer.add(_ZipEntry(part.partname.membername, part.blob, None))
+            if part._rels:
+                writer.add(_ZipEntry(part.partname.rels_uri.membername, part.rels.xml, None))
+        writer.close()
+
+
+def generate_presentation_pptx(content: PresentationContent, output_buffer: io.BytesIO, images=normalized_images, theme: Optional[Theme] = None):
     """
     Generates a PPTX file based on the structured content provided by the agent.
     This version includes dynamic image placement and modern bullet point styling.
+    Slide images are looked up by hash in `images` (by default the shared image store, with each
+    image normalized for its placement box, see image_processing.py).
+    `theme` defaults to the registered theme matching the content's 'overall_theme'.
     """
-    prs = Presentation() # Starts with a default, blank presentation
-
-    # Set presentation dimensions to 16:9 widescreen for modern look
-    prs.slide_width = Inches(13.333) # Equivalent to 16:9 aspect ratio
-    prs.slide_height = Inches(7.5) # Equivalent to 16:9 aspect ratio
-
-    # --- Define a simple "theme" based on overall_theme ---
-    # In a real application, this would be a more sophisticated mapping to templates or styles.
-    # For now, we'll just define some default colors and potentially adjust based on a theme hint.
-    text_color_primary = RGBColor(0, 0, 0) # Black
-    text_color_secondary = RGBColor(50, 50, 50) # Dark gray
-    accent_color = RGBColor(0, 112, 192) # Default Blue
-
-    if content.overall_theme:
-        theme_lower = content.overall_theme.lower()
-        print(f"Applying theme: {theme_lower}")
-        if "professional" in theme_lower or "corporate" in theme_lower:
-            text_color_primary = RGBColor(30, 30, 30)
-            text_color_secondary = RGBColor(80, 80, 80)
-            accent_color = RGBColor(68, 114, 196) # Darker blue
-        elif "energetic" in theme_lower or "dynamic" in theme_lower:
-            accent_color = RGBColor(255, 120, 0) # Orange
-        elif "minimalist" in theme_lower:
-            text_color_primary = RGBColor(10, 10, 10)
-            text_color_secondary = RGBColor(60, 60, 60)
-            accent_color = RGBColor(150, 150, 150) # Lighter gray accent
-
-    for i, slide_data in enumerate(content.slides):
-        # Always start with a blank slide layout for manual placement
-        slide_layout = prs.slide_layouts[6] # Index 6 is usually 'Blank'
-        slide = prs.slides.add_slide(slide_layout)
-
-        # Define common margins and sizes
-        left_margin = Inches(0.75)
-        right_margin = Inches(0.75)
-        top_margin = Inches(0.5)
-        bottom_margin = Inches(0.5)
-        content_width = prs.slide_width - left_margin - right_margin
-        content_height = prs.slide_height - top_margin - bottom_margin
-
-        # --- Add Title ---
-        title_box = slide.shapes.add_textbox(left_margin, top_margin, content_width, Inches(1))
-        title_frame = title_box.text_frame
-        p = title_frame.paragraphs[0]
-        p.text = slide_data.title
-        p.font.size = Pt(36)
-        p.font.bold = True
-        p.font.color.rgb = text_color_primary
-        p.alignment = PP_ALIGN.LEFT
-
-        # --- Determine Layout based on content presence ---
-        has_bullets = bool(slide_data.bullet_points)
-        has_image = bool(slide_data.image_description)
-        has_image_base64 = hasattr(slide_data, "image_base64") and bool(slide_data.image_base64)
-
-        # Initial content area for text/bullets
-        text_top = top_margin + Inches(1.2)
-        text_height = content_height - Inches(1.2) # Remaining height after title
-        current_left_offset = left_margin
-        current_text_width = content_width
-
-        # --- Dynamic Image Placement and Content Area Adjustment ---
-        if has_image:
-            image_placeholder_width = Inches(4) # Fixed width for placeholder for now
-            image_placeholder_height = Inches(3) # Fixed height
-
-            # Layout 1: Title + Image on Right + Bullets on Left
-            if has_bullets:
-                current_text_width = content_width - image_placeholder_width - Inches(0.5) # Space for image and margin
-                image_left = left_margin + current_text_width + Inches(0.5)
-                image_top = text_top + (text_height - image_placeholder_height) / 2 # Vertically center image in remaining space
-            # Layout 2: Title + Image (Centered)
-            else:
-                current_text_width = 0 # No text box if only image
-                image_left = (prs.slide_width - image_placeholder_width) / 2
-                image_top = text_top + (text_height - image_placeholder_height) / 2 # Centered below title
-
-
-            
-            if has_image_base64:
-                # Decode base64 and save to temp file
-                
-
-                img_bytes = base64.b64decode(slide_data.image_base64)
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_img:
-                    tmp_img.write(img_bytes)
-                    tmp_img_path = tmp_img.name
-
-                # Add image to slide
-                slide.shapes.add_picture(
-                    tmp_img_path,
-                    image_left,
-                    image_top,
-                    width=image_placeholder_width,
-                    height=image_placeholder_height
-                )
-                os.remove(tmp_img_path)  # Clean up temp file
-            else:
-            
-                # Add image placeholder (enhanced for modern look)
-                img_shape = slide.shapes.add_shape(
-                    MSO_SHAPE.RECTANGLE,
-                    image_left,
-                    image_top,
-                    image_placeholder_width,
-                    image_placeholder_height
-                )
-                img_shape.fill.background() # No solid fill
-                img_shape.line.color.rgb = accent_color # Use accent color for border
-                img_shape.line.width = Pt(2) # Thicker line
-                # img_shape.line.dash_style =P #pptx.enum.shapes.MsoLineDashStyle.DASH # Dashed line
-                img_shape.line.dash_style = MSO_LINE.DASH_DOT_DOT
-
-                # Add text description over the placeholder
-                text_box_img = img_shape.text_frame
-                text_box_img.word_wrap = True
-                text_box_img.auto_size = MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT
-                text_box_img.vertical_anchor = MSO_ANCHOR.MIDDLE
-                p_img = text_box_img.paragraphs[0]
-                p_img.text = f"Image Suggestion:\n'{slide_data.image_description}'"
-                p_img.font.size = Pt(10)
-                p_img.font.color.rgb = text_color_secondary
-                p_img.alignment = PP_ALIGN.CENTER
-
-        # --- Add Bullet Points (Modern Styling) ---
-        if has_bullets:
-            bullet_box = slide.shapes.add_textbox(current_left_offset, text_top, current_text_width, text_height)
-            bullet_frame = bullet_box.text_frame
-            bullet_frame.word_wrap = True
-            bullet_frame.auto_size = MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT # Adjust text size to fit shape, or vice versa
-            bullet_frame.vertical_anchor = MSO_ANCHOR.TOP # Anchor text to the top of the box
-
-            for j, point in enumerate(slide_data.bullet_points):
-                p = bullet_frame.add_paragraph()
-                p.text = '🔷 ' + point
-                p.level = 0 # Top-level bullet
-
-                # Modern bullet point styling: Using a square bullet character
-                # and adjusting font and indentation
-                p.font.size = Pt(18) # Slightly smaller font for body
-                p.font.color.rgb = text_color_secondary
-
-                # Custom bullet character and indentation
-                p.space_before = Pt(5) # Small space before each bullet
-                p.space_after = Pt(5)  # Small space after each bullet
-                p.left_indent = Inches(0.2) # Indent for the bullet point itself
-                p.first_line_indent = Inches(-0.2) # Negative indent to bring bullet symbol left of text
-
-                # Set custom bullet symbol (square)
-                # This requires setting bullet_char and bullet_font
-                p.bullet_char = '▣' #'■'# Unicode square character
-                # You might need to set a specific font for the bullet char if default doesn't render well
-                # p.bullet_font.name = 'Arial' # Example
-
     # Save the presentation to the provided in-memory buffer
-    prs.save(output_buffer)
+    RenderedPresentation(content, images, theme).save(output_buffer)
     # prs.save('test.pptx')
-
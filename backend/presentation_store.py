@@ -0,0 +1,392 @@
+# presentation_store.py
+
+import os
+import json
+import asyncio
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set
+from models.model import PresentationContent
+from image_store import ImageStore, image_store
+from image_processing import normalized_images
+
+# PRESENTATION_STORE_MEMORY_BYTES: estimated bytes of hot (fully loaded) presentations to keep.
+# PRESENTATION_STORE_TTL_SECONDS: hot presentations idle for longer than this are moved to the cold tier.
+# PRESENTATION_STORE_DB: path of a SQLite file for the cold tier, which holds the images on the
+#                        cold presentations' slides too, so they outlive a restart. Without it, cold
+#                        presentations are kept compressed in memory and their images in the image store.
+PRESENTATION_STORE_MEMORY_BYTES = int(os.getenv("PRESENTATION_STORE_MEMORY_BYTES", str(512 * 1024 * 1024)))
+PRESENTATION_STORE_TTL_SECONDS = float(os.getenv("PRESENTATION_STORE_TTL_SECONDS", "3600"))
+PRESENTATION_STORE_DB = os.getenv("PRESENTATION_STORE_DB")
+
+
+def new_presentation_entry(
+    description: str,
+    content: PresentationContent,
+    version: int = 1,
+    slide_versions: Optional[List[int]] = None,
+    structure_version: Optional[int] = None
+) -> Dict:
+    """
+    A stored presentation. The PPTX is built lazily: mutations only bump "version" and record
+    the changed slides, and downloads build "raw_pptx_data" on demand, at most once per version
+    (or "pptx_file" for large decks, which are streamed to disk instead of held in memory).
+    Each slide also records the version it last changed in, so clients can fetch only the slides
+    changed since the version they have, and so a change based on an older version of a slide
+    can be detected (see `lock_slides`).
+    """
+    return {
+        "description": description,
+        "content": content, # Store the structured content for future edits
+        "version": version,
+        # Version each slide last changed in, by slide index
+        "slide_versions": list(slide_versions) if slide_versions is not None else [version] * len(content.slides),
+        # Version the slide list last changed shape in (slides added, removed or moved)
+        "structure_version": structure_version if structure_version is not None else version,
+        "dirty_slides": set(), # Slides changed since the last build
+        "rendered": None, # Rendered slides for incremental builds, created on the second build
+        "render_lock": threading.Lock(),
+        "raw_pptx_data": None, # Raw bytes for download, built on demand
+        "pptx_file": None, # Path of the built PPTX instead of raw_pptx_data, for large decks
+        "built_version": None, # Version that raw_pptx_data (or pptx_file) was built from
+        "build": None, # (version, task) of the build currently in flight
+        "slide_locks": {}, # Key: slide index, Value: asyncio.Lock held while the slide is being changed
+    }
+
+
+def discard_pptx_file(entry: Dict):
+    """
+    Deletes the built PPTX file of a large deck, if any. Downloads that already opened it keep
+    reading it until they finish.
+    """
+    path = entry.get("pptx_file")
+    entry["pptx_file"] = None
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class SlideConflict(Exception):
+    """
+    Raised when a change was based on an older version of a slide than the stored one, i.e. the
+    slide changed since the client last saw it. The API layer turns this into a 409.
+    """
+
+    def __init__(self, slide_index: int, base_version: int, slide_version: int):
+        super().__init__(
+            f"Slide {slide_index} changed in version {slide_version}, after version {base_version} this change was based on."
+        )
+        self.slide_index = slide_index
+        self.base_version = base_version
+        self.slide_version = slide_version
+
+
+@asynccontextmanager
+async def lock_slides(entry: Dict, slide_indices: Iterable[int], base_versions: Optional[Dict[int, int]] = None) -> AsyncIterator[None]:
+    """
+    Holds the locks of the given slides of a presentation for the duration of a change, so
+    changes to different slides run concurrently and changes to the same slide one after another
+    (each reading the slide as the previous one left it). Locks are taken in slide order, so
+    changes spanning several slides can't deadlock.
+    `base_versions` (Key: slide index, Value: the slide version the change was based on) makes the
+    change optimistic: once the locks are held, SlideConflict is raised if any of those slides
+    has changed since.
+    Only for use on the event loop, on a presentation checked out with `PresentationStore.use`.
+    """
+    locks = [entry["slide_locks"].setdefault(i, asyncio.Lock()) for i in sorted(set(slide_indices))]
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire()
+            acquired.append(lock)
+        for slide_index, base_version in (base_versions or {}).items():
+            slide_version = entry["slide_versions"][slide_index]
+            if slide_version > base_version:
+                raise SlideConflict(slide_index, base_version, slide_version)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+
+def _image_hashes(entry: Dict) -> Set[str]:
+    return {slide.image_hash for slide in entry["content"].slides if slide.image_hash}
+
+
+def _estimated_size(entry: Dict) -> int:
+    """
+    Rough resident size of a hot entry: the content and its images (as originals and normalized
+    variants; an image shared with other presentations is counted in each), plus the built PPTX,
+    counted twice when the incremental rendering state (python-pptx tree and cached zip members)
+    is also held.
+    """
+    cached = entry.get("_size")
+    key = (entry["version"], entry["built_version"], entry["rendered"] is not None)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    size = len(entry["content"].model_dump_json())
+    size += sum(normalized_images.stored_bytes(image_hash) for image_hash in _image_hashes(entry))
+    pptx_size = len(entry["raw_pptx_data"] or b"")
+    size += pptx_size * (2 if entry["rendered"] is not None else 1)
+    entry["_size"] = (key, size)
+    return size
+
+
+class PresentationStore:
+    """
+    Bounded store for presentations, used like a dict keyed by presentation_id.
+    Presentations live in a hot tier (ready to use) until they go over the memory budget
+    (least recently used first) or sit idle longer than the TTL. They are then reduced to their
+    description, content and versions, compressed, and moved to a cold tier: in memory, with
+    their images pinned in `images`, or a SQLite file when `db_path` is given, with a copy of
+    their images. Accessing a cold presentation rehydrates it transparently (putting its images
+    back in `images` if they are gone); its PPTX is rebuilt on the next download, byte-for-byte
+    the same as before.
+    Presentations checked out with `use()` are never evicted while in use.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = PRESENTATION_STORE_MEMORY_BYTES,
+        ttl_seconds: float = PRESENTATION_STORE_TTL_SECONDS,
+        db_path: Optional[str] = PRESENTATION_STORE_DB,
+        images: ImageStore = image_store
+    ):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.images = images
+
+        # Key: presentation_id, Value: entry; ordered from least to most recently used
+        self._hot: "OrderedDict[str, Dict]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._pins: Dict[str, int] = {}
+
+        self._db = None
+        # Key: presentation_id, Value: compressed JSON (only when there is no SQLite file)
+        self._cold: Dict[str, bytes] = {}
+        # Key: presentation_id, Value: hashes of the images on its slides, which the image store
+        # keeps for the cold presentations as it does for the hot ones (only when there is no SQLite file)
+        self._cold_images: Dict[str, Set[str]] = {}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS presentations (id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            # Images of the cold presentations, each held once, and which presentations use them
+            self._db.execute("CREATE TABLE IF NOT EXISTS images (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS presentation_images (id TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (id, hash))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS presentation_images_hash ON presentation_images (hash)")
+            self._db.commit()
+
+        self.hits = 0
+        self.cold_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- dict-style access ---
+
+    def __contains__(self, presentation_id: str) -> bool:
+        return presentation_id in self._hot or self._cold_load(presentation_id) is not None
+
+    def __getitem__(self, presentation_id: str) -> Dict:
+        entry = self.get(presentation_id)
+        if entry is None:
+            raise KeyError(presentation_id)
+        return entry
+
+    def __setitem__(self, presentation_id: str, entry: Dict):
+        replaced = self._hot.get(presentation_id)
+        if replaced is not None and replaced is not entry:
+            discard_pptx_file(replaced)
+        self._hot[presentation_id] = entry
+        self._hot.move_to_end(presentation_id)
+        self._cold_delete(presentation_id)
+        self._last_access[presentation_id] = time.monotonic()
+        self._enforce_budget(keep=presentation_id)
+
+    def __delitem__(self, presentation_id: str):
+        entry = self._hot.pop(presentation_id, None)
+        found = entry is not None
+        if entry is not None:
+            discard_pptx_file(entry)
+        self._last_access.pop(presentation_id, None)
+        found = self._cold_delete(presentation_id) or found
+        if not found:
+            raise KeyError(presentation_id)
+
+    def __len__(self) -> int:
+        if self._db is not None:
+            cold_count = self._db.execute("SELECT COUNT(*) FROM presentations").fetchone()[0]
+        else:
+            cold_count = len(self._cold)
+        return len(self._hot) + cold_count
+
+    def get(self, presentation_id: str, default=None) -> Optional[Dict]:
+        """Returns the hot entry for a presentation, rehydrating it from the cold tier if needed."""
+        entry = self._hot.get(presentation_id)
+        if entry is not None:
+            self.hits += 1
+            self._hot.move_to_end(presentation_id)
+            self._last_access[presentation_id] = time.monotonic()
+            self._enforce_budget(keep=presentation_id)
+            return entry
+
+        data = self._cold_load(presentation_id)
+        if data is None:
+            self.misses += 1
+            return default
+
+        self.cold_hits += 1
+        cold = json.loads(zlib.decompress(data))
+        entry = new_presentation_entry(
+            cold["description"], PresentationContent.model_validate(cold["content"]), cold["version"],
+            cold.get("slide_versions"), cold.get("structure_version")
+        )
+        self._cold_restore_images(_image_hashes(entry))
+        self[presentation_id] = entry
+        return entry
+
+    @contextmanager
+    def use(self, presentation_id: str) -> Iterator[Dict]:
+        """
+        Checks out a presentation for the duration of a request, so it can't be moved to the
+        cold tier (losing whatever the request writes to it) while the request awaits an LLM call.
+        Raises KeyError if there is no such presentation.
+        """
+        entry = self[presentation_id]
+        self._pins[presentation_id] = self._pins.get(presentation_id, 0) + 1
+        try:
+            yield entry
+        finally:
+            self._pins[presentation_id] -= 1
+            if not self._pins[presentation_id]:
+                del self._pins[presentation_id]
+            self._enforce_budget()
+
+    def image_hashes(self) -> Set[str]:
+        """
+        Hashes of the images on the slides of the hot and cold presentations, which the image
+        store keeps. Safe to call from the render threads.
+        """
+        return set().union(
+            *[_image_hashes(entry) for entry in list(self._hot.values())],
+            *list(self._cold_images.values())
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and resident sizes."""
+        if self._db is not None:
+            cold_count, cold_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM presentations"
+            ).fetchone()
+            cold_image_bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+        else:
+            cold_count, cold_bytes = len(self._cold), sum(len(data) for data in self._cold.values())
+            cold_image_bytes = 0
+        return {
+            "hits": self.hits,
+            "cold_hits": self.cold_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hot_presentations": len(self._hot),
+            "cold_presentations": cold_count,
+            "bytes_resident": sum(_estimated_size(entry) for entry in self._hot.values()),
+            "cold_bytes": cold_bytes,
+            "cold_image_bytes": cold_image_bytes,
+        }
+
+    # --- eviction ---
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        """Moves idle or least recently used presentations to the cold tier until within budget."""
+        now = time.monotonic()
+        total = sum(_estimated_size(entry) for entry in self._hot.values())
+        for presentation_id in list(self._hot):
+            if presentation_id == keep or presentation_id in self._pins:
+                continue
+            entry = self._hot[presentation_id]
+            if entry["build"] is not None:
+                continue
+            idle = now - self._last_access.get(presentation_id, now)
+            if total <= self.memory_budget_bytes and idle <= self.ttl_seconds:
+                continue
+            total -= _estimated_size(entry)
+            self._evict(presentation_id)
+
+    def _evict(self, presentation_id: str):
+        hashes = _image_hashes(self._hot[presentation_id])
+        if self._db is not None:
+            self._cold_store_images(presentation_id, hashes)
+        else:
+            # Pinned before the entry leaves the hot tier, so its images are always kept
+            self._cold_images[presentation_id] = hashes
+        entry = self._hot.pop(presentation_id)
+        self._last_access.pop(presentation_id, None)
+        discard_pptx_file(entry)
+        data = zlib.compress(json.dumps({
+            "description": entry["description"],
+            "version": entry["version"],
+            "slide_versions": entry["slide_versions"],
+            "structure_version": entry["structure_version"],
+            "content": entry["content"].model_dump(mode="json"),
+        }).encode("utf-8"))
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO presentations (id, data) VALUES (?, ?)", (presentation_id, data))
+            self._db.commit()
+        else:
+            self._cold[presentation_id] = data
+        self.evictions += 1
+
+    # --- cold tier ---
+
+    def _cold_load(self, presentation_id: str) -> Optional[bytes]:
+        if self._db is not None:
+            row = self._db.execute("SELECT data FROM presentations WHERE id = ?", (presentation_id,)).fetchone()
+            return row[0] if row else None
+        return self._cold.get(presentation_id)
+
+    def _cold_delete(self, presentation_id: str) -> bool:
+        self._cold_images.pop(presentation_id, None)
+        if self._db is not None:
+            deleted = self._db.execute("DELETE FROM presentations WHERE id = ?", (presentation_id,)).rowcount
+            hashes = [row[0] for row in self._db.execute("SELECT hash FROM presentation_images WHERE id = ?", (presentation_id,))]
+            self._db.execute("DELETE FROM presentation_images WHERE id = ?", (presentation_id,))
+            # Images no other cold presentation uses
+            self._db.executemany(
+                "DELETE FROM images WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM presentation_images WHERE hash = ?)",
+                [(image_hash, image_hash) for image_hash in hashes]
+            )
+            self._db.commit()
+            return deleted > 0
+        return self._cold.pop(presentation_id, None) is not None
+
+    def _cold_store_images(self, presentation_id: str, hashes: Set[str]):
+        """Copies a presentation's images into the SQLite file (those not already there); committed with its record."""
+        stored = {row[0] for row in self._db.execute(
+            f"SELECT hash FROM images WHERE hash IN ({','.join('?' * len(hashes))})", list(hashes)
+        )} if hashes else set()
+        for image_hash in hashes - stored:
+            image_bytes = self.images.get(image_hash)
+            if image_bytes is not None:
+                self._db.execute("INSERT INTO images (hash, data) VALUES (?, ?)", (image_hash, image_bytes))
+        self._db.executemany(
+            "INSERT OR IGNORE INTO presentation_images (id, hash) VALUES (?, ?)",
+            [(presentation_id, image_hash) for image_hash in hashes]
+        )
+
+    def _cold_restore_images(self, hashes: Set[str]):
+        """Puts the images of a presentation being rehydrated back in the image store, if they are gone."""
+        if self._db is None:
+            return
+        for image_hash in hashes:
+            if image_hash in self.images:
+                continue
+            row = self._db.execute("SELECT data FROM images WHERE hash = ?", (image_hash,)).fetchone()
+            if row is not None:
+                self.images.put(row[0])
@@ -0,0 +1,109 @@
+# prompt_builder.py
+
+import os
+import json
+import threading
+from typing import Dict
+from models.model import PresentationContent, SlideContent
+
+# PROMPT_CONTEXT_TOKENS: budget for the rest of the deck in edit prompts (its name, theme and the
+#                        slides around the edited one, nearest first).
+# PROMPT_TEXT_TOKENS: budget for any single free-text input (a description, the current content
+#                     of an element); longer text is cut to fit.
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "400"))
+PROMPT_TEXT_TOKENS = int(os.getenv("PROMPT_TEXT_TOKENS", "1000"))
+
+# Rough characters per token of English text; token counts here are estimates, not a tokenizer's
+CHARS_PER_TOKEN = 4
+
+# Fields never sent to the model: image data and the server's content hashes mean nothing to it,
+# cost tokens, and a hash it garbles would point at the wrong image (see `restore_server_fields`).
+EXCLUDED_FIELDS = frozenset({"image_hash", "image_base64"})
+
+_TRUNCATED = " [...]"
+
+# Per-agent prompt counters, reported by /metrics
+_stats: Dict[str, Dict[str, int]] = {"calls": {}, "tokens": {}, "max_tokens": {}}
+_stats_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int = PROMPT_TEXT_TOKENS) -> str:
+    """`text` unchanged if it fits in `max_tokens`, otherwise its start, marked as cut."""
+    if text is None or estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * CHARS_PER_TOKEN - len(_TRUNCATED))] + _TRUNCATED
+
+
+def _prompt_value(value):
+    if isinstance(value, dict):
+        return {k: _prompt_value(v) for k, v in value.items() if k not in EXCLUDED_FIELDS and v is not None}
+    if isinstance(value, list):
+        return [_prompt_value(v) for v in value]
+    return value
+
+
+def prompt_json(value) -> str:
+    """
+    Compact JSON of a dict (or pydantic model) for a prompt, without EXCLUDED_FIELDS or empty
+    (None) fields. Non-ASCII text is kept as is, which is fewer tokens than \\u escapes.
+    """
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(mode="json")
+    return json.dumps(_prompt_value(value), separators=(",", ":"), ensure_ascii=False)
+
+
+def restore_server_fields(updated: SlideContent, original: SlideContent) -> SlideContent:
+    """The model's version of a slide, with the fields it never saw put back from the original."""
+    return updated.model_copy(update={"image_hash": original.image_hash})
+
+
+def deck_context(content: PresentationContent, slide_index: int, max_tokens: int = PROMPT_CONTEXT_TOKENS) -> str:
+    """
+    The deck around one slide, for an edit prompt, in at most `max_tokens`: the deck's name and
+    theme, then the other slides nearest first (1 before, 1 after, 2 before, ...). A slide whose
+    full content doesn't fit anymore is given by its title alone; slides are listed in deck order.
+    """
+    header = prompt_json({"name": content.name, "overall_theme": content.overall_theme})
+    budget = max_tokens - estimate_tokens(header)
+    if budget <= 0:
+        return ""
+
+    nearest_first = []
+    for distance in range(1, len(content.slides)):
+        for i in (slide_index - distance, slide_index + distance):
+            if 0 <= i < len(content.slides):
+                nearest_first.append(i)
+
+    lines: Dict[int, str] = {}
+    for i in nearest_first:
+        slide = content.slides[i]
+        line = f"{i + 1}. {prompt_json(slide)}"
+        cost = estimate_tokens(line) + 1 # The newline
+        if cost > budget:
+            line = f"{i + 1}. {prompt_json({'title': slide.title})}"
+            cost = estimate_tokens(line) + 1
+            if cost > budget:
+                break
+        lines[i] = line
+        budget -= cost
+    return "\n".join([header] + [lines[i] for i in sorted(lines)])
+
+
+def record_prompt(agent_name: str, prompt: str) -> int:
+    """Counts a prompt sent to `agent_name` and returns its estimated tokens."""
+    tokens = estimate_tokens(prompt)
+    with _stats_lock:
+        _stats["calls"][agent_name] = _stats["calls"].get(agent_name, 0) + 1
+        _stats["tokens"][agent_name] = _stats["tokens"].get(agent_name, 0) + tokens
+        _stats["max_tokens"][agent_name] = max(_stats["max_tokens"].get(agent_name, 0), tokens)
+    return tokens
+
+
+def prompt_stats() -> Dict[str, Dict[str, int]]:
+    """Prompts sent per agent, their estimated tokens in total and the largest one."""
+    with _stats_lock:
+        return {name: dict(values) for name, values in _stats.items()}
@@ -0,0 +1,204 @@
+# render_executor.py
+
+import os
+import io
+import asyncio
+import tempfile
+import contextvars
+from functools import partial
+from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from models.model import PresentationContent, SlideContent
+from ppt_generator import generate_presentation_pptx, stream_presentation_pptx
+from image_processing import normalized_images
+from thumbnails import render_thumbnails
+from themes import Theme, theme_registry
+
+# RENDER_EXECUTOR: "process" (default) renders in a pool of worker processes so the CPU-bound
+#                  python-pptx work doesn't hold the GIL of the server process; "thread" uses
+#                  a thread pool instead (e.g. where multiprocessing isn't available).
+# RENDER_WORKERS: number of render workers.
+# RENDER_MAX_PENDING: renders allowed to wait for a free worker before new ones are rejected.
+RENDER_EXECUTOR = os.getenv("RENDER_EXECUTOR", "process")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+RENDER_MAX_PENDING = int(os.getenv("RENDER_MAX_PENDING", str(RENDER_WORKERS * 2)))
+# RENDER_LARGE_DECK_SLIDES: decks with at least this many slides are streamed to a file slide by
+#                           slide instead of being built in memory (see stream_presentation_pptx).
+# RENDER_LARGE_DECK_DIR: where those files are written (a temporary directory by default).
+RENDER_LARGE_DECK_SLIDES = int(os.getenv("RENDER_LARGE_DECK_SLIDES", "300"))
+RENDER_LARGE_DECK_DIR = os.getenv("RENDER_LARGE_DECK_DIR") or os.path.join(tempfile.gettempdir(), "ppt_large_decks")
+
+
+def _worker_ready() -> bool:
+    """
+    A no-op for `RenderExecutor.warm_up` to run in each worker.
+    Module-level so it can be pickled and run in a worker process.
+    """
+    return True
+
+
+class RenderExecutorSaturated(Exception):
+    """
+    Raised when every render worker is busy and the pending queue is full.
+    The API layer turns this into a 503 so clients back off and retry.
+    """
+
+
+def render_presentation_bytes(content: PresentationContent, images, theme: Theme) -> bytes:
+    """
+    Renders a full presentation to PPTX bytes.
+    Module-level so it can be pickled and run in a worker process.
+    """
+    pptx_buffer = io.BytesIO()
+    generate_presentation_pptx(content, pptx_buffer, images, theme)
+    return pptx_buffer.getvalue()
+
+
+def render_presentation_file(content: PresentationContent, path: str, images, theme: Theme):
+    """
+    Streams a presentation to a PPTX file at `path`, slide by slide. Written under a temporary
+    name and renamed when complete, so a reader never sees a partial file.
+    """
+    partial_path = f"{path}.partial"
+    try:
+        with open(partial_path, "wb") as f:
+            stream_presentation_pptx(content, f, images, theme)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+
+class RenderExecutor:
+    """
+    Runs PPTX rendering (and other CPU-heavy work such as base64 handling of large images)
+    off the asyncio event loop, with a bound on how much work may be queued at once.
+    """
+
+    def __init__(self, kind: str = RENDER_EXECUTOR, max_workers: int = RENDER_WORKERS, max_pending: int = RENDER_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._in_flight = 0
+
+        # Threads are always available: work that needs objects living in this process
+        # (e.g. the incremental RenderedPresentation state) can't be sent to another process.
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+        self._process_pool = None
+        if kind == "process":
+            try:
+                self._process_pool = ProcessPoolExecutor(max_workers=max_workers)
+            except (OSError, NotImplementedError, ImportError) as e:
+                # Some sandboxes don't allow worker processes; threads still keep the loop responsive.
+                print(f"Process pool unavailable ({e}), falling back to a thread pool for rendering.")
+        self.kind = "process" if self._process_pool is not None else "thread"
+
+    @property
+    def in_flight(self) -> int:
+        """Number of renders currently running or waiting for a worker."""
+        return self._in_flight
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self._in_flight, "max_workers": self.max_workers, "max_pending": self.max_pending}
+
+    async def _submit(self, pool, fn, *args):
+        if self._in_flight >= self.max_workers + self.max_pending:
+            raise RenderExecutorSaturated(
+                f"Renderer is busy ({self._in_flight} renders in progress), please retry shortly."
+            )
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if pool is self._thread_pool:
+                # Carry the request's context into the thread, so timing spans there count towards
+                # its Server-Timing header (run_in_executor doesn't copy it, and processes can't share it).
+                return await loop.run_in_executor(pool, partial(contextvars.copy_context().run, fn, *args))
+            return await loop.run_in_executor(pool, fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def render(self, content: PresentationContent) -> bytes:
+        """
+        Renders a full presentation to PPTX bytes on the render pool.
+        """
+        # Resolved here and sent along, since worker processes don't see themes uploaded to this one
+        theme = theme_registry.resolve(content.overall_theme)
+        if self._process_pool is None:
+            return await self._submit(self._thread_pool, render_presentation_bytes, content, normalized_images, theme)
+        # Worker processes can't see this process's image store, so send the deck's images along
+        # (already normalized when they were stored, so this is a lookup, not image processing).
+        images = {}
+        for slide in content.slides:
+            if slide.image_hash and slide.image_hash not in images:
+                image_bytes = normalized_images.get(slide.image_hash)
+                if image_bytes is not None:
+                    images[slide.image_hash] = image_bytes
+        try:
+            return await self._submit(self._process_pool, render_presentation_bytes, content, images, theme)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OOM killer); keep serving from threads.
+            print("Render process pool is broken, falling back to a thread pool for rendering.")
+            self._process_pool = None
+            self.kind = "thread"
+            return await self._submit(self._thread_pool, render_presentation_bytes, content, normalized_images, theme)
+
+    async def render_thumbnails(self, slides: List[SlideContent], theme: Theme, width: int, image_format: str) -> List[bytes]:
+        """
+        Renders the thumbnails of `slides` (see thumbnails.py), in order, split into one batch per
+        worker so they are drawn in parallel.
+        """
+        batch_size = -(-len(slides) // self.max_workers)
+        batches = [slides[start:start + batch_size] for start in range(0, len(slides), batch_size)]
+
+        async def render_batch(batch: List[SlideContent]) -> List[bytes]:
+            if self._process_pool is None:
+                return await self._submit(self._thread_pool, render_thumbnails, batch, normalized_images, theme, width, image_format)
+            images = {}
+            for slide in batch:
+                if slide.image_hash and slide.image_hash not in images:
+                    image_bytes = normalized_images.get(slide.image_hash)
+                    if image_bytes is not None:
+                        images[slide.image_hash] = image_bytes
+            try:
+                return await self._submit(self._process_pool, render_thumbnails, batch, images, theme, width, image_format)
+            except BrokenProcessPool:
+                print("Render process pool is broken, falling back to a thread pool for rendering.")
+                self._process_pool = None
+                self.kind = "thread"
+                return await self._submit(self._thread_pool, render_thumbnails, batch, normalized_images, theme, width, image_format)
+
+        results = await asyncio.gather(*[render_batch(batch) for batch in batches])
+        return [thumbnail for batch in results for thumbnail in batch]
+
+    async def render_to_file(self, content: PresentationContent, path: str) -> str:
+        """
+        Streams a large presentation to a PPTX file at `path` and returns the path.
+        Runs on the render threads, which read images straight from the image store: sending a
+        large deck's images to a worker process would copy them all, defeating the point.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        theme = theme_registry.resolve(content.overall_theme)
+        await self._submit(self._thread_pool, render_presentation_file, content, path, normalized_images, theme)
+        return path
+
+    async def run(self, fn, *args):
+        """
+        Runs a blocking callable that must stay in this process (shared state, large buffers)
+        on the render thread pool.
+        """
+        return await self._submit(self._thread_pool, fn, *args)
+
+    async def warm_up(self):
+        """
+        Starts the worker processes now (with their imports) instead of in the first renders.
+        One no-op per worker, submitted together so none can be served by a worker already started.
+        """
+        if self._process_pool is None:
+            return
+        await asyncio.gather(*[self._submit(self._process_pool, _worker_ready) for _ in range(self.max_workers)])
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
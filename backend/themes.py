@@ -0,0 +1,394 @@
+# themes.py
+
+import io
+import os
+import re
+import copy
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.enum.text import MSO_ANCHOR, MSO_AUTO_SIZE, PP_ALIGN
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.dml import MSO_LINE
+from pptx.oxml.ns import qn
+
+# THEME_TEMPLATES_DIR: directory of user .pptx templates, each registered at startup as a theme
+#                      named after its file ("acme.pptx" -> "acme"). Templates uploaded through
+#                      the API are saved there too, so they survive restarts.
+THEME_TEMPLATES_DIR = os.getenv("THEME_TEMPLATES_DIR")
+
+# Theme names double as file names in THEME_TEMPLATES_DIR
+THEME_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Image (or image placeholder) box on a slide
+IMAGE_WIDTH = Inches(4)
+IMAGE_HEIGHT = Inches(3)
+
+
+class Theme:
+    """
+    A named look for rendered decks: text and accent colors and, for user templates, the .pptx
+    whose slide masters, layouts and slide size the decks are built on.
+    Picklable, so it can be sent along to render worker processes; the compiled template is
+    built once per process and shared by every deck using the theme.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        text_color_primary: RGBColor,
+        text_color_secondary: RGBColor,
+        accent_color: RGBColor,
+        template_bytes: Optional[bytes] = None
+    ):
+        self.name = name
+        self.text_color_primary = text_color_primary
+        self.text_color_secondary = text_color_secondary
+        self.accent_color = accent_color
+        self.template_bytes = template_bytes
+        digest = hashlib.sha256(f"{name}|{text_color_primary}|{text_color_secondary}|{accent_color}".encode("utf-8"))
+        if template_bytes is not None:
+            digest.update(template_bytes)
+        self.fingerprint = digest.hexdigest()
+
+    def __reduce__(self):
+        # RGBColor doesn't survive pickling, so colors travel as hex strings
+        return _theme_from_hex, (
+            self.name, str(self.text_color_primary), str(self.text_color_secondary), str(self.accent_color), self.template_bytes
+        )
+
+    def compiled(self) -> "CompiledTheme":
+        """The compiled template of this theme, built on first use in this process."""
+        compiled = _compiled_themes.get(self.fingerprint)
+        if compiled is None:
+            with _compile_lock:
+                compiled = _compiled_themes.get(self.fingerprint)
+                if compiled is None:
+                    compiled = CompiledTheme(self)
+                    _compiled_themes[self.fingerprint] = compiled
+        return compiled
+
+
+def _theme_from_hex(name: str, primary: str, secondary: str, accent: str, template_bytes: Optional[bytes]) -> Theme:
+    return Theme(name, RGBColor.from_string(primary), RGBColor.from_string(secondary), RGBColor.from_string(accent), template_bytes)
+
+
+# Key: Theme.fingerprint, Value: its CompiledTheme. Keyed by content rather than by object so
+# copies of a theme unpickled in a worker process share one compiled template.
+_compiled_themes: Dict[str, "CompiledTheme"] = {}
+_compile_lock = threading.Lock()
+
+
+def _build_title(shapes, left, top, width, text: str, color: RGBColor):
+    title_box = shapes.add_textbox(left, top, width, Inches(1))
+    p = title_box.text_frame.paragraphs[0]
+    p.text = text
+    p.font.size = Pt(36)
+    p.font.bold = True
+    p.font.color.rgb = color
+    p.alignment = PP_ALIGN.LEFT
+    return title_box
+
+
+def _build_image_placeholder(shapes, left, top, text: str, line_color: RGBColor, text_color: RGBColor):
+    img_shape = shapes.add_shape(MSO_SHAPE.RECTANGLE, left, top, IMAGE_WIDTH, IMAGE_HEIGHT)
+    img_shape.fill.background() # No solid fill
+    img_shape.line.color.rgb = line_color # Use accent color for border
+    img_shape.line.width = Pt(2) # Thicker line
+    img_shape.line.dash_style = MSO_LINE.DASH_DOT_DOT
+
+    # Text description over the placeholder
+    text_box_img = img_shape.text_frame
+    text_box_img.word_wrap = True
+    text_box_img.auto_size = MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT
+    text_box_img.vertical_anchor = MSO_ANCHOR.MIDDLE
+    p_img = text_box_img.paragraphs[0]
+    p_img.text = text
+    p_img.font.size = Pt(10)
+    p_img.font.color.rgb = text_color
+    p_img.alignment = PP_ALIGN.CENTER
+    return img_shape
+
+
+def _build_bullets(shapes, left, top, width, height, points: List[str], color: RGBColor):
+    bullet_box = shapes.add_textbox(left, top, width, height)
+    bullet_frame = bullet_box.text_frame
+    bullet_frame.word_wrap = True
+    bullet_frame.auto_size = MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT # Adjust text size to fit shape, or vice versa
+    bullet_frame.vertical_anchor = MSO_ANCHOR.TOP # Anchor text to the top of the box
+
+    for point in points:
+        p = bullet_frame.add_paragraph()
+        p.text = '🔷 ' + point
+        p.level = 0 # Top-level bullet
+
+        # Modern bullet point styling: adjusted font, spacing and a hanging indent
+        p.font.size = Pt(18) # Slightly smaller font for body
+        p.font.color.rgb = color
+        p.space_before = Pt(5) # Small space before each bullet
+        p.space_after = Pt(5)  # Small space after each bullet
+        p.left_indent = Inches(0.2) # Indent for the bullet point itself
+        p.first_line_indent = Inches(-0.2) # Negative indent to bring bullet symbol left of text
+        p.bullet_char = '▣' # Custom bullet symbol (square)
+    return bullet_box
+
+
+def _blank_layout_index(prs) -> int:
+    """The layout decks are drawn on: the one named "Blank", else the one with the fewest placeholders."""
+    layouts = list(prs.slide_layouts)
+    for i, layout in enumerate(layouts):
+        if layout.name.strip().lower() == "blank":
+            return i
+    return min(range(len(layouts)), key=lambda i: len(list(layouts[i].iter_cloneable_placeholders())))
+
+
+def _without_text(element):
+    """Copy of a shape or paragraph element with the runs of its paragraphs removed (formatting kept)."""
+    element = copy.deepcopy(element)
+    paragraphs = [element] if element.tag == qn("a:p") else list(element.iter(qn("a:p")))
+    for p in paragraphs:
+        for child in list(p):
+            if child.tag in (qn("a:r"), qn("a:br"), qn("a:fld")):
+                p.remove(child)
+    return element
+
+
+class CompiledTheme:
+    """
+    A theme prepared for fast rendering: the starting .pptx (masters, layouts and slide size,
+    no slides) and fully formatted title, bullet and image-placeholder shapes to clone.
+    Slides are then built by copying these elements and filling in their text, instead of
+    setting a dozen python-pptx properties per paragraph.
+    The shapes are produced by the same python-pptx calls as a field-by-field render, so the
+    output is identical.
+    """
+
+    def __init__(self, theme: Theme):
+        self.theme = theme
+        if theme.template_bytes is None:
+            prs = Presentation() # Starts with a default, blank presentation
+            # Set presentation dimensions to 16:9 widescreen for modern look
+            prs.slide_width = Inches(13.333)
+            prs.slide_height = Inches(7.5)
+        else:
+            prs = Presentation(io.BytesIO(theme.template_bytes))
+            # Keep the template's masters, layouts and size, but none of its slides
+            slide_ids = prs.slides._sldIdLst
+            for slide_id in list(slide_ids):
+                prs.part.drop_rel(slide_id.rId)
+                slide_ids.remove(slide_id)
+        self.blank_layout_index = _blank_layout_index(prs)
+        self.slide_width, self.slide_height = prs.slide_width, prs.slide_height
+
+        # Layout geometry: margins, then the title on top and the image and bullets below it
+        left_margin = Inches(0.75)
+        right_margin = Inches(0.75)
+        top_margin = Inches(0.5)
+        bottom_margin = Inches(0.5)
+        content_width = self.slide_width - left_margin - right_margin
+        content_height = self.slide_height - top_margin - bottom_margin
+        self.title_box = (left_margin, top_margin, content_width)
+        text_top = top_margin + Inches(1.2)
+        text_height = content_height - Inches(1.2) # Remaining height after title
+        image_top = text_top + (text_height - IMAGE_HEIGHT) / 2 # Vertically centered below the title
+        # Key: (has_bullets, has_image), Value: (bullet box (left, top, width, height), image (left, top))
+        # Layout 1: Title + Image on Right + Bullets on Left; Layout 2: Title + Image (Centered)
+        bullets_width_with_image = content_width - IMAGE_WIDTH - Inches(0.5) # Space for image and margin
+        self.layouts: Dict[Tuple[bool, bool], tuple] = {
+            (True, True): (
+                (left_margin, text_top, bullets_width_with_image, text_height),
+                (left_margin + bullets_width_with_image + Inches(0.5), image_top)
+            ),
+            (False, True): (None, ((self.slide_width - IMAGE_WIDTH) / 2, image_top)),
+            (True, False): ((left_margin, text_top, content_width, text_height), None),
+            (False, False): (None, None),
+        }
+
+        # Build one of each shape on a scratch slide and keep their formatted XML
+        scratch = prs.slides.add_slide(prs.slide_layouts[self.blank_layout_index])
+        shapes = scratch.shapes
+        self._title = _without_text(
+            _build_title(shapes, *self.title_box, "title", theme.text_color_primary)._element
+        )
+        self._placeholder = _without_text(
+            _build_image_placeholder(shapes, 0, 0, "image", theme.accent_color, theme.text_color_secondary)._element
+        )
+        bullets = _build_bullets(shapes, 0, 0, 0, 0, ["point"], theme.text_color_secondary)._element
+        self._bullet_paragraph = _without_text(list(bullets.iter(qn("a:p")))[-1])
+        self._bullets = _without_text(bullets)
+        for p in list(self._bullets.iter(qn("a:p")))[1:]:
+            p.getparent().remove(p)
+
+        # Drop the scratch slide again and keep the starting package as bytes
+        slide_ids = prs.slides._sldIdLst
+        scratch_id = slide_ids[-1]
+        prs.part.drop_rel(scratch_id.rId)
+        slide_ids.remove(scratch_id)
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        self.prototype = buffer.getvalue()
+        print(f"Compiled theme '{theme.name}'.")
+
+    def new_presentation(self):
+        """A fresh python-pptx Presentation to render a deck into."""
+        return Presentation(io.BytesIO(self.prototype))
+
+    @staticmethod
+    def _place(shapes, element, left, top, width=None, height=None, basename="TextBox"):
+        """Appends a clone of `element` to the slide with a new shape id, named and positioned like python-pptx would."""
+        element = copy.deepcopy(element)
+        shape_id = shapes._next_shape_id
+        c_nv_pr = element.find(f"{qn('p:nvSpPr')}/{qn('p:cNvPr')}")
+        c_nv_pr.set("id", str(shape_id))
+        c_nv_pr.set("name", f"{basename} {shape_id - 1}")
+        xfrm = element.find(f"{qn('p:spPr')}/{qn('a:xfrm')}")
+        off, ext = xfrm.find(qn("a:off")), xfrm.find(qn("a:ext"))
+        off.set("x", str(int(left)))
+        off.set("y", str(int(top)))
+        if width is not None:
+            ext.set("cx", str(int(width)))
+            ext.set("cy", str(int(height)))
+        shapes._spTree.append(element)
+        return element
+
+    def add_title(self, slide, text: str):
+        element = self._place(slide.shapes, self._title, *self.title_box[:2])
+        next(element.iter(qn("a:p"))).append_text(text)
+
+    def add_image_placeholder(self, slide, left, top, description: str):
+        element = self._place(slide.shapes, self._placeholder, left, top, basename="Rectangle")
+        next(element.iter(qn("a:p"))).append_text(f"Image Suggestion:\n'{description}'")
+
+    def add_bullets(self, slide, left, top, width, height, points: List[str]):
+        element = self._place(slide.shapes, self._bullets, left, top, width, height)
+        body = next(element.iter(qn("a:p"))).getparent()
+        for point in points:
+            p = copy.deepcopy(self._bullet_paragraph)
+            p.append_text('🔷 ' + point)
+            body.append(p)
+
+
+# Built-in themes, picked by keywords in the agent's free-text 'overall_theme'
+DEFAULT_THEME = Theme("default", RGBColor(0, 0, 0), RGBColor(50, 50, 50), RGBColor(0, 112, 192)) # Black, dark gray, blue
+BUILTIN_THEMES = [
+    DEFAULT_THEME,
+    Theme("professional", RGBColor(30, 30, 30), RGBColor(80, 80, 80), RGBColor(68, 114, 196)), # Darker blue accent
+    Theme("energetic", RGBColor(0, 0, 0), RGBColor(50, 50, 50), RGBColor(255, 120, 0)), # Orange accent
+    Theme("minimalist", RGBColor(10, 10, 10), RGBColor(60, 60, 60), RGBColor(150, 150, 150)), # Lighter gray accent
+]
+# (keywords, theme name), checked in order
+THEME_KEYWORDS = [
+    (("professional", "corporate"), "professional"),
+    (("energetic", "dynamic"), "energetic"),
+    (("minimalist",), "minimalist"),
+]
+
+
+class ThemeExists(ValueError):
+    """
+    Raised when registering a theme under a name already in use. Decks rendered with a theme
+    keep its compiled template and their built PPTX, so a theme is never replaced in place.
+    The API layer turns this into a 409.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(f"A theme named '{name}' already exists; upload the template under a new name.")
+        self.name = name
+
+
+class ThemeRegistry:
+    """
+    The themes decks can be rendered with: the built-in ones plus user .pptx templates
+    (from THEME_TEMPLATES_DIR or uploaded). `resolve` maps a deck's 'overall_theme' to one.
+    """
+
+    def __init__(self, templates_dir: Optional[str] = THEME_TEMPLATES_DIR):
+        self.templates_dir = templates_dir
+        # Key: lower-cased theme name, Value: Theme
+        self._themes: Dict[str, Theme] = {theme.name: theme for theme in BUILTIN_THEMES}
+        self._lock = threading.Lock()
+        if templates_dir and os.path.isdir(templates_dir):
+            for file_name in sorted(os.listdir(templates_dir)):
+                name, ext = os.path.splitext(file_name)
+                if ext.lower() != ".pptx" or not THEME_NAME_PATTERN.match(name):
+                    continue
+                try:
+                    with open(os.path.join(templates_dir, file_name), "rb") as f:
+                        self.register_template(name, f.read(), save=False)
+                except ValueError as e:
+                    print(f"Skipping theme template {file_name}: {e}")
+
+    def get(self, name: str) -> Optional[Theme]:
+        return self._themes.get(name.lower())
+
+    def names(self) -> List[str]:
+        return list(self._themes)
+
+    def register_template(
+        self,
+        name: str,
+        pptx_bytes: bytes,
+        colors: Optional[Tuple[RGBColor, RGBColor, RGBColor]] = None,
+        save: bool = True
+    ) -> Theme:
+        """
+        Registers a user .pptx as the theme `name` and compiles it (raising ValueError if it isn't
+        a usable .pptx). Decks are drawn on its "Blank" layout (or the one with the fewest
+        placeholders) at its slide size. `colors` are (primary text, secondary text, accent);
+        the default theme's by default. Raises ThemeExists if a theme of that name is registered.
+        """
+        if not THEME_NAME_PATTERN.match(name):
+            raise ValueError("Theme names may only contain letters, digits, '-' and '_' (at most 64).")
+        if name.lower() in {theme.name for theme in BUILTIN_THEMES}:
+            raise ValueError(f"'{name}' is a built-in theme.")
+        if name.lower() in self._themes:
+            raise ThemeExists(name.lower())
+        primary, secondary, accent = colors or (
+            DEFAULT_THEME.text_color_primary, DEFAULT_THEME.text_color_secondary, DEFAULT_THEME.accent_color
+        )
+        theme = Theme(name.lower(), primary, secondary, accent, template_bytes=pptx_bytes)
+        try:
+            theme.compiled()
+        except Exception as e:
+            raise ValueError(f"Not a usable .pptx template: {e}")
+        with self._lock:
+            # Checked again: another upload of the same name may have compiled first
+            if theme.name in self._themes:
+                raise ThemeExists(theme.name)
+            self._themes[theme.name] = theme
+        if save and self.templates_dir:
+            os.makedirs(self.templates_dir, exist_ok=True)
+            with open(os.path.join(self.templates_dir, f"{theme.name}.pptx"), "wb") as f:
+                f.write(pptx_bytes)
+        return theme
+
+    def resolve(self, overall_theme: Optional[str]) -> Theme:
+        """
+        The theme for a deck's free-text 'overall_theme': a theme of that exact name, else a user
+        template named in it, else the built-in theme its keywords suggest, else the default.
+        """
+        if not overall_theme:
+            return DEFAULT_THEME
+        theme_lower = overall_theme.lower().strip()
+        theme = self._themes.get(theme_lower)
+        if theme is not None:
+            return theme
+        words = set(re.findall(r"[a-z0-9_-]+", theme_lower))
+        for name, theme in list(self._themes.items()):
+            if theme.template_bytes is not None and name in words:
+                return theme
+        for keywords, name in THEME_KEYWORDS:
+            if any(keyword in theme_lower for keyword in keywords):
+                return self._themes[name]
+        return DEFAULT_THEME
+
+    def compile_all(self):
+        """Compiles every registered theme now, so the first deck in each doesn't pay for it."""
+        for theme in list(self._themes.values()):
+            theme.compiled()
+
+
+theme_registry = ThemeRegistry()
@@ -0,0 +1,253 @@
+# thumbnails.py
+
+import io
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont, features
+from pptx.util import Inches, Pt
+from models.model import SlideContent
+from metrics import span
+from themes import Theme, IMAGE_WIDTH, IMAGE_HEIGHT
+
+# THUMBNAIL_WIDTH: default width of slide thumbnails in pixels (the height follows the slide's aspect).
+# THUMBNAIL_FORMAT: default image format, "webp" or "png" ("png" if Pillow was built without WebP).
+# THUMBNAIL_CACHE_BYTES: memory for rendered thumbnails; the least recently used are dropped beyond it.
+# THUMBNAIL_FONT, THUMBNAIL_BOLD_FONT: TrueType fonts for body text and titles (DejaVu Sans if
+#                                      installed, else Pillow's built-in font).
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "480"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_CACHE_BYTES = int(os.getenv("THUMBNAIL_CACHE_BYTES", str(32 * 1024 * 1024)))
+THUMBNAIL_FONT = os.getenv("THUMBNAIL_FONT", "DejaVuSans.ttf")
+THUMBNAIL_BOLD_FONT = os.getenv("THUMBNAIL_BOLD_FONT", "DejaVuSans-Bold.ttf")
+
+THUMBNAIL_FORMATS = {"png": "image/png", "webp": "image/webp"}
+if not features.check("webp"):
+    del THUMBNAIL_FORMATS["webp"]
+    if THUMBNAIL_FORMAT == "webp":
+        THUMBNAIL_FORMAT = "png"
+MIN_THUMBNAIL_WIDTH, MAX_THUMBNAIL_WIDTH = 32, 1920
+
+# Bumped when the drawing changes, so thumbnails cached by an older version aren't served
+_RENDER_VERSION = 1
+# Default insets of python-pptx text boxes
+_INSET_X = Inches(0.1)
+_INSET_Y = Inches(0.05)
+# Line height as a multiple of the font size (PowerPoint's single spacing)
+_LINE_SPACING = 1.2
+# The '🔷' starting each bullet; emoji fonts are rarely installed on servers, so it is drawn
+_BULLET_COLOR = (85, 172, 238)
+# Dash-dot-dot pattern of the image placeholder's border, in multiples of the line width
+_DASH_DOT_DOT = (4, 1, 1, 1, 1, 1)
+
+
+@lru_cache(maxsize=64)
+def _font(bold: bool, size: int) -> ImageFont.FreeTypeFont:
+    try:
+        return ImageFont.truetype(THUMBNAIL_BOLD_FONT if bold else THUMBNAIL_FONT, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def _wrap(text: str, font, width: float) -> List[str]:
+    """
+    Greedy word wrap of `text` to lines at most `width` pixels wide (a longer word gets a line of
+    its own). Each word is measured once and lines are summed from the widths, ignoring kerning
+    across spaces; measuring every candidate line would dominate the rendering time.
+    """
+    space = font.getlength(" ")
+    lines = []
+    for paragraph in text.split("\n"):
+        line, line_width = [], 0.0
+        for word in paragraph.split(" "):
+            word_width = font.getlength(word)
+            if line and line_width + space + word_width > width:
+                lines.append(" ".join(line))
+                line, line_width = [word], word_width
+            else:
+                line_width += (space if line else 0.0) + word_width
+                line.append(word)
+        lines.append(" ".join(line))
+    return lines
+
+
+def _dashed_rectangle(draw: ImageDraw.ImageDraw, box: Tuple[int, int, int, int], color, line_width: int):
+    left, top, right, bottom = box
+    pattern = [step * line_width for step in _DASH_DOT_DOT]
+    for start, end in (((left, top), (right, top)), ((right, top), (right, bottom)),
+                       ((right, bottom), (left, bottom)), ((left, bottom), (left, top))):
+        length = abs(end[0] - start[0]) + abs(end[1] - start[1])
+        dx, dy = (end[0] - start[0]) / max(length, 1), (end[1] - start[1]) / max(length, 1)
+        position, step = 0, 0
+        while position < length:
+            segment = min(pattern[step % len(pattern)], length - position)
+            if step % 2 == 0:
+                draw.line([(start[0] + dx * position, start[1] + dy * position),
+                           (start[0] + dx * (position + segment), start[1] + dy * (position + segment))],
+                          fill=color, width=line_width)
+            position += segment
+            step += 1
+
+
+def render_thumbnail(
+    slide: SlideContent,
+    images,
+    theme: Theme,
+    width: int = THUMBNAIL_WIDTH,
+    image_format: str = THUMBNAIL_FORMAT,
+) -> bytes:
+    """
+    Rasterizes one slide the way `_render_slide` lays it out in the PPTX: the title, the bullet
+    column and the 4x3 image (or its dashed placeholder), at the theme's slide size and positions,
+    in its colors and font sizes, `width` pixels wide. Templates' backgrounds and masters aren't
+    drawn. `images` maps image hashes to image bytes.
+    """
+    compiled = theme.compiled()
+    scale = width / compiled.slide_width
+    height = round(compiled.slide_height * scale)
+
+    def px(emu) -> int:
+        return round(emu * scale)
+
+    canvas = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(canvas)
+
+    # Title: one line, not wrapped (like the title text box)
+    title_left, title_top, _ = compiled.title_box
+    title_font = _font(True, max(1, px(Pt(36))))
+    draw.text((px(title_left + _INSET_X), px(title_top + _INSET_Y)), slide.title, font=title_font,
+              fill=f"#{theme.text_color_primary}", anchor="la")
+
+    has_bullets = bool(slide.bullet_points)
+    has_image = bool(slide.image_description)
+    bullet_box, image_position = compiled.layouts[(has_bullets, has_image)]
+
+    if has_image:
+        box = (px(image_position[0]), px(image_position[1]), px(image_position[0] + IMAGE_WIDTH), px(image_position[1] + IMAGE_HEIGHT))
+        image_bytes = images.get(slide.image_hash) if slide.image_hash else None
+        picture = None
+        if image_bytes is not None:
+            try:
+                picture = Image.open(io.BytesIO(image_bytes))
+                picture.draft("RGB", (box[2] - box[0], box[3] - box[1])) # JPEGs decode at a fraction of their size
+                picture = picture.convert("RGBA").resize((box[2] - box[0], box[3] - box[1]), Image.Resampling.BILINEAR)
+            except Exception as e:
+                print(f"Could not draw slide image in thumbnail ({e}), drawing its placeholder.")
+                picture = None
+        if picture is not None:
+            canvas.paste(picture, box[:2], picture)
+        else:
+            _dashed_rectangle(draw, box, f"#{theme.accent_color}", max(1, px(Pt(2))))
+            font = _font(False, max(1, px(Pt(10))))
+            lines = _wrap(f"Image Suggestion:\n'{slide.image_description}'", font, box[2] - box[0] - 2 * px(_INSET_X))
+            line_height = font.size * _LINE_SPACING
+            y = (box[1] + box[3]) / 2 - line_height * len(lines) / 2
+            for line in lines:
+                draw.text(((box[0] + box[2]) / 2, y), line, font=font, fill=f"#{theme.text_color_secondary}", anchor="ma")
+                y += line_height
+
+    if has_bullets:
+        left, top, box_width, _ = bullet_box
+        font = _font(False, max(1, px(Pt(18))))
+        line_height = font.size * _LINE_SPACING
+        indent = px(Inches(0.2))
+        x = px(left + _INSET_X)
+        # The text box starts with an empty paragraph; the points are the ones added after it
+        y = px(top + _INSET_Y) + line_height
+        for point in slide.bullet_points:
+            y += px(Pt(5))
+            # '🔷 ' starts the first line (in the hanging indent); wrapped lines start at the indent
+            marker = font.size * 0.35
+            center = (x + marker, y + line_height / 2)
+            draw.polygon([(center[0], center[1] - marker), (center[0] + marker, center[1]),
+                          (center[0], center[1] + marker), (center[0] - marker, center[1])], fill=_BULLET_COLOR)
+            first_line_offset = font.size * 1.3
+            lines = _wrap(point, font, px(box_width - 2 * _INSET_X) - first_line_offset)
+            for i, line in enumerate(lines):
+                draw.text((x + (first_line_offset if i == 0 else indent), y + line_height / 2), line, font=font,
+                          fill=f"#{theme.text_color_secondary}", anchor="lm")
+                y += line_height
+            y += px(Pt(5))
+            if y > height:
+                break
+
+    buffer = io.BytesIO()
+    if image_format == "webp":
+        canvas.save(buffer, format="WEBP", quality=80, method=0)
+    else:
+        canvas.save(buffer, format="PNG", compress_level=3)
+    return buffer.getvalue()
+
+
+def render_thumbnails(slides: List[SlideContent], images, theme: Theme, width: int, image_format: str) -> List[bytes]:
+    """
+    Renders several slides' thumbnails, in order.
+    Module-level so it can be pickled and run in a render worker process.
+    """
+    thumbnails = []
+    for slide in slides:
+        with span("thumbnail"):
+            thumbnails.append(render_thumbnail(slide, images, theme, width, image_format))
+    return thumbnails
+
+
+def thumbnail_key(slide: SlideContent, theme: Theme, width: int, image_format: str) -> str:
+    """
+    Cache key of a slide's thumbnail: everything that is drawn (the slide's content, including
+    its image hash, and the theme) and how (size, format). The same slide in another deck, or
+    back to an earlier content, has the same key.
+    """
+    parts = [_RENDER_VERSION, slide.model_dump(mode="json"), theme.fingerprint, width, image_format]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ThumbnailCache:
+    """
+    Rendered thumbnails by `thumbnail_key`, least recently used dropped beyond `memory_limit_bytes`.
+    Safe to use from the render threads.
+    """
+
+    def __init__(self, memory_limit_bytes: int = THUMBNAIL_CACHE_BYTES):
+        self.memory_limit_bytes = memory_limit_bytes
+        self._lock = threading.Lock()
+        # Key: thumbnail key, Value: image bytes; ordered from least to most recently used
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._rendered = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            thumbnail = self._entries.get(key)
+            if thumbnail is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return thumbnail
+
+    def put(self, key: str, thumbnail: bytes):
+        with self._lock:
+            self._rendered += 1
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = thumbnail
+            self._bytes += len(thumbnail)
+            while self._bytes > self.memory_limit_bytes and len(self._entries) > 1:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self._bytes,
+                "hits": self._hits, "misses": self._misses, "rendered": self._rendered,
+            }
+
+
+thumbnail_cache = ThumbnailCache()
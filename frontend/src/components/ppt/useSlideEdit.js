@@ -81,8 +81,10 @@ export default function useSlideEdit({
         edit_instruction: editingElement.aiInstruction,
         current_content: editingElement.newContent,
       });
+      // The response only carries the slides that changed
+      const updatedSlide = response.data.slides.find(s => s.slide_index === editingElement.slideIndex);
       setSlides(prevSlides => prevSlides.map((slide, index) =>
-        index === editingElement.slideIndex ? response.data.slides[editingElement.slideIndex] : slide
+        index === editingElement.slideIndex && updatedSlide ? updatedSlide : slide
       ));
       showStatus(response.data.message, 'success');
       setEditingElement(null);